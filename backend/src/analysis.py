@@ -3,7 +3,9 @@ import spacy
 import json
 import os
 import re
+import threading
 from logger import logger
+from labels import TOPIC_LABELS, SUBJECTIVITY_LABELS
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 
@@ -11,11 +13,16 @@ from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Apunta a la carpeta 'backend'
 CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'config.json')
 
+# Modelos que carga NewsAnalyzer (por defecto, todos)
+MODELS = ("sentiment", "ner", "summarization", "zero_shot")
+
 class NewsAnalyzer:
-    def __init__(self):
+    def __init__(self, models=MODELS):
         """
         Inicializa el analizador de NLP, cargando los modelos necesarios.
+        `models` permite cargar solo algunos (p. ej. la API no necesita el de resumen).
         """
+        self.models = tuple(models)
         self.config = self._load_config(CONFIG_PATH)
         self.sentiment_analyzer = None
         self.entity_extractor = None
@@ -34,26 +41,30 @@ class NewsAnalyzer:
         """Carga los modelos de NLP."""
         logger.info("Cargando modelos de NLP...")
         
-        logger.info(" -> Cargando modelo de análisis de sentimiento...")
-        self.sentiment_analyzer = pipeline("sentiment-analysis", model=self.config['models']['sentiment'])
-        logger.info("  -> Modelo de sentimiento cargado.")
-        
-        logger.info(" -> Cargando modelo de reconocimiento de entidades (NER)...")
-        try:
-            self.entity_extractor = spacy.load(self.config['models']['ner'])
-            logger.info("  -> Modelo NER cargado.")
-        except OSError:
-            logger.error(f"Modelo de spaCy '{self.config['models']['ner']}' no encontrado.")
-            logger.error(f"Por favor, ejecute: python -m spacy download {self.config['models']['ner']}")
-            self.entity_extractor = None
-            
-        logger.info(" -> Cargando modelo de resumen de texto...")
-        self.summarizer = pipeline("summarization", model=self.config['models']['summarization'])
-        logger.info("  -> Modelo de resumen cargado.")
+        if "sentiment" in self.models:
+            logger.info(" -> Cargando modelo de análisis de sentimiento...")
+            self.sentiment_analyzer = pipeline("sentiment-analysis", model=self.config['models']['sentiment'])
+            logger.info("  -> Modelo de sentimiento cargado.")
+
+        if "ner" in self.models:
+            logger.info(" -> Cargando modelo de reconocimiento de entidades (NER)...")
+            try:
+                self.entity_extractor = spacy.load(self.config['models']['ner'])
+                logger.info("  -> Modelo NER cargado.")
+            except OSError:
+                logger.error(f"Modelo de spaCy '{self.config['models']['ner']}' no encontrado.")
+                logger.error(f"Por favor, ejecute: python -m spacy download {self.config['models']['ner']}")
+                self.entity_extractor = None
 
-        logger.info(" -> Cargando modelo de clasificación zero-shot...")
-        self.zero_shot_classifier = pipeline("zero-shot-classification", model=self.config['models']['zero_shot'])
-        logger.info("  -> Modelo de clasificación zero-shot cargado.")
+        if "summarization" in self.models:
+            logger.info(" -> Cargando modelo de resumen de texto...")
+            self.summarizer = pipeline("summarization", model=self.config['models']['summarization'])
+            logger.info("  -> Modelo de resumen cargado.")
+
+        if "zero_shot" in self.models:
+            logger.info(" -> Cargando modelo de clasificación zero-shot...")
+            self.zero_shot_classifier = pipeline("zero-shot-classification", model=self.config['models']['zero_shot'])
+            logger.info("  -> Modelo de clasificación zero-shot cargado.")
         
         logger.info("Todos los modelos han sido cargados.")
 
@@ -93,14 +104,7 @@ class NewsAnalyzer:
         if not self.zero_shot_classifier or not text:
             return None
         try:
-            # Se mueven los tópicos aquí para evitar dependencias circulares.
-            topics = [
-                "INSEGURIDAD", "ECONOMÍA", "INFLACIÓN", "DÓLAR", "POBREZA", 
-                "POLÍTICA", "CORRUPCIÓN", "JUSTICIA", "MEDIOS", "TRABAJO", 
-                "EDUCACIÓN", "SALUD", "PANDEMIA", "GÉNERO", "OTROS SOCIALES", 
-                "OTROS NO SOCIALES"
-            ]
-            result = self.zero_shot_classifier(text, topics, multi_label=False)
+            result = self.zero_shot_classifier(text, TOPIC_LABELS, multi_label=False)
             return result['labels'][0]
         except Exception as e:
             logger.error(f"Error en clasificación de tópicos para el texto: '{text[:50]}...'", exc_info=True)
@@ -113,8 +117,7 @@ class NewsAnalyzer:
         if not self.zero_shot_classifier or not text:
             return None
         try:
-            candidate_labels = ["noticia objetiva", "artículo de opinión"]
-            result = self.zero_shot_classifier(text, candidate_labels, multi_label=False)
+            result = self.zero_shot_classifier(text, SUBJECTIVITY_LABELS, multi_label=False)
             # Devuelve el diccionario completo con la etiqueta y el score
             return {"label": result['labels'][0], "score": result['scores'][0]}
         except Exception as e:
@@ -142,6 +145,89 @@ class NewsAnalyzer:
             logger.error(f"Error en clasificación de encuadre para el texto: '{text[:50]}...'", exc_info=True)
             return None
 
+    def classify_framing_batch(self, texts, topic, batch_size=16):
+        """
+        Clasifica el encuadre de varios textos del mismo tópico en una sola llamada al pipeline.
+        Devuelve una lista con un resultado (o None) por cada texto.
+        """
+        framing_labels = self.config.get("framing_labels", {}).get(topic)
+        if not self.zero_shot_classifier or not framing_labels or not texts:
+            return [None] * len(texts)
+
+        try:
+            results = self._zero_shot_batch(texts, framing_labels, batch_size)
+            return [{"label": r['labels'][0], "score": r['scores'][0]} for r in results]
+        except Exception:
+            logger.error(f"Error en clasificación de encuadre para un lote de {len(texts)} textos del tópico '{topic}'.", exc_info=True)
+            return [None] * len(texts)
+
+    def _zero_shot_batch(self, texts, candidate_labels, batch_size):
+        """
+        Ejecuta el clasificador zero-shot sobre una lista de textos y devuelve una lista de resultados
+        (el pipeline devuelve un dict en lugar de una lista si recibe un único texto).
+        """
+        results = self.zero_shot_classifier(list(texts), candidate_labels, multi_label=False, batch_size=batch_size)
+        return [results] if isinstance(results, dict) else results
+
+    def analyze_sentiment_batch(self, texts, batch_size=32):
+        """Analiza el sentimiento de varios textos en una sola llamada al pipeline."""
+        if not self.sentiment_analyzer or not texts:
+            return [None] * len(texts)
+        try:
+            return self.sentiment_analyzer(list(texts), batch_size=batch_size, truncation=True)
+        except Exception:
+            logger.error(f"Error en análisis de sentimiento para un lote de {len(texts)} textos.", exc_info=True)
+            return [None] * len(texts)
+
+    def extract_entities_batch(self, texts, batch_size=32):
+        """Extrae entidades de varios textos usando nlp.pipe."""
+        if not self.entity_extractor or not texts:
+            return [[] for _ in texts]
+        try:
+            labels = self.config.get("ner_labels", ["PER", "ORG", "LOC"])
+            return [
+                [{"text": ent.text, "label": ent.label_, "start_char": ent.start_char, "end_char": ent.end_char}
+                 for ent in doc.ents if ent.label_ in labels]
+                for doc in self.entity_extractor.pipe(texts, batch_size=batch_size)
+            ]
+        except Exception:
+            logger.error(f"Error en extracción de entidades para un lote de {len(texts)} textos.", exc_info=True)
+            return [[] for _ in texts]
+
+    def classify_topic_batch(self, texts, batch_size=16):
+        """Clasifica el tema de varios textos en una sola llamada al pipeline zero-shot."""
+        if not self.zero_shot_classifier or not texts:
+            return [None] * len(texts)
+        try:
+            return [r['labels'][0] for r in self._zero_shot_batch(texts, TOPIC_LABELS, batch_size)]
+        except Exception:
+            logger.error(f"Error en clasificación de tópicos para un lote de {len(texts)} textos.", exc_info=True)
+            return [None] * len(texts)
+
+    def analyze_subjectivity_batch(self, texts, batch_size=16):
+        """Clasifica varios textos como objetivos o de opinión en una sola llamada al pipeline."""
+        if not self.zero_shot_classifier or not texts:
+            return [None] * len(texts)
+        try:
+            return [{"label": r['labels'][0], "score": r['scores'][0]} for r in self._zero_shot_batch(texts, SUBJECTIVITY_LABELS, batch_size)]
+        except Exception:
+            logger.error(f"Error en análisis de subjetividad para un lote de {len(texts)} textos.", exc_info=True)
+            return [None] * len(texts)
+
+    def analyze_batch(self, texts):
+        """
+        Ejecuta el análisis de titular completo (sentimiento, entidades, tópico y subjetividad)
+        sobre un lote de textos. Devuelve un diccionario de resultados por cada texto.
+        """
+        sentiments = self.analyze_sentiment_batch(texts)
+        entities = self.extract_entities_batch(texts)
+        topics = self.classify_topic_batch(texts)
+        subjectivities = self.analyze_subjectivity_batch(texts)
+        return [
+            {"sentiment": sentiment, "entities": ents, "topic": topic, "subjectivity": subjectivity}
+            for sentiment, ents, topic, subjectivity in zip(sentiments, entities, topics, subjectivities)
+        ]
+
     def summarize_text(self, text, max_length=150, min_length=30):
         """Genera un resumen de un texto dado."""
         if not self.summarizer or not text:
@@ -229,5 +315,17 @@ class NewsAnalyzer:
                 found_quotes.append({"text": quote_text, "person": closest_person})
         
         return found_quotes
-# Instancia única del analizador para ser importada en otros módulos
-analyzer = NewsAnalyzer()
\ No newline at end of file
+# Instancia única del analizador para ser importada en otros módulos (`from analysis import analyzer`).
+# Se crea en el primer acceso y no al importar el módulo, así quien solo usa NewsAnalyzer no carga
+# todos los modelos.
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def __getattr__(name):
+    global _analyzer
+    if name == 'analyzer':
+        with _analyzer_lock:
+            if _analyzer is None:
+                _analyzer = NewsAnalyzer()
+            return _analyzer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
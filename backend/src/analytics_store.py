@@ -0,0 +1,336 @@
+import os
+import glob
+import json
+import shutil
+import datetime
+import duckdb
+import pandas as pd
+from db import read_connection
+from labels import SUBJECTIVITY_LABELS
+from logger import logger
+
+# Construir rutas relativas al archivo actual para mayor portabilidad
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(SRC_DIR) # Apunta a la carpeta 'backend'
+ANALYTICS_DIR = os.path.join(BACKEND_ROOT, 'data', 'analytics')
+
+# Columnas del espejo y su tipo en DuckDB (el cuerpo, el resumen y el JSON de entidades no se copian)
+HEADLINE_COLUMNS = {
+    'id': 'BIGINT', 'source': 'VARCHAR', 'headline': 'VARCHAR', 'topic': 'VARCHAR', 'collection_date': 'TIMESTAMP',
+    'sentiment_label': 'VARCHAR', 'sentiment_score': 'DOUBLE', 'subjectivity_label': 'VARCHAR',
+    'subjectivity_score': 'DOUBLE', 'framing_label': 'VARCHAR', 'story_id': 'BIGINT',
+}
+ENTITY_COLUMNS = {'headline_id': 'BIGINT', 'text': 'VARCHAR', 'label': 'VARCHAR'}
+# Columnas por las que se puede agrupar en counts()/daily_counts()
+GROUP_COLUMNS = {'source', 'topic', 'sentiment_label', 'subjectivity_label', 'framing_label'}
+
+def sql_path(*parts):
+    """Ruta como literal SQL de DuckDB (COPY y read_parquet no aceptan parámetros)."""
+    path = os.path.join(*parts).replace("'", "''")
+    return f"'{path}'"
+
+class AnalyticsStore:
+    """
+    Espejo columnar de los titulares para las agregaciones del dashboard.
+
+    Los datos se guardan en Parquet particionado por día (headlines/day=AAAA-MM-DD/data.parquet y lo
+    mismo para entities/) y se consultan con DuckDB, que los lee de forma vectorizada y solo abre las
+    particiones del rango de fechas pedido. Cada consulta usa una conexión DuckDB en memoria propia,
+    así que el dashboard nunca toma un lock sobre el espejo.
+
+    sync() es incremental: reescribe solo las particiones de los días con titulares nuevos (id mayor que
+    el último sincronizado) y las de los últimos `refresh_days` días, donde el pipeline todavía completa
+    story_id y framing. Cada partición se escribe en un archivo temporal y se reemplaza de forma atómica.
+    """
+
+    def __init__(self, directory=ANALYTICS_DIR):
+        self.directory = directory
+        self.headlines_dir = os.path.join(directory, 'headlines')
+        self.entities_dir = os.path.join(directory, 'entities')
+        self.state_path = os.path.join(directory, 'state.json')
+        os.makedirs(self.headlines_dir, exist_ok=True)
+        os.makedirs(self.entities_dir, exist_ok=True)
+
+    # --- Sincronización desde SQLite ---
+
+    def _read_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_state(self, state):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path) # Reemplazo atómico
+
+    def _write_partition(self, con, directory, day, df, columns):
+        """Escribe la partición de un día con los tipos de `columns` (también si `df` está vacío)."""
+        partition = os.path.join(directory, f"day={day}")
+        os.makedirs(partition, exist_ok=True)
+        path = os.path.join(partition, 'data.parquet')
+        tmp_path = f"{path}.tmp"
+        con.register('batch', df)
+        try:
+            select = ", ".join(f"CAST({name} AS {kind}) AS {name}" for name, kind in columns.items())
+            con.execute(f"COPY (SELECT {select} FROM batch) TO {sql_path(tmp_path)} (FORMAT PARQUET)")
+        finally:
+            con.unregister('batch')
+        os.replace(tmp_path, path)
+
+    def _sync_day(self, conn, con, day):
+        # Rangos sobre collection_date (y no date(collection_date)) para usar el índice
+        day_range = "h.collection_date >= ? AND h.collection_date < date(?, '+1 day')"
+        headlines = pd.read_sql(
+            f"SELECT {', '.join('h.' + name for name in HEADLINE_COLUMNS)} FROM headlines h WHERE {day_range}",
+            conn, params=(day, day)
+        )
+        entities = pd.read_sql(
+            f"""SELECT he.headline_id, e.text, e.label FROM headlines h
+                JOIN headline_entities he ON he.headline_id = h.id JOIN entities e ON e.id = he.entity_id
+                WHERE {day_range}""",
+            conn, params=(day, day)
+        )
+        if headlines.empty:
+            # El día ya no tiene titulares (p. ej. se borraron de la DB)
+            for directory in (self.headlines_dir, self.entities_dir):
+                shutil.rmtree(os.path.join(directory, f"day={day}"), ignore_errors=True)
+            return 0
+        self._write_partition(con, self.headlines_dir, day, headlines, HEADLINE_COLUMNS)
+        self._write_partition(con, self.entities_dir, day, entities, ENTITY_COLUMNS)
+        return len(headlines)
+
+    def sync(self, refresh_days=3, full=False):
+        """
+        Actualiza el espejo desde SQLite. Con `full=True` lo reconstruye entero (y borra las particiones
+        de días que ya no tienen titulares). Devuelve la cantidad de titulares escritos.
+        """
+        state = {} if full else self._read_state()
+        last_id = state.get('last_id', 0)
+        with read_connection() as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM headlines").fetchone()[0]
+            if full:
+                days = {row[0] for row in conn.execute("SELECT DISTINCT date(collection_date) FROM headlines")}
+            else:
+                since = (datetime.date.today() - datetime.timedelta(days=refresh_days)).isoformat()
+                days = {row[0] for row in conn.execute("SELECT DISTINCT date(collection_date) FROM headlines WHERE id > ?", (last_id,))}
+                days |= {row[0] for row in conn.execute("SELECT DISTINCT date(collection_date) FROM headlines WHERE collection_date >= ?", (since,))}
+            days.discard(None)
+
+            con = duckdb.connect(':memory:')
+            try:
+                written = sum(self._sync_day(conn, con, day) for day in sorted(days))
+            finally:
+                con.close()
+
+        if full:
+            for directory in (self.headlines_dir, self.entities_dir):
+                for partition in glob.glob(os.path.join(directory, 'day=*')):
+                    if os.path.basename(partition)[len('day='):] not in days:
+                        shutil.rmtree(partition, ignore_errors=True)
+
+        self._write_state({'last_id': max_id, 'synced_at': datetime.datetime.now().isoformat(timespec='seconds')})
+        logger.info(f"Espejo analítico sincronizado: {len(days)} días, {written} titulares.")
+        return written
+
+    def sync_range(self, date_from, date_to):
+        """
+        Reescribe las particiones de los días entre `date_from` y `date_to` ('AAAA-MM-DD', inclusivos) y borra
+        las de los días que ya no tienen titulares (p. ej. después de archivar o restaurar un mes).
+        """
+        days = {os.path.basename(partition)[len('day='):] for partition in glob.glob(os.path.join(self.headlines_dir, 'day=*'))}
+        days = {day for day in days if date_from <= day <= date_to}
+        with read_connection() as conn:
+            days |= {row[0] for row in conn.execute(
+                "SELECT DISTINCT date(collection_date) FROM headlines WHERE collection_date >= ? AND collection_date < date(?, '+1 day')",
+                (date_from, date_to)
+            )}
+            con = duckdb.connect(':memory:')
+            try:
+                written = sum(self._sync_day(conn, con, day) for day in sorted(days))
+            finally:
+                con.close()
+        logger.info(f"Espejo analítico: {len(days)} días reescritos entre {date_from} y {date_to}, {written} titulares.")
+        return written
+
+    # --- Consultas ---
+
+    def has_data(self):
+        return bool(glob.glob(os.path.join(self.headlines_dir, 'day=*', 'data.parquet')))
+
+    def _where(self, filters):
+        """
+        Condiciones SQL y parámetros a partir de los filtros del dashboard:
+        sources, topics (listas), date_from, date_to (fechas, inclusivas) y headline_ids (p. ej. de la búsqueda FTS).
+        El filtro por `day` permite a DuckDB descartar particiones enteras.
+        """
+        filters = filters or {}
+        conditions, params = [], []
+        if filters.get('sources'):
+            conditions.append("list_contains(?, h.source)")
+            params.append(list(filters['sources']))
+        if filters.get('topics'):
+            conditions.append("list_contains(?, h.topic)")
+            params.append(list(filters['topics']))
+        if filters.get('date_from'):
+            conditions.append("h.day >= CAST(? AS DATE) AND h.collection_date >= CAST(? AS DATE)")
+            params.extend([str(filters['date_from'])] * 2)
+        if filters.get('date_to'):
+            conditions.append("h.day <= CAST(? AS DATE) AND h.collection_date < CAST(? AS DATE) + INTERVAL 1 DAY")
+            params.extend([str(filters['date_to'])] * 2)
+        if filters.get('headline_ids') is not None:
+            conditions.append("h.id IN (SELECT id FROM filter_ids)")
+        return " AND ".join(conditions) or "TRUE", params
+
+    def query(self, sql, filters=None, params=(), tables=None):
+        """
+        Ejecuta una consulta sobre las vistas `headlines` y `headline_entities`. `{where}` en la consulta se
+        reemplaza por las condiciones de `filters` (sobre el alias `h` de headlines); sus parámetros van
+        antes que `params`. `tables` registra DataFrames adicionales por nombre. Devuelve un DataFrame.
+        """
+        if not self.has_data():
+            return pd.DataFrame()
+        where, where_params = self._where(filters)
+        con = duckdb.connect(':memory:')
+        try:
+            con.execute(f"CREATE VIEW headlines AS SELECT * FROM read_parquet({sql_path(self.headlines_dir, 'day=*', 'data.parquet')}, hive_partitioning = true)")
+            con.execute(f"CREATE VIEW headline_entities AS SELECT * EXCLUDE (day) FROM read_parquet({sql_path(self.entities_dir, 'day=*', 'data.parquet')}, hive_partitioning = true)")
+            if filters and filters.get('headline_ids') is not None:
+                con.register('filter_ids', pd.DataFrame({'id': list(filters['headline_ids'])}, dtype='int64'))
+            for name, table in (tables or {}).items():
+                con.register(name, table)
+            return con.execute(sql.format(where=where), list(where_params) + list(params)).df()
+        finally:
+            con.close()
+
+    def filter_options(self):
+        """Medios, tópicos y rango de fechas disponibles (para armar los filtros del dashboard)."""
+        df = self.query("""
+            SELECT list_sort(list(DISTINCT source)) AS sources, list_sort(list(DISTINCT topic)) AS topics,
+                   MIN(collection_date) AS min_date, MAX(collection_date) AS max_date
+            FROM headlines h
+        """)
+        if df.empty or pd.isna(df.loc[0, 'min_date']):
+            return None
+        row = df.iloc[0]
+        return {'sources': list(row['sources']), 'topics': [t for t in row['topics'] if t is not None],
+                'min_date': row['min_date'].date(), 'max_date': row['max_date'].date()}
+
+    def summary(self, filters=None):
+        """Cantidad de titulares, medios y tópicos que cumplen los filtros."""
+        df = self.query("""
+            SELECT COUNT(*) AS headlines, COUNT(DISTINCT source) AS sources, COUNT(DISTINCT topic) AS topics
+            FROM headlines h WHERE {where}
+        """, filters)
+        if df.empty:
+            return {'headlines': 0, 'sources': 0, 'topics': 0}
+        return {key: int(value) for key, value in df.iloc[0].items()}
+
+    def counts(self, by, filters=None):
+        """Cantidad de titulares agrupados por las columnas `by` (sin nulos), de mayor a menor."""
+        by = [by] if isinstance(by, str) else list(by)
+        if not set(by) <= GROUP_COLUMNS:
+            raise ValueError(f"Columnas de agrupación no permitidas: {set(by) - GROUP_COLUMNS}")
+        columns = ", ".join(by)
+        not_null = " AND ".join(f"{column} IS NOT NULL" for column in by)
+        return self.query(f"""
+            SELECT {columns}, COUNT(*) AS count FROM headlines h
+            WHERE {{where}} AND {not_null}
+            GROUP BY {columns} ORDER BY count DESC
+        """, filters)
+
+    def daily_counts(self, by=None, filters=None):
+        """Cantidad de titulares por día (y opcionalmente por la columna `by`)."""
+        if by is not None and by not in GROUP_COLUMNS:
+            raise ValueError(f"Columna de agrupación no permitida: {by}")
+        group = f", {by}" if by else ""
+        not_null = f" AND {by} IS NOT NULL" if by else ""
+        return self.query(f"""
+            SELECT CAST(collection_date AS DATE) AS date{group}, COUNT(*) AS count FROM headlines h
+            WHERE {{where}}{not_null}
+            GROUP BY ALL ORDER BY date
+        """, filters)
+
+    def objectivity_index(self, filters=None):
+        """Porcentaje de titulares objetivos sobre los analizados por subjetividad, por medio."""
+        # Los parámetros de {where} van primero: la etiqueta se compara después, fuera del CTE
+        return self.query("""
+            WITH analyzed AS (
+                SELECT source, subjectivity_label FROM headlines h WHERE {where} AND subjectivity_label IS NOT NULL
+            )
+            SELECT source, 100.0 * AVG(CASE WHEN subjectivity_label = ? THEN 1 ELSE 0 END) AS objectivity,
+                   COUNT(*) AS analyzed
+            FROM analyzed GROUP BY source ORDER BY objectivity
+        """, filters, [SUBJECTIVITY_LABELS[0]])
+
+    def blind_spots(self, source_types, by='topic', labels=None, filters=None, top_n=10):
+        """
+        Los `top_n` tópicos (o entidades) más cubiertos por los medios internacionales, con su porcentaje de
+        cobertura internacional (international_pct) y el de los medios locales entre esos mismos ítems (local_pct).
+        `source_types` mapea cada medio a 'international' o 'local'.
+        """
+        types = pd.DataFrame(list(source_types.items()), columns=['source', 'source_type'])
+        if by == 'topic':
+            items = "SELECT source_type, topic AS item FROM typed WHERE topic IS NOT NULL"
+            params = []
+        else:
+            items = """SELECT t.source_type, e.text AS item FROM typed t
+                       JOIN headline_entities e ON e.headline_id = t.id WHERE list_contains(?, e.label)"""
+            params = [list(labels or [])]
+        return self.query(f"""
+            WITH typed AS (
+                SELECT h.id, h.topic, st.source_type FROM headlines h JOIN source_types st ON st.source = h.source
+                WHERE {{where}}
+            ),
+            items AS ({items}),
+            intl AS (
+                SELECT item, COUNT(*) / SUM(COUNT(*)) OVER () AS share FROM items
+                WHERE source_type = 'international' GROUP BY item ORDER BY share DESC, item LIMIT ?
+            ),
+            loc AS (
+                SELECT item, COUNT(*) AS n FROM items
+                WHERE source_type = 'local' AND item IN (SELECT item FROM intl) GROUP BY item
+            )
+            SELECT i.item, 100 * i.share AS international_pct, COALESCE(100 * l.n / SUM(l.n) OVER (), 0) AS local_pct
+            FROM intl i LEFT JOIN loc l ON l.item = i.item
+            ORDER BY international_pct DESC, i.item
+        """, filters, params + [int(top_n)], tables={'source_types': types})
+
+    def headlines(self, filters=None, limit=500):
+        """Los titulares más recientes que cumplen los filtros (titular, medio, fecha, análisis)."""
+        return self.query("""
+            SELECT id, headline, source, collection_date, topic, sentiment_label, sentiment_score
+            FROM headlines h WHERE {where} ORDER BY collection_date DESC LIMIT ?
+        """, filters, [int(limit)])
+
+    def entity_count_sample(self, filters=None, limit=5000):
+        """Muestra (estable entre recargas) de titulares con su puntaje de sentimiento y su cantidad de entidades."""
+        return self.query("""
+            SELECT h.sentiment_score, h.sentiment_label, COUNT(e.headline_id) AS entity_count
+            FROM (SELECT id, sentiment_score, sentiment_label FROM headlines h WHERE {where} ORDER BY hash(id) LIMIT ?) h
+            LEFT JOIN headline_entities e ON e.headline_id = h.id
+            GROUP BY h.id, h.sentiment_score, h.sentiment_label
+        """, filters, [int(limit)])
+
+_store = None
+
+def get_analytics_store():
+    """Devuelve la instancia compartida del espejo analítico."""
+    global _store
+    if _store is None:
+        _store = AnalyticsStore()
+    return _store
+
+# --- Bloque de prueba: sincronización y consultas ---
+if __name__ == '__main__':
+    import time
+    store = get_analytics_store()
+    start = time.perf_counter()
+    written = store.sync(full=True)
+    print(f"Espejo reconstruido: {written} titulares en {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    print(store.counts(['source', 'sentiment_label']).head(10))
+    print(store.objectivity_index())
+    print(f"Consultas en {time.perf_counter() - start:.2f} s")
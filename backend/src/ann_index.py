@@ -0,0 +1,247 @@
+import os
+import json
+import threading
+import numpy as np
+import hnswlib
+from embedding_store import EmbeddingStore, EMBEDDINGS_DIR, EMBEDDING_DIM, load_encoder
+from db import filtrar_ids_titulares
+from logger import logger
+
+ANN_INDEX_PATH = os.path.join(EMBEDDINGS_DIR, 'hnsw.bin')
+ANN_META_PATH = os.path.join(EMBEDDINGS_DIR, 'hnsw.json')
+# Con filtros selectivos (pocos titulares candidatos) una búsqueda exacta es más rápida y precisa que el índice
+EXACT_SEARCH_LIMIT = 50_000
+
+class HeadlineIndex:
+    """
+    Índice HNSW (hnswlib, producto interno sobre vectores normalizados) de los embeddings de titulares.
+
+    Se construye de forma incremental a partir del EmbeddingStore: `sync()` agrega al índice las filas
+    nuevas del almacén y lo guarda en disco junto con cuántas filas lleva indexadas. Las etiquetas del
+    índice son los headlines.id, así que un ID que se vuelve a agregar reemplaza su vector.
+
+    `sync()` solo se ejecuta fuera de la API (`python main.py embeddings` y la ingesta, con el bloqueo
+    de la DB). Las búsquedas no escriben nada: cargan el índice guardado, le agregan en memoria las pocas
+    filas nuevas del almacén y, si no hay un índice válido en disco (p. ej. tras una compactación),
+    responden con una búsqueda exacta hasta que se vuelva a construir.
+    """
+
+    def __init__(self, store=None, path=ANN_INDEX_PATH, meta_path=ANN_META_PATH, M=16, ef_construction=200, ef_search=64):
+        self.store = store or EmbeddingStore()
+        self.path = path
+        self.meta_path = meta_path
+        self.M = M
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self._lock = threading.RLock()
+        self._index = None
+        self._indexed_rows = 0
+        self._last_id = None
+        self._meta_mtime = None # mtime del hnsw.json cargado, para notar que otro proceso guardó uno nuevo
+
+    def _new_index(self, capacity):
+        index = hnswlib.Index(space='ip', dim=self.store.dim)
+        index.init_index(max_elements=max(capacity, 1024), M=self.M, ef_construction=self.ef_construction)
+        index.set_ef(self.ef_search)
+        return index
+
+    def _load(self):
+        """
+        Carga el índice guardado en disco si existe y coincide con el almacén. Devuelve False (y deja el
+        índice sin cargar) si no existe o quedó desfasado por una compactación.
+        """
+        self._index, self._indexed_rows, self._last_id, self._meta_mtime = None, 0, None, None
+        try:
+            meta_mtime = os.stat(self.meta_path).st_mtime_ns
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return False
+        if not os.path.exists(self.path) or not self._matches_store(meta['indexed_rows'], meta['last_id']):
+            return False
+        index = hnswlib.Index(space='ip', dim=self.store.dim)
+        index.load_index(self.path, max_elements=max(meta['indexed_rows'], len(self.store)))
+        index.set_ef(self.ef_search)
+        self._index, self._indexed_rows, self._last_id, self._meta_mtime = index, meta['indexed_rows'], meta['last_id'], meta_mtime
+        logger.info(f"Índice HNSW cargado: {self._indexed_rows} filas indexadas.")
+        return True
+
+    def _matches_store(self, indexed_rows, last_id):
+        """Comprueba que las filas indexadas siguen siendo un prefijo del almacén (no hubo compactación)."""
+        if indexed_rows == 0:
+            return True
+        ids, _ = self.store.vectors()
+        return indexed_rows <= len(ids) and int(ids[indexed_rows - 1]) == last_id
+
+    def _add_pending(self, chunk_size=50_000):
+        """Agrega al índice cargado (solo en memoria) las filas del almacén que todavía no tiene. Devuelve cuántas."""
+        ids, vectors = self.store.vectors()
+        pending = len(ids) - self._indexed_rows
+        if pending <= 0:
+            return 0
+        if self._index.get_max_elements() < len(ids):
+            self._index.resize_index(max(len(ids), 2 * self._index.get_max_elements()))
+        for start in range(self._indexed_rows, len(ids), chunk_size):
+            end = min(start + chunk_size, len(ids))
+            self._index.add_items(np.asarray(vectors[start:end], dtype=np.float32), np.asarray(ids[start:end]))
+        self._indexed_rows, self._last_id = len(ids), int(ids[-1])
+        return pending
+
+    def sync(self, chunk_size=50_000):
+        """
+        Agrega al índice las filas nuevas del almacén (o lo reconstruye si el almacén fue compactado) y lo
+        guarda en disco. Devuelve cuántas filas se indexaron. Solo para procesos con el bloqueo de la DB.
+        """
+        with self._lock:
+            if not self._load():
+                # El almacén fue compactado o el índice no existe: se reconstruye desde cero
+                self._index, self._indexed_rows, self._last_id = self._new_index(len(self.store)), 0, None
+            pending = self._add_pending(chunk_size)
+            if pending:
+                self._save()
+                logger.info(f"Índice HNSW actualizado: {pending} filas nuevas, {self._indexed_rows} en total.")
+            return pending
+
+    def _save(self):
+        # Nombres temporales únicos por proceso e hilo: dos escritores nunca mezclan sus archivos
+        suffix = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_path = f"{self.path}.{suffix}"
+        self._index.save_index(tmp_path)
+        os.replace(tmp_path, self.path)
+        tmp_meta = f"{self.meta_path}.{suffix}"
+        with open(tmp_meta, 'w') as f:
+            json.dump({"indexed_rows": self._indexed_rows, "last_id": self._last_id, "M": self.M, "ef_construction": self.ef_construction}, f)
+        os.replace(tmp_meta, self.meta_path)
+        self._meta_mtime = os.stat(self.meta_path).st_mtime_ns
+
+    def _refresh(self):
+        """Pone al día el índice de una búsqueda sin escribir en disco. Devuelve False si no hay un índice válido."""
+        try:
+            meta_mtime = os.stat(self.meta_path).st_mtime_ns
+        except OSError:
+            meta_mtime = None
+        if self._index is None or meta_mtime != self._meta_mtime or not self._matches_store(self._indexed_rows, self._last_id):
+            if not self._load():
+                return False
+        self._add_pending()
+        return True
+
+    def search(self, query_vector, k=20):
+        """Devuelve una lista de (headline_id, similitud) con los k vecinos aproximados más cercanos."""
+        with self._lock:
+            if not self._refresh():
+                logger.warning("No hay un índice HNSW válido; búsqueda exacta hasta ejecutar 'python main.py embeddings'.")
+                return self.exact_search_all(query_vector, k)
+            count = self._index.get_current_count()
+            if count == 0:
+                return []
+            k = min(k, count)
+            self._index.set_ef(max(self.ef_search, k))
+            labels, distances = self._index.knn_query(np.asarray(query_vector, dtype=np.float32).reshape(1, -1), k=k)
+        # En el espacio 'ip' hnswlib devuelve 1 - producto interno
+        return [(int(label), float(1 - distance)) for label, distance in zip(labels[0], distances[0])]
+
+    def exact_search_all(self, query_vector, k=20, block=100_000):
+        """Búsqueda exacta sobre todo el almacén, leyendo el memmap por bloques."""
+        ids, vectors = self.store.vectors()
+        if len(ids) == 0:
+            return []
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        similarities = np.concatenate([np.asarray(vectors[i:i + block], dtype=np.float32) @ query_vector for i in range(0, len(ids), block)])
+        top = np.argsort(-similarities)[:k]
+        return [(int(ids[i]), float(similarities[i])) for i in top]
+
+    def exact_search(self, query_vector, headline_ids, k=20):
+        """Búsqueda exacta restringida a `headline_ids` (se usa cuando los filtros dejan pocos candidatos)."""
+        _, vectors = self.store.vectors()
+        headline_ids = np.asarray(headline_ids, dtype=np.int64)
+        rows = self.store.rows_for(headline_ids)
+        found = rows >= 0
+        if not found.any():
+            return []
+        headline_ids, rows = headline_ids[found], rows[found]
+        order = np.argsort(rows) # Leer el memmap en orden de fila
+        headline_ids, rows = headline_ids[order], rows[order]
+        similarities = np.asarray(vectors[rows], dtype=np.float32) @ np.asarray(query_vector, dtype=np.float32)
+        top = np.argsort(-similarities)[:k]
+        return [(int(headline_ids[i]), float(similarities[i])) for i in top]
+
+_headline_index = None
+_headline_index_lock = threading.Lock()
+
+def get_headline_index():
+    """Devuelve el índice de titulares compartido (cargado una sola vez)."""
+    global _headline_index
+    with _headline_index_lock:
+        if _headline_index is None:
+            _headline_index = HeadlineIndex()
+        return _headline_index
+
+def semantic_search(query, k=20, source=None, topic=None, date_from=None, date_to=None, oversampling=4, max_rounds=4):
+    """
+    Busca los titulares semánticamente más cercanos a `query`, opcionalmente filtrados por medio, tópico y fecha.
+    Devuelve una lista de (headline_id, similitud) ordenada por similitud.
+
+    Con filtros, si quedan pocos candidatos se hace una búsqueda exacta sobre ellos; si no, se consulta el
+    índice pidiendo más vecinos de los necesarios (oversampling) y se filtran en SQL, ampliando la búsqueda
+    hasta completar k resultados o agotar `max_rounds`.
+    """
+    index = get_headline_index()
+    query_vector = load_encoder().encode([query], normalize_embeddings=True)[0]
+    filters = {"source": source, "topic": topic, "date_from": date_from, "date_to": date_to}
+    if not any(value is not None for value in filters.values()):
+        return index.search(query_vector, k)
+
+    candidate_ids = filtrar_ids_titulares(limit=EXACT_SEARCH_LIMIT + 1, **filters)
+    if len(candidate_ids) <= EXACT_SEARCH_LIMIT:
+        return index.exact_search(query_vector, candidate_ids, k)
+
+    n_neighbors = k * oversampling
+    for _ in range(max_rounds):
+        neighbors = index.search(query_vector, n_neighbors)
+        allowed = set(filtrar_ids_titulares(headline_ids=[headline_id for headline_id, _ in neighbors], **filters))
+        results = [(headline_id, score) for headline_id, score in neighbors if headline_id in allowed]
+        if len(results) >= k or len(neighbors) < n_neighbors:
+            break
+        n_neighbors *= oversampling
+    return results[:k]
+
+# --- Bloque de prueba: latencia p50/p99 con 100k y 1M de titulares ---
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(0)
+    for n_vectors in (100_000, 1_000_000):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = EmbeddingStore(tmp_dir)
+            for start in range(0, n_vectors, 100_000):
+                store.append(np.arange(start, start + 100_000), rng.standard_normal((100_000, EMBEDDING_DIM), dtype=np.float32))
+            index = HeadlineIndex(store, os.path.join(tmp_dir, 'hnsw.bin'), os.path.join(tmp_dir, 'hnsw.json'))
+
+            start = time.perf_counter()
+            index.sync()
+            print(f"\n🚀 {n_vectors:,} titulares | construcción del índice: {time.perf_counter() - start:.1f} s")
+
+            # Consultas cercanas a vectores existentes, como un titular parafraseado
+            _, vectors = store.vectors()
+            query_rows = rng.integers(0, n_vectors, 200)
+            queries = np.asarray(vectors[query_rows], dtype=np.float32) + 0.3 * rng.standard_normal((200, EMBEDDING_DIM), dtype=np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+            def brute_force(query, k=10, block=100_000):
+                scores = np.concatenate([np.asarray(vectors[i:i + block], dtype=np.float32) @ query for i in range(0, n_vectors, block)])
+                return [(int(row), float(scores[row])) for row in np.argpartition(-scores, k)[:k]]
+
+            for name, search in (("HNSW", lambda q: index.search(q, 10)), ("Exacta (memmap)", brute_force)):
+                latencies, results = [], []
+                for query in queries[:50] if name.startswith("Exacta") else queries:
+                    start = time.perf_counter()
+                    results.append({headline_id for headline_id, _ in search(query)})
+                    latencies.append((time.perf_counter() - start) * 1000)
+                print(f"{name}: p50 {np.percentile(latencies, 50):.2f} ms | p99 {np.percentile(latencies, 99):.2f} ms")
+                if name == "HNSW":
+                    ann_results = results
+                else:
+                    recall = np.mean([len(a & e) / len(e) for a, e in zip(ann_results, results)])
+                    print(f"Recall@10 del índice HNSW frente a la búsqueda exacta: {recall:.1%}")
@@ -1,7 +1,18 @@
 import sys
 import os
-from fastapi import FastAPI, BackgroundTasks, Depends, Query
-from fastapi.responses import JSONResponse, FileResponse
+import asyncio
+import functools
+import base64
+import csv
+import io
+import json
+import datetime
+import threading
+from typing import Optional, List
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import FastAPI, Depends, Query, Request
+from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -15,13 +26,16 @@ FRONTEND_BUILD_DIR = os.path.join(PROJECT_ROOT, 'frontend', 'dist')
 if SRC_DIR not in sys.path:
     sys.path.insert(0, SRC_DIR)
 
-from scraper import SOURCES_TO_SCRAPE
-from preprocessing import run_full_process
+from scraper import load_sources, SOURCES_CONFIG_PATH
 from logger import logger
 import math
-import pandas as pd # Sigue siendo necesario para el DataFrame
-from db import get_db_connection, close_db_connection
-from sqlite3 import Connection
+import orjson
+from db import (read_connection, close_read_pools, READ_POOL_SIZE, buscar_titulares, obtener_cuerpo_articulo, contar_rollup, resumen_rollup,
+                indice_objetividad, ROLLUP_DIMENSIONS, listar_titulares, contar_titulares, titulares_de_fuente, titulares_por_ids,
+                obtener_titular, listar_citas, listar_eventos, consulta_exportacion, iterar_filas, version_de_datos,
+                crear_trabajo_scrape, cancelar_trabajo_scrape, obtener_trabajo_scrape, ultimo_trabajo_scrape)
+from micro_batching import MicroBatcher, QueueFullError
+from response_cache import ResponseCache
 
 # --- Inicialización de la App ---
 app = FastAPI(
@@ -40,141 +54,478 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-# --- Estado del Scraper ---
-scraper_status = {"is_running": False, "last_run": None}
+# --- Análisis bajo demanda con micro-batching ---
+# Solo los modelos que usa el análisis (nunca el de resumen), cargados en el primer pedido a /api/analyze
+_analysis_model = None
+_analysis_model_lock = threading.Lock()
 
-def background_scraper_task():
-    global scraper_status
-    scraper_status["is_running"] = True
-    logger.info("Iniciando tarea de scraping en segundo plano...")
+def get_analysis_model():
+    """
+    Devuelve el NewsAnalyzer de /api/analyze, creándolo en el primer uso con los modelos de sentimiento y NER
+    y, salvo que el tópico y la subjetividad usen clasificadores destilados, el zero-shot. Si la carga falla
+    no queda nada guardado y el siguiente pedido vuelve a intentarlo.
+    """
+    global _analysis_model
+    with _analysis_model_lock:
+        if _analysis_model is None:
+            from analysis import NewsAnalyzer, CONFIG_PATH # Importación diferida: transformers y spaCy
+            from distillation import get_distilled_classifier, uses_distilled
+            with open(CONFIG_PATH, 'r') as f:
+                config = json.load(f)
+            distilled = [task for task in ("topic", "subjectivity") if uses_distilled(config, task) and get_distilled_classifier(task)]
+            _analysis_model = NewsAnalyzer(models=("sentiment", "ner") + (() if len(distilled) == 2 else ("zero_shot",)))
+        return _analysis_model
+
+def analyze_texts_batch(texts):
+    """
+    Analiza un lote de textos con los modelos de NLP (se ejecuta fuera del event loop). El tópico y la
+    subjetividad pasan por los clasificadores destilados cuando config.json los elige, como en el pipeline.
+    """
+    from distillation import classify_batch
+    model = get_analysis_model()
+    sentiments = model.analyze_sentiment_batch(texts)
+    entities = model.extract_entities_batch(texts)
+    topics = classify_batch(model, "topic", texts)
+    subjectivities = classify_batch(model, "subjectivity", texts)
+    return [
+        {"sentiment": sentiment, "entities": ents, "topic": topic, "subjectivity": subjectivity}
+        for sentiment, ents, topic, subjectivity in zip(sentiments, entities, topics, subjectivities)
+    ]
+
+# Agrupa las peticiones concurrentes a /api/analyze en lotes de hasta 16 textos, esperando como máximo 15 ms.
+analysis_batcher = MicroBatcher(analyze_texts_batch, max_batch_size=16, max_wait_ms=15, max_queue_size=256, request_timeout=30.0)
+
+# Carga en frío de los modelos: la inicia el primer pedido a /api/analyze y la esperan, como mucho
+# request_timeout y con el mismo límite de cola que el batcher, los que llegan mientras tanto. Así la carga
+# no consume el timeout del análisis propiamente dicho.
+analysis_model_loading = None
+analysis_model_waiters = 0
+
+class ModelsLoadingError(Exception):
+    """Se lanza cuando los modelos de análisis todavía se están cargando y el pedido no puede esperar más."""
+
+def _forget_failed_load(future):
+    # Una carga fallida no queda guardada: el siguiente pedido la reintenta
+    global analysis_model_loading
+    if future is analysis_model_loading and (future.cancelled() or future.exception() is not None):
+        analysis_model_loading = None
+
+async def wait_for_analysis_model():
+    """Espera a que los modelos de análisis estén cargados. Lanza QueueFullError o ModelsLoadingError."""
+    global analysis_model_loading, analysis_model_waiters
+    if _analysis_model is not None:
+        return
+    if analysis_model_loading is None:
+        analysis_model_loading = asyncio.get_running_loop().run_in_executor(None, get_analysis_model)
+        analysis_model_loading.add_done_callback(_forget_failed_load)
+    if analysis_model_waiters >= analysis_batcher.max_queue_size:
+        raise QueueFullError("La cola de análisis está llena.")
+    analysis_model_waiters += 1
     try:
-        run_full_process()
-        logger.info("Tarea de scraping completada.")
-        scraper_status["last_run"] = "Success"
-    except Exception as e:
-        logger.error(f"La tarea de scraping falló: {e}")
-        scraper_status["last_run"] = f"Failed: {e}"
+        await asyncio.wait_for(asyncio.shield(analysis_model_loading), analysis_batcher.request_timeout)
+    except asyncio.TimeoutError:
+        raise ModelsLoadingError("Los modelos de análisis se están cargando.")
     finally:
-        scraper_status["is_running"] = False
+        analysis_model_waiters -= 1
 
-# --- Endpoints de la API ---
+class AnalyzeRequest(BaseModel):
+    text: str = Field(..., min_length=1, max_length=5000, description="Texto a analizar")
+
+# --- Acceso a datos fuera del event loop ---
+# sqlite3 es bloqueante: las consultas se ejecutan en un pool de hilos acotado al tamaño del pool de
+# conexiones de lectura, así una consulta lenta no frena al resto de las peticiones y, con muchos
+# clientes, las consultas esperan su turno en la cola del executor en lugar de acumular hilos.
+query_executor = ThreadPoolExecutor(max_workers=READ_POOL_SIZE, thread_name_prefix="db-query")
+
+async def run_blocking(fn, *args, **kwargs):
+    """Ejecuta una función bloqueante en el pool de consultas y espera su resultado sin bloquear el event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(query_executor, functools.partial(fn, *args, **kwargs))
+
+def _with_read_connection(fn, *args, **kwargs):
+    # La conexión se pide y se usa en el mismo hilo del pool
+    with read_connection() as conn:
+        return fn(conn, *args, **kwargs)
 
-# Define una dependencia para obtener la conexión a la DB
-def get_db() -> Connection:
+async def run_query(fn, *args, **kwargs):
     """
-    Dependencia de FastAPI que obtiene una conexión a la base de datos
-    del pool de conexiones por hilo y la cierra al finalizar la petición.
+    Como run_blocking, para las funciones de db que reciben la conexión como primer argumento: presta
+    una conexión de solo lectura del pool (con WAL, las lecturas no esperan a una ingesta en curso).
     """
-    db = None
+    return await run_blocking(_with_read_connection, fn, *args, **kwargs)
+
+def rows_response(rows):
+    """
+    Respuesta JSON serializada con orjson. Evita el jsonable_encoder de FastAPI, que recorre cada fila
+    en el event loop y con listados grandes lo bloquea tanto como la propia consulta.
+    """
+    return Response(orjson.dumps(rows), media_type="application/json")
+
+# --- Caché de respuestas por versión de los datos ---
+# Los datos solo cambian cuando se confirma una escritura (ver db.marcar_datos_modificados), así que las
+# respuestas de estos endpoints se cachean con un ETag derivado de la versión: un sondeo sin cambios
+# recibe un 304 (o el cuerpo guardado) sin ejecutar SQL ni volver a serializar.
+# /api/events no se cachea: su ventana de horas depende del momento de la consulta.
+response_cache = ResponseCache(max_entries=512)
+CACHED_PREFIXES = ("/api/headlines", "/api/quotes", "/api/sources", "/api/stats")
+UNCACHED_PATHS = {"/api/headlines/semantic-search"} # depende del índice ANN, no de la DB
+
+def response_version(path):
+    version = version_de_datos()
+    if path == "/api/sources":
+        # Las fuentes no salen de la DB sino de sources.json
+        try:
+            version += f"-{os.stat(SOURCES_CONFIG_PATH).st_mtime_ns}"
+        except OSError:
+            pass
+    return version
+
+@app.middleware("http")
+async def data_version_cache(request: Request, call_next):
+    path = request.url.path
+    if request.method != "GET" or not path.startswith(CACHED_PREFIXES) or path in UNCACHED_PATHS:
+        return await call_next(request)
+
+    version = response_version(path)
+    etag = ResponseCache.etag(version, path, request.query_params.multi_items())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if ResponseCache.matches(request.headers.get("if-none-match"), etag):
+        response_cache.record_not_modified()
+        return Response(status_code=304, headers=headers)
+    cached = response_cache.get(version, etag)
+    if cached is not None:
+        media_type, body = cached
+        return Response(body, media_type=media_type, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    media_type = response.headers.get("content-type")
+    response_cache.put(version, etag, media_type, body)
+    return Response(body, media_type=media_type, headers=headers)
+
+@app.on_event("shutdown")
+async def stop_analysis_batcher():
+    await analysis_batcher.stop()
+    query_executor.shutdown(wait=False, cancel_futures=True)
+    close_read_pools()
+
+# --- Endpoints de la API ---
+
+def encode_cursor(row):
+    """Cursor opaco de /api/headlines: (collection_date, id) del último titular de la página, en base64."""
+    return base64.urlsafe_b64encode(json.dumps([row['collection_date'], row['id']]).encode()).decode()
+
+def decode_cursor(cursor):
+    """Inversa de encode_cursor. Lanza ValueError si el cursor no es válido."""
     try:
-        db = get_db_connection()
-        yield db
-    finally:
-        if db:
-            close_db_connection()
+        collection_date, headline_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Cursor inválido.") from e
+    if not isinstance(collection_date, str) or not isinstance(headline_id, int):
+        raise ValueError("Cursor inválido.")
+    return collection_date, headline_id
+
+def headlines_page(conn, before, page_size):
+    # Se pide un titular de más para saber si hay una página siguiente
+    return listar_titulares(conn, page_size + 1, before), contar_titulares(conn)
 
 @app.get("/api/headlines")
 async def get_headlines_data(
-    db: Connection = Depends(get_db),
-    page: int = Query(1, ge=1, description="Número de página"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en 'next_cursor' por la página anterior"),
     page_size: int = Query(20, ge=1, le=100, description="Titulares por página")
 ):
     """
-    Obtiene una lista paginada de titulares.
+    Obtiene una lista paginada de titulares, del más reciente al más antiguo. La paginación es por
+    clave (collection_date, id), así que pedir una página profunda cuesta lo mismo que la primera.
     """
     try:
-        # 1. Contar el total de elementos para la paginación
-        total_items_query = "SELECT COUNT(id) FROM headlines"
-        total_items = db.execute(total_items_query).fetchone()[0]
-        total_pages = math.ceil(total_items / page_size)
-
-        # 2. Calcular el offset para la consulta SQL
-        offset = (page - 1) * page_size
-
-        # 3. Obtener la página actual de datos
-        query = f"SELECT * FROM headlines ORDER BY collection_date DESC LIMIT {page_size} OFFSET {offset}"
-        df = pd.read_sql(query, db)
-        
-        # 4. Devolver una respuesta estructurada con metadatos de paginación
-        return {
-            "items": df.to_dict(orient='records'),
+        before = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    try:
+        items, total_items = await run_query(headlines_page, before, page_size)
+        next_cursor = encode_cursor(items[page_size - 1]) if len(items) > page_size else None
+        return rows_response({
+            "items": items[:page_size],
+            "next_cursor": next_cursor,
             "total_items": total_items,
-            "total_pages": total_pages,
-            "current_page": page,
+            "total_pages": math.ceil(total_items / page_size),
             "page_size": page_size
-        }
+        })
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Error al leer la base de datos: {e}"})
 
 @app.get("/api/quotes")
-async def get_quotes_data(db: Connection = Depends(get_db)):
+async def get_quotes_data():
     try:
-        df_quotes = pd.read_sql("SELECT q.quote_text, q.quoted_person, h.headline, h.url FROM quotes q JOIN headlines h ON q.headline_id = h.id", db)
-        return df_quotes.to_dict(orient='records')
+        return rows_response(await run_query(listar_citas))
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Error al leer la base de datos: {e}"})
 
+# --- Trabajos de scraping ---
+# La API solo encola: el scraping y el análisis los ejecuta un proceso aparte (`python main.py worker`),
+# así los modelos de NLP no se cargan en el proceso web. El estado vive en la tabla scrape_jobs, de modo
+# que sobrevive a un reinicio y es el mismo para todos los workers de uvicorn.
+
+class ScrapeRequest(BaseModel):
+    sources: Optional[List[str]] = Field(None, description="Medios a procesar; por defecto, las fuentes activas")
+
 @app.post("/api/scrape", status_code=202)
-async def trigger_scraping(background_tasks: BackgroundTasks):
-    if scraper_status["is_running"]:
-        return JSONResponse(status_code=409, content={"message": "El proceso de scraping ya está en ejecución."})
-    background_tasks.add_task(background_scraper_task)
-    return {"message": "El proceso de scraping y análisis ha sido iniciado."}
+async def trigger_scraping(request: Optional[ScrapeRequest] = None):
+    """Encola un trabajo de scraping y análisis. Devuelve su ID para seguir el progreso."""
+    job_id, created = await run_blocking(crear_trabajo_scrape, request.sources if request else None)
+    if not created:
+        return JSONResponse(status_code=409, content={"message": "Ya hay un trabajo de scraping en cola o en ejecución.", "job_id": job_id})
+    return {"message": "El proceso de scraping y análisis ha sido encolado.", "job_id": job_id}
 
 @app.get("/api/scrape/status")
 async def get_scraper_status():
-    return scraper_status
+    """Estado del último trabajo de scraping (resumen compatible con la versión anterior del endpoint)."""
+    job = await run_query(ultimo_trabajo_scrape)
+    if job is None:
+        return {"is_running": False, "last_run": None, "job": None}
+    last_run = {"succeeded": "Success", "failed": f"Failed: {job['error']}", "cancelled": "Cancelled"}.get(job['status'])
+    return {"is_running": job['status'] in ("queued", "running"), "last_run": last_run, "job": job}
+
+@app.get("/api/scrape/{job_id}")
+async def get_scrape_job(job_id: int):
+    """Estado, etapa y progreso (collected/fetched/analyzed/saved) de un trabajo de scraping."""
+    job = await run_query(obtener_trabajo_scrape, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Trabajo no encontrado"})
+    return job
+
+@app.post("/api/scrape/{job_id}/cancel")
+async def cancel_scrape_job(job_id: int):
+    """Cancela un trabajo en cola, o pide al worker que detenga uno en ejecución."""
+    job = await run_blocking(cancelar_trabajo_scrape, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Trabajo no encontrado"})
+    if job['status'] not in ("cancelled", "running"):
+        return JSONResponse(status_code=409, content={"message": f"El trabajo ya terminó ({job['status']}).", "job": job})
+    return job
+
+@app.post("/api/analyze")
+async def analyze_text(request: AnalyzeRequest):
+    """
+    Analiza un texto arbitrario (sentimiento, entidades, tópico y subjetividad).
+    Las peticiones concurrentes se agrupan en lotes para la inferencia.
+    """
+    try:
+        await wait_for_analysis_model()
+        return await analysis_batcher.submit(request.text)
+    except QueueFullError:
+        return JSONResponse(status_code=503, content={"message": "El servicio de análisis está saturado. Intente nuevamente."}, headers={"Retry-After": "1"})
+    except ModelsLoadingError:
+        return JSONResponse(status_code=503, content={"message": "Los modelos de análisis se están cargando. Intente nuevamente."}, headers={"Retry-After": "10"})
+    except asyncio.TimeoutError:
+        return JSONResponse(status_code=504, content={"message": "El análisis superó el tiempo máximo de espera."})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Error al analizar el texto: {e}"})
+
+@app.get("/api/analyze/metrics")
+async def get_analyze_metrics():
+    """Devuelve las métricas de la cola de micro-batching (profundidad de cola, tamaños de lote, etc.)."""
+    return analysis_batcher.metrics()
+
+@app.get("/api/cache/metrics")
+async def get_cache_metrics():
+    """Devuelve las métricas de la caché de respuestas (aciertos, fallos, 304 y entradas guardadas)."""
+    return response_cache.metrics()
+
+@app.get("/api/events")
+async def get_events(
+    kind: Optional[str] = Query(None, pattern="^(entity|topic|story)$", description="Tipo de serie: entity, topic o story"),
+    hours: int = Query(24, ge=1, le=24 * 30, description="Ventana de horas hacia atrás"),
+    limit: int = Query(100, ge=1, le=1000, description="Número máximo de eventos")
+):
+    """
+    Devuelve las ráfagas (eventos de último momento) detectadas en las últimas `hours` horas,
+    de la más reciente a la más antigua. Solo lee la tabla 'events': no recorre el historial.
+    """
+    try:
+        since = (datetime.datetime.utcnow() - datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:00:00')
+        return rows_response(await run_query(listar_eventos, since, kind, limit))
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Error al leer los eventos: {e}"})
+
+# --- Estadísticas ---
+# Se calculan sobre la tabla de rollups (titulares por hora × medio × tópico × sentimiento × subjetividad):
+# leen O(buckets) filas, no el historial.
+
+def stats_filters(
+    source: Optional[List[str]] = Query(None, description="Filtrar por medio (se puede repetir)"),
+    topic: Optional[List[str]] = Query(None, description="Filtrar por tópico (se puede repetir)"),
+    date_from: Optional[datetime.date] = Query(None, description="Fecha mínima de recolección (AAAA-MM-DD)"),
+    date_to: Optional[datetime.date] = Query(None, description="Fecha máxima de recolección (AAAA-MM-DD)")
+):
+    """Dependencia con los filtros comunes de /api/stats."""
+    return {"sources": source, "topics": topic, "date_from": date_from, "date_to": date_to}
+
+@app.get("/api/stats/summary")
+async def get_stats_summary(filters: dict = Depends(stats_filters)):
+    """Cantidad de titulares, medios y tópicos."""
+    return rows_response(await run_blocking(resumen_rollup, **filters))
+
+@app.get("/api/stats/timeline")
+async def get_stats_timeline(
+    granularity: str = Query("day", pattern="^(day|hour)$", description="Período: 'day' u 'hour'"),
+    by: Optional[str] = Query(None, pattern=f"^({'|'.join(ROLLUP_DIMENSIONS)})$", description="Dimensión por la que desglosar cada período"),
+    filters: dict = Depends(stats_filters)
+):
+    """Cantidad de titulares por período ('bucket'), opcionalmente desglosada por una dimensión."""
+    return rows_response(await run_blocking(contar_rollup, by=[by] if by else [], granularity=granularity, **filters))
+
+@app.get("/api/stats/breakdown")
+async def get_stats_breakdown(
+    by: List[str] = Query(..., description=f"Dimensiones por las que agrupar (se puede repetir): {', '.join(ROLLUP_DIMENSIONS)}"),
+    filters: dict = Depends(stats_filters)
+):
+    """Cantidad de titulares agrupada por una o más dimensiones, de mayor a menor."""
+    try:
+        return rows_response(await run_blocking(contar_rollup, by=by, **filters))
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+@app.get("/api/stats/objectivity")
+async def get_stats_objectivity(filters: dict = Depends(stats_filters)):
+    """Índice de objetividad por medio: % de titulares objetivos entre los analizados por subjetividad."""
+    return rows_response(await run_blocking(indice_objetividad, **filters))
+
+# --- Exportaciones ---
+# Devuelven el resultado fila por fila (NDJSON o CSV) a medida que se lee de SQLite, con memoria
+# constante: el cliente recibe las primeras filas sin esperar a que se lea toda la tabla.
+
+def ndjson_chunks(columns, batches):
+    for rows in batches:
+        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+def csv_chunks(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+EXPORT_FORMATS = {
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+    "csv": (csv_chunks, "text/csv; charset=utf-8"),
+}
+
+def export_response(kind, format, fields, filters, keyword=None):
+    """StreamingResponse con las filas de la exportación. La consulta se valida antes de empezar a enviar."""
+    try:
+        columns, query, params = consulta_exportacion(kind, fields, keyword=keyword, **filters)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    encode, media_type = EXPORT_FORMATS[format]
+    # Un generador síncrono: Starlette lo recorre en su pool de hilos, fuera del event loop
+    return StreamingResponse(encode(columns, iterar_filas(query, params)), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{kind}.{format}"'})
+
+@app.get("/api/export/headlines")
+def export_headlines(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: 'ndjson' o 'csv'"),
+    fields: Optional[List[str]] = Query(None, description="Columnas a exportar (se puede repetir); por defecto todas"),
+    keyword: Optional[str] = Query(None, min_length=3, description="Exportar solo los titulares que coinciden con la búsqueda de texto completo"),
+    filters: dict = Depends(stats_filters)
+):
+    """Exporta los titulares (sin el cuerpo del artículo), del más antiguo al más reciente."""
+    return export_response("headlines", format, fields, filters, keyword)
+
+@app.get("/api/export/quotes")
+def export_quotes(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="Formato: 'ndjson' o 'csv'"),
+    fields: Optional[List[str]] = Query(None, description="Columnas a exportar (se puede repetir); por defecto todas"),
+    filters: dict = Depends(stats_filters)
+):
+    """Exporta las citas con el medio, el titular, la URL y la fecha del artículo del que se extrajeron."""
+    return export_response("quotes", format, fields, filters)
 
 @app.get("/api/sources")
 async def get_sources():
-    sources_info = [{"name": source["name"], "url": source["url"]} for source in SOURCES_TO_SCRAPE]
+    sources_info = [{"name": source["name"], "url": source["url"]} for source in load_sources(active_only=False)]
     return {"sources": sources_info}
 
 @app.get("/api/headlines/search")
 async def search_headlines(
-    keyword: str = Query(..., min_length=3, description="Palabra clave para buscar en los titulares"),
-    db: Connection = Depends(get_db)
+    keyword: str = Query(..., min_length=3, description="Palabras a buscar en titulares, resúmenes, cuerpos y citas"),
+    order_by: str = Query("relevance", pattern="^(relevance|date)$", description="Orden: 'relevance' (BM25) o 'date'"),
+    limit: int = Query(50, ge=1, le=200, description="Cantidad máxima de resultados")
 ):
     """
-    Busca titulares que contengan una palabra clave específica.
+    Busca titulares con el índice de texto completo (FTS5). No distingue mayúsculas ni tildes.
+    Cada resultado incluye 'rank' (BM25, menor es mejor) y un 'snippet' con las coincidencias resaltadas.
     """
     try:
-        query = "SELECT * FROM headlines WHERE headline LIKE ? ORDER BY collection_date DESC"
-        # Usamos el formato de "LIKE" de SQL para buscar la palabra clave dentro del texto
-        df = pd.read_sql(query, db, params=(f'%{keyword}%',))
-        return df.to_dict(orient='records')
+        return rows_response(await run_blocking(buscar_titulares, keyword, limit=limit, order_by=order_by))
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Error al buscar en la base de datos: {e}"})
 
-@app.get("/api/headlines/source/{source_name}")
-async def get_headlines_by_source(
-    source_name: str, 
-    db: Connection = Depends(get_db)
+# Definida con 'def' (no 'async def') para que FastAPI la ejecute en su pool de hilos:
+# el embedding de la consulta y la búsqueda en el índice no deben bloquear el event loop.
+@app.get("/api/headlines/semantic-search")
+def semantic_search_headlines(
+    q: str = Query(..., min_length=3, description="Texto a buscar por similitud semántica"),
+    k: int = Query(20, ge=1, le=100, description="Número máximo de resultados"),
+    source: Optional[str] = Query(None, description="Filtrar por medio"),
+    topic: Optional[str] = Query(None, description="Filtrar por tópico"),
+    date_from: Optional[datetime.date] = Query(None, description="Fecha mínima de recolección (AAAA-MM-DD)"),
+    date_to: Optional[datetime.date] = Query(None, description="Fecha máxima de recolección (AAAA-MM-DD)")
 ):
+    """
+    Busca titulares semánticamente similares al texto de la consulta (p. ej., encuentra "el Presidente"
+    al buscar "Milei"), usando un índice de vecinos más cercanos sobre los embeddings de los titulares.
+    """
+    try:
+        from ann_index import semantic_search # Importación diferida: carga el modelo de embeddings
+        results = semantic_search(q, k=k, source=source, topic=topic, date_from=date_from, date_to=date_to)
+        if not results:
+            return []
+
+        scores = dict(results)
+        with read_connection() as conn:
+            headlines = titulares_por_ids(conn, list(scores))
+        for headline in headlines:
+            headline['similarity'] = scores[headline['id']]
+        return rows_response(sorted(headlines, key=lambda headline: headline['similarity'], reverse=True))
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Error en la búsqueda semántica: {e}"})
+
+@app.get("/api/headlines/source/{source_name}")
+async def get_headlines_by_source(source_name: str):
     """
     Obtiene todos los titulares de un medio de comunicación específico.
     """
     try:
-        query = "SELECT * FROM headlines WHERE source = ? ORDER BY collection_date DESC"
-        df = pd.read_sql(query, db, params=(source_name,))
-        return df.to_dict(orient='records')
+        return rows_response(await run_query(titulares_de_fuente, source_name))
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Error al leer la base de datos: {e}"})
 
+def headline_with_body(conn, headline_id):
+    headline = obtener_titular(conn, headline_id)
+    if headline is not None:
+        headline['full_text'] = obtener_cuerpo_articulo(conn, headline_id)
+    return headline
+
 @app.get("/api/headlines/{headline_id}")
-async def get_headline_by_id(
-    headline_id: int, 
-    db: Connection = Depends(get_db)
-):
+async def get_headline_by_id(headline_id: int):
     """
-    Obtiene un único titular por su ID.
+    Obtiene un único titular por su ID, con el cuerpo completo del artículo ('full_text').
+    Es el único endpoint que descomprime el cuerpo: los listados devuelven solo las filas de headlines.
     """
     try:
-        query = "SELECT * FROM headlines WHERE id = ?"
-        df = pd.read_sql(query, db, params=(headline_id,))
-        if df.empty:
+        headline = await run_query(headline_with_body, headline_id)
+        if headline is None:
             return JSONResponse(status_code=404, content={"message": "Titular no encontrado"})
-        return df.to_dict(orient='records')[0]
+        return rows_response(headline)
     except Exception as e:
         return JSONResponse(status_code=500, content={"message": f"Error al leer la base de datos: {e}"})
 
@@ -0,0 +1,218 @@
+import os
+import json
+import shutil
+import datetime
+import duckdb
+import pandas as pd
+import db
+from analytics_store import get_analytics_store, sql_path
+from logger import logger
+
+# Construir rutas relativas al archivo actual para mayor portabilidad
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(SRC_DIR) # Apunta a la carpeta 'backend'
+ARCHIVE_DIR = os.path.join(BACKEND_ROOT, 'data', 'archive')
+CONFIG_PATH = os.path.join(BACKEND_ROOT, 'config', 'config.json')
+DEFAULT_HOT_MONTHS = 6
+
+# Tipos DuckDB de las columnas archivadas según el tipo declarado en SQLite. Las fechas se guardan como
+# texto para que la restauración devuelva exactamente lo que había en la DB.
+DUCKDB_TYPES = {'INTEGER': 'BIGINT', 'REAL': 'DOUBLE'}
+QUOTE_COLUMNS = {'id': 'BIGINT', 'headline_id': 'BIGINT', 'quote_text': 'VARCHAR', 'quoted_person': 'VARCHAR'}
+
+def load_hot_months():
+    """Cantidad de meses (además del actual) que se mantienen en la DB, según "retention" en config.json."""
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f).get("retention", {}).get("hot_months", DEFAULT_HOT_MONTHS)
+    except (OSError, json.JSONDecodeError):
+        logger.warning(f"No se pudo leer config.json; se mantienen {DEFAULT_HOT_MONTHS} meses en la base de datos.")
+        return DEFAULT_HOT_MONTHS
+
+def month_range(month):
+    """Primer día del mes ('AAAA-MM') y primer día del mes siguiente, como 'AAAA-MM-DD'."""
+    start = datetime.date.fromisoformat(f"{month}-01")
+    end = (start + datetime.timedelta(days=32)).replace(day=1)
+    return start.isoformat(), end.isoformat()
+
+def month_dir(month):
+    return os.path.join(ARCHIVE_DIR, f"month={month}")
+
+def _headline_columns(conn):
+    """Columnas de headlines y su tipo DuckDB."""
+    return {row['name']: DUCKDB_TYPES.get(row['type'].upper(), 'VARCHAR') for row in conn.execute("PRAGMA table_info(headlines)")}
+
+def _write_parquet(con, df, columns, path):
+    """
+    Escribe `df` en Parquet (ZSTD) con los tipos de `columns`. Si el archivo ya existe (el mes se había
+    archivado antes), se le agregan las filas nuevas. Devuelve la cantidad de filas del archivo.
+    """
+    tmp_path = f"{path}.tmp"
+    select = "SELECT " + ", ".join(f"CAST({name} AS {kind}) AS {name}" for name, kind in columns.items()) + " FROM batch"
+    if os.path.exists(path):
+        select += f" UNION ALL BY NAME SELECT * FROM read_parquet({sql_path(path)}) WHERE id NOT IN (SELECT id FROM batch)"
+    con.register('batch', df)
+    try:
+        con.execute(f"COPY ({select}) TO {sql_path(tmp_path)} (FORMAT PARQUET, COMPRESSION ZSTD)")
+        rows = con.execute(f"SELECT COUNT(*) FROM read_parquet({sql_path(tmp_path)})").fetchone()[0]
+    finally:
+        con.unregister('batch')
+    os.replace(tmp_path, path)
+    return rows
+
+def months_to_archive(hot_months):
+    """Meses ('AAAA-MM') con titulares anteriores a la ventana caliente: el mes actual y los `hot_months` anteriores."""
+    conn = db.get_db_connection()
+    rows = conn.execute(
+        "SELECT DISTINCT strftime('%Y-%m', collection_date) FROM headlines WHERE collection_date < date('now', 'start of month', ?) ORDER BY 1",
+        (f"-{int(hot_months)} months",)
+    )
+    return [row[0] for row in rows if row[0]]
+
+def archive_month(month):
+    """
+    Mueve los titulares de un mes ('AAAA-MM') de la DB al archivo: data/archive/month=AAAA-MM/ con
+    headlines.parquet (todas las columnas más el cuerpo descomprimido en 'full_text') y quotes.parquet.
+
+    Los archivos se escriben y se verifican antes de tocar la DB. Después, en una sola transacción, se
+    borran los titulares y todo lo que cuelga de ellos (citas, entidades, firmas MinHash; los triggers
+    se encargan del índice FTS y de los cuerpos) y se registra el mes en archived_months. Los buckets
+    del mes en headline_rollup se conservan, así que las estadísticas siguen cubriendo el mes.
+    Devuelve la cantidad de titulares archivados.
+    """
+    start, end = month_range(month)
+    conn = db.get_db_connection()
+    columns = _headline_columns(conn)
+    rows = conn.execute(
+        f"""SELECT {', '.join('h.' + name for name in columns)}, b.body FROM headlines h
+            LEFT JOIN article_bodies b ON b.headline_id = h.id
+            WHERE h.collection_date >= ? AND h.collection_date < ? ORDER BY h.id""",
+        (start, end)
+    ).fetchall()
+    if not rows:
+        return 0
+    ids_json = json.dumps([row['id'] for row in rows])
+    # dtype=object: los enteros con NULL no se convierten a float (NaN)
+    headlines = pd.DataFrame([tuple(row)[:-1] + (db.descomprimir_cuerpo(row['body']),) for row in rows],
+                             columns=list(columns) + ['full_text'], dtype=object)
+    quotes = pd.DataFrame(
+        [tuple(row) for row in conn.execute(
+            "SELECT id, headline_id, quote_text, quoted_person FROM quotes WHERE headline_id IN (SELECT value FROM json_each(?)) ORDER BY id",
+            (ids_json,)
+        )],
+        columns=list(QUOTE_COLUMNS), dtype=object
+    )
+
+    os.makedirs(month_dir(month), exist_ok=True)
+    con = duckdb.connect(':memory:')
+    try:
+        archived_headlines = _write_parquet(con, headlines, {**columns, 'full_text': 'VARCHAR'}, os.path.join(month_dir(month), 'headlines.parquet'))
+        archived_quotes = _write_parquet(con, quotes, QUOTE_COLUMNS, os.path.join(month_dir(month), 'quotes.parquet'))
+    finally:
+        con.close()
+    if archived_headlines < len(headlines) or archived_quotes < len(quotes):
+        raise RuntimeError(f"El archivo de {month} no contiene todas las filas: no se borra nada de la base de datos.")
+
+    rollups = conn.execute("SELECT * FROM headline_rollup WHERE bucket >= ? AND bucket < ?", (start, end)).fetchall()
+    with conn:
+        for table in ('quotes', 'headline_entities', 'minhash_signatures', 'lsh_buckets'):
+            conn.execute(f"DELETE FROM {table} WHERE headline_id IN (SELECT value FROM json_each(?))", (ids_json,))
+        conn.execute("DELETE FROM headlines WHERE id IN (SELECT value FROM json_each(?))", (ids_json,))
+        # Los triggers descontaron los titulares borrados: se reponen los conteos del mes
+        conn.execute("DELETE FROM headline_rollup WHERE bucket >= ? AND bucket < ?", (start, end))
+        conn.executemany("INSERT INTO headline_rollup VALUES (?, ?, ?, ?, ?, ?)", [tuple(row) for row in rollups])
+        conn.execute("DELETE FROM entities WHERE id NOT IN (SELECT entity_id FROM headline_entities)")
+        conn.execute(
+            """INSERT INTO archived_months (month, headlines, quotes) VALUES (?, ?, ?)
+               ON CONFLICT (month) DO UPDATE SET headlines = excluded.headlines, quotes = excluded.quotes, archived_at = CURRENT_TIMESTAMP""",
+            (month, archived_headlines, archived_quotes)
+        )
+    db.marcar_datos_modificados()
+    logger.info(f"Mes {month} archivado: {len(headlines)} titulares y {len(quotes)} citas.")
+    _sync_analytics(start, end)
+    return len(headlines)
+
+def archive_old_months(hot_months=None):
+    """Archiva todos los meses anteriores a la ventana caliente. Devuelve un diccionario mes -> titulares archivados."""
+    hot_months = load_hot_months() if hot_months is None else hot_months
+    return {month: archive_month(month) for month in months_to_archive(hot_months)}
+
+def restore_month(month):
+    """
+    Vuelve a cargar en la DB un mes archivado, con sus IDs originales: titulares, cuerpos (comprimidos e
+    indexados en el FTS), entidades normalizadas y citas. Recalcula los rollups del mes y borra el archivo.
+    Los titulares cuya URL ya está en la DB (se volvieron a recolectar) se omiten. Las firmas MinHash no
+    se restauran: los artículos restaurados no se usan como originales en la detección de casi-duplicados.
+    Devuelve la cantidad de titulares restaurados.
+    """
+    path = os.path.join(month_dir(month), 'headlines.parquet')
+    if not os.path.exists(path):
+        logger.error(f"No hay un archivo para el mes {month} en {ARCHIVE_DIR}.")
+        return 0
+    con = duckdb.connect(':memory:')
+    try:
+        cursor = con.execute(f"SELECT * FROM read_parquet({sql_path(path)})")
+        archived_columns = [column[0] for column in cursor.description]
+        headlines = [dict(zip(archived_columns, row)) for row in cursor.fetchall()]
+        quotes = con.execute(f"SELECT {', '.join(QUOTE_COLUMNS)} FROM read_parquet({sql_path(month_dir(month), 'quotes.parquet')})").fetchall()
+    finally:
+        con.close()
+
+    start, end = month_range(month)
+    conn = db.get_db_connection()
+    columns = [name for name in _headline_columns(conn) if name in archived_columns]
+    insert = f"INSERT OR IGNORE INTO headlines ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    restored = set()
+    with conn:
+        for headline in headlines:
+            if conn.execute(insert, [headline[name] for name in columns]).rowcount == 0:
+                continue
+            restored.add(headline['id'])
+            db.insertar_cuerpo(conn, headline['id'], headline.get('full_text'))
+            try:
+                entities = json.loads(headline['entities']) if headline.get('entities') else []
+            except json.JSONDecodeError:
+                entities = []
+            db.insertar_entidades(conn, headline['id'], entities)
+        conn.executemany("INSERT OR IGNORE INTO quotes (id, headline_id, quote_text, quoted_person) VALUES (?, ?, ?, ?)",
+                         [quote for quote in quotes if quote[1] in restored])
+        db.recontar_rollups_de_rango(conn, start, end)
+        conn.execute("DELETE FROM archived_months WHERE month = ?", (month,))
+    db.marcar_datos_modificados()
+    shutil.rmtree(month_dir(month))
+
+    if len(restored) < len(headlines):
+        logger.warning(f"{len(headlines) - len(restored)} titulares de {month} no se restauraron porque su URL ya está en la base de datos.")
+    logger.info(f"Mes {month} restaurado: {len(restored)} titulares.")
+    _sync_analytics(start, end)
+    return len(restored)
+
+def _sync_analytics(start, end):
+    """Reescribe en el espejo analítico los días del mes archivado o restaurado."""
+    last_day = (datetime.date.fromisoformat(end) - datetime.timedelta(days=1)).isoformat()
+    try:
+        get_analytics_store().sync_range(start, last_day)
+    except Exception:
+        logger.exception("No se pudo actualizar el espejo analítico; ejecutar 'python main.py analytics rebuild'.")
+
+def list_archived_months():
+    """Meses archivados con su cantidad de titulares y citas."""
+    with db.read_connection() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM archived_months ORDER BY month")]
+
+def query_archive(sql, params=()):
+    """
+    Consulta el archivo sin restaurarlo. `sql` puede usar las vistas `archived_headlines` y `archived_quotes`
+    (con la columna `month` de la partición, que permite a DuckDB leer solo los meses pedidos).
+    Devuelve un DataFrame.
+    """
+    if not os.path.isdir(ARCHIVE_DIR) or not any(name.startswith('month=') for name in os.listdir(ARCHIVE_DIR)):
+        return pd.DataFrame()
+    con = duckdb.connect(':memory:')
+    try:
+        for view, file_name in (('archived_headlines', 'headlines.parquet'), ('archived_quotes', 'quotes.parquet')):
+            con.execute(f"""CREATE VIEW {view} AS SELECT * FROM read_parquet({sql_path(ARCHIVE_DIR, 'month=*', file_name)},
+                                                                          hive_partitioning = true, union_by_name = true)""")
+        return con.execute(sql, list(params)).df()
+    finally:
+        con.close()
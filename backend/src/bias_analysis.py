@@ -2,13 +2,23 @@ from analysis import analyzer
 from logger import logger
 
 def analyze_subjectivity(text):
-    """Clasifica un texto como objetivo o de opinión."""
+    """
+    Clasifica un texto como objetivo o de opinión.
+    Usa el clasificador destilado si así lo indica "classifiers.subjectivity" en config.json.
+    """
     if not analyzer or not text:
         return None
+    if analyzer.config.get("classifiers", {}).get("subjectivity") == "distilled":
+        from distillation import get_distilled_classifier
+        distilled = get_distilled_classifier("subjectivity")
+        if distilled:
+            try:
+                return distilled.predict([text])[0]
+            except Exception:
+                logger.error(f"Error en análisis destilado de subjetividad para el texto: '{text[:50]}...'", exc_info=True)
     try:
-        candidate_labels = ["noticia objetiva", "artículo de opinión"]
-        result = analyzer.analyze_subjectivity(text)
-        return {"label": result['labels'][0], "score": result['scores'][0]}
+        # NewsAnalyzer.analyze_subjectivity ya devuelve {"label", "score"}
+        return analyzer.analyze_subjectivity(text)
     except Exception:
         logger.error(f"Error en análisis de subjetividad para el texto: '{text[:50]}...'", exc_info=True)
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,117 @@
+import os
+import concurrent.futures
+import numpy as np
+from logger import logger
+
+def _normalize_rows(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.where(norms > 0, norms, 1)
+
+def _row_block_neighbors(embeddings, start, end, threshold, min_community_size, col_block_size, top_k):
+    """
+    Vecinos (similitud >= threshold) de las filas [start, end), calculados por bloques de columnas.
+    Devuelve, para cada fila con al menos `min_community_size` vecinos, la lista de sus vecinos
+    ordenada por similitud descendente (la propia fila incluida), en el orden de las filas.
+    """
+    rows = embeddings[start:end]
+    row_ids, col_ids, scores = [], [], []
+    for col_start in range(0, len(embeddings), col_block_size):
+        similarities = rows @ embeddings[col_start:col_start + col_block_size].T
+        r, c = np.nonzero(similarities >= threshold)
+        row_ids.append(r)
+        col_ids.append(c + col_start)
+        scores.append(similarities[r, c])
+
+    row_ids, col_ids, scores = np.concatenate(row_ids), np.concatenate(col_ids), np.concatenate(scores)
+    # Ordenar por fila y, dentro de cada fila, por similitud descendente (desempate por índice de columna)
+    order = np.lexsort((col_ids, -scores, row_ids))
+    row_ids, col_ids = row_ids[order], col_ids[order]
+
+    communities = []
+    boundaries = np.flatnonzero(np.diff(row_ids)) + 1
+    for neighbors in np.split(col_ids, boundaries):
+        if top_k is not None:
+            neighbors = neighbors[:top_k]
+        if len(neighbors) >= min_community_size:
+            communities.append(neighbors.tolist())
+    return communities
+
+def blocked_community_detection(embeddings, threshold=0.75, min_community_size=2, row_block_size=1024,
+                                col_block_size=16384, max_workers=None, top_k=None):
+    """
+    Detección de comunidades equivalente a `sentence_transformers.util.community_detection`, pero sin
+    calcular la matriz de similitud N×N completa.
+
+    Las similitudes se calculan por bloques (filas × columnas), así que la memoria de trabajo de cada hilo
+    es de `row_block_size` × `col_block_size` floats, más los pares por encima del umbral. Los bloques de
+    filas se procesan en paralelo (el producto de matrices de numpy libera el GIL).
+
+    Semántica (la misma que la de sentence-transformers):
+      1. Cada titular con al menos `min_community_size` vecinos con similitud >= `threshold` (incluido él
+         mismo) define una comunidad candidata: sus vecinos, ordenados por similitud.
+      2. Las candidatas se recorren de mayor a menor tamaño; a cada una se le quitan los titulares ya
+         asignados y se conserva si le quedan al menos `min_community_size`.
+
+    `top_k` limita opcionalmente los vecinos por titular (acota la memoria en grupos muy densos, a costa
+    de que las comunidades más grandes que `top_k` se recorten).
+
+    Returns:
+        list of list of int: las comunidades, de mayor a menor tamaño.
+    """
+    embeddings = _normalize_rows(embeddings)
+    n = len(embeddings)
+    if n == 0:
+        return []
+    min_community_size = min(min_community_size, n)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    # Paso 1: comunidades candidatas, por bloques de filas en paralelo
+    starts = range(0, n, row_block_size)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        blocks = executor.map(
+            lambda start: _row_block_neighbors(embeddings, start, min(start + row_block_size, n), threshold,
+                                               min_community_size, col_block_size, top_k),
+            starts
+        )
+        extracted_communities = [community for block in blocks for community in block]
+
+    # Paso 2: de mayor a menor tamaño, quitar los solapamientos
+    extracted_communities.sort(key=len, reverse=True)
+    unique_communities = []
+    extracted_ids = set()
+    for community in extracted_communities:
+        non_overlapped_community = [idx for idx in community if idx not in extracted_ids]
+        if len(non_overlapped_community) >= min_community_size:
+            unique_communities.append(non_overlapped_community)
+            extracted_ids.update(non_overlapped_community)
+
+    unique_communities.sort(key=len, reverse=True)
+    logger.info(f"Clustering por bloques: {n} titulares, {len(unique_communities)} comunidades.")
+    return unique_communities
+
+# --- Bloque de prueba: escalado en tiempo y memoria ---
+if __name__ == '__main__':
+    import time
+    import tracemalloc
+
+    def synthetic_embeddings(n, dim=384, n_stories=None, seed=0):
+        """Embeddings sintéticos: historias (centros) con titulares parafraseados alrededor, más ruido."""
+        rng = np.random.default_rng(seed)
+        n_stories = n_stories or n // 10
+        centers = _normalize_rows(rng.standard_normal((n_stories, dim), dtype=np.float32))
+        assignments = rng.integers(0, n_stories, n)
+        return _normalize_rows(centers[assignments] + 0.03 * rng.standard_normal((n, dim), dtype=np.float32))
+
+    print(f"🚀 Benchmark de clustering por bloques ({os.cpu_count()} núcleos)")
+    for n in (10_000, 50_000, 100_000, 200_000):
+        embeddings = synthetic_embeddings(n)
+        tracemalloc.start()
+        start = time.perf_counter()
+        communities = blocked_community_detection(embeddings, threshold=0.75, min_community_size=2)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        dense_mb = n * n * 4 / 1024 ** 2
+        print(f"{n:>8,} titulares: {elapsed:7.1f} s | {len(communities):>6,} comunidades | "
+              f"memoria pico {peak / 1024 ** 2:7.0f} MB (la matriz N×N completa ocuparía {dense_mb:,.0f} MB)")
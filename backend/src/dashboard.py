@@ -1,9 +1,9 @@
 import streamlit as st
 import pandas as pd
-import json
 import sqlite3
 import os
 import sys
+import datetime
 from filelock import FileLock, Timeout
 
 # --- Corrección de Rutas ---
@@ -17,9 +17,10 @@ from graficos import (
     display_main_metrics, display_general_analysis, display_trend_analysis,
     display_entity_explorer, display_topic_analysis, display_advanced_analysis, display_network_analysis, 
     display_subjectivity_analysis, display_comparative_analysis, display_geomapping_analysis, display_quote_explorer, display_source_reliability_analysis, display_blind_spot_analysis, display_framing_analysis,
-    display_echo_chamber_analysis, display_narrative_arc_analysis
+    display_echo_chamber_analysis, display_narrative_arc_analysis, display_event_alerts
 )
-from db import DB_FILE
+from db import DB_FILE, read_connection, obtener_briefing_del_dia, ids_titulares_por_texto
+from analytics_store import get_analytics_store
 from framing_analysis import generate_briefing
 # Importamos la función principal de procesamiento
 from scraper import load_sources, add_source_to_config
@@ -41,69 +42,103 @@ load_css(CSS_FILE)
 def load_data(db_path):
     """Carga los datos desde la base de datos SQLite."""
     try:
-        conn = sqlite3.connect(db_path, check_same_thread=False)
-        df = pd.read_sql("SELECT * FROM headlines", conn)
-        df_quotes = pd.read_sql("SELECT q.quote_text, q.quoted_person, h.headline, h.url FROM quotes q JOIN headlines h ON q.headline_id = h.id", conn)
+        # Conexión de solo lectura del pool: con WAL no se bloquea durante una ingesta
+        with read_connection(db_path) as conn:
+            # La cantidad de entidades sale de la tabla normalizada headline_entities (sin parsear el JSON de cada fila)
+            df = pd.read_sql(
+                """SELECT h.*, COALESCE(he.entity_count, 0) AS entity_count FROM headlines h
+                   LEFT JOIN (SELECT headline_id, COUNT(*) AS entity_count FROM headline_entities GROUP BY headline_id) he
+                   ON he.headline_id = h.id""",
+                conn
+            )
+            df_quotes = pd.read_sql("SELECT q.quote_text, q.quoted_person, h.headline, h.url FROM quotes q JOIN headlines h ON q.headline_id = h.id", conn)
     except sqlite3.Error as e:
         st.error(f"Error al conectar o leer la base de datos: {e}")
         return pd.DataFrame(), pd.DataFrame()
-    finally:
-        if 'conn' in locals() and conn:
-            conn.close()
     
     df['collection_date'] = pd.to_datetime(df['collection_date'])
-    
-    def parse_entities(json_str):
-        try:
-            return json.loads(json_str)
-        except (json.JSONDecodeError, TypeError):
-            return []
-    df['entities'] = df['entities'].apply(parse_entities)
-    df['entity_count'] = df['entities'].apply(len)
     return df, df_quotes
 
 # --- Filtros de la Barra Lateral ---
-def sidebar_filters(df):
+@st.cache_data(ttl=60)
+def load_events(db_path, hours):
+    """Carga los eventos detectados en las últimas `hours` horas (solo lee la tabla 'events')."""
+    since = (datetime.datetime.utcnow() - datetime.timedelta(hours=hours)).strftime('%Y-%m-%d %H:00:00')
+    try:
+        with read_connection(db_path) as conn:
+            df_events = pd.read_sql(
+                """SELECT e.kind, e.key, e.bucket, e.count, e.expected, e.zscore, s.headline AS story_headline
+                   FROM events e LEFT JOIN stories s ON e.kind = 'story' AND s.id = CAST(e.key AS INTEGER)
+                   WHERE e.bucket >= ? ORDER BY e.bucket DESC, e.zscore DESC""",
+                conn, params=(since,)
+            )
+    except sqlite3.Error as e:
+        st.error(f"Error al leer los eventos: {e}")
+        return pd.DataFrame()
+    df_events['bucket'] = pd.to_datetime(df_events['bucket'])
+    return df_events
+
+@st.cache_data(ttl=60)
+def load_filter_options():
+    """Medios, tópicos y rango de fechas del espejo analítico (sin cargar los titulares)."""
+    return get_analytics_store().filter_options()
+
+def sidebar_filters(options):
+    """
+    Muestra los filtros de la barra lateral y devuelve sus valores como un diccionario
+    (sources, topics, date_from, date_to, headline_ids) que entienden tanto el espejo analítico como apply_filters().
+    """
     st.sidebar.header("Filtros")
-    if df.empty:
-        st.sidebar.warning("No hay datos para filtrar.")
-        return df
 
     keyword_search = st.sidebar.text_input("Buscar por palabra clave:", key="keyword_search")
-    sources = sorted(df['source'].unique())
+    sources = options['sources']
     source_filter = st.sidebar.multiselect("Filtrar por Medio:", options=sources, default=sources, key="source_filter")
     
-    topics = sorted(df['topic'].dropna().unique())
+    topics = options['topics']
     topic_filter = st.sidebar.multiselect("Filtrar por Tópico:", options=topics, default=[], key="topic_filter")
     
-    min_date, max_date = df['collection_date'].min(), df['collection_date'].max()
+    min_date, max_date = options['min_date'], options['max_date']
     date_range = st.sidebar.date_input("Filtrar por Fecha:", value=(min_date, max_date), min_value=min_date, max_value=max_date, key="date_range")
     
-    df_filtered = df.copy() # Trabajar sobre una copia
+    filters = {'sources': source_filter, 'topics': topic_filter}
 
     if len(date_range) == 2:
-        start_date, end_date = pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])
+        filters['date_from'], filters['date_to'] = date_range[0], date_range[1]
+    
+    if keyword_search:
+        # Búsqueda en el índice FTS5 (titular, resumen, cuerpo y citas; sin distinguir tildes)
+        filters['headline_ids'] = ids_titulares_por_texto(keyword_search)
+        
+    return filters
+
+def apply_filters(df, filters):
+    """Aplica los filtros de la barra lateral a los titulares cargados (para las vistas que necesitan las filas)."""
+    df_filtered = df.copy() # Trabajar sobre una copia
+
+    if filters.get('date_from'):
         df_filtered = df_filtered[
-            (df_filtered['collection_date'].dt.date >= start_date.date()) & 
-            (df_filtered['collection_date'].dt.date <= end_date.date())
+            (df_filtered['collection_date'].dt.date >= filters['date_from']) & 
+            (df_filtered['collection_date'].dt.date <= filters['date_to'])
         ]
     
-    if source_filter:
-        df_filtered = df_filtered[df_filtered['source'].isin(source_filter)]
+    if filters.get('sources'):
+        df_filtered = df_filtered[df_filtered['source'].isin(filters['sources'])]
 
-    if topic_filter:
-        df_filtered = df_filtered[df_filtered['topic'].isin(topic_filter)]
+    if filters.get('topics'):
+        df_filtered = df_filtered[df_filtered['topic'].isin(filters['topics'])]
     
-    if keyword_search:
-        df_filtered = df_filtered[df_filtered['headline'].str.lower().str.contains(keyword_search.lower())]
+    if filters.get('headline_ids') is not None:
+        df_filtered = df_filtered[df_filtered['id'].isin(filters['headline_ids'])]
         
     return df_filtered
 
 # --- Generador de Briefing ---
-def briefing_section(df):
+def briefing_section(filters):
     st.sidebar.markdown("---")
     st.sidebar.header("Generador de Briefing")
     if st.sidebar.button("Generar Briefing del Día 📝", help="Crea un resumen ejecutivo de las noticias actualmente filtradas."):
+        # Los titulares se cargan recién al pedir el briefing
+        df = apply_filters(load_data(DB_FILE)[0], filters)
         if not df.empty:
             with st.spinner("Creando resumen ejecutivo..."):
                 briefing_text = generate_briefing(df)
@@ -111,6 +146,13 @@ def briefing_section(df):
         else:
             st.sidebar.warning("No hay noticias para resumir.")
 
+    if st.sidebar.button("Ver Briefing Precalculado de Hoy 🗞️", help="Muestra el briefing generado automáticamente al final de la última ingesta de hoy."):
+        daily_briefing = obtener_briefing_del_dia(datetime.date.today().isoformat())
+        if daily_briefing:
+            st.session_state.briefing = daily_briefing['briefing']
+        else:
+            st.sidebar.info("Todavía no hay un briefing precalculado para hoy.")
+
     if 'briefing' in st.session_state:
         st.subheader("Resumen Ejecutivo de Noticias")
         st.markdown(st.session_state.briefing)
@@ -129,6 +171,7 @@ def main():
         "Página Principal",
         "Análisis General", 
         "Análisis de Tendencias",
+        "Alertas de Eventos",
         "Análisis Comparativo", 
         "Análisis de Confiabilidad",
         "Análisis de Sesgo", 
@@ -213,55 +256,71 @@ def main():
         st.text_area("Descripción del Proyecto (Futura funcionalidad):", 
                      "Este es un dashboard interactivo para el análisis de noticias de múltiples fuentes. El objetivo es proveer herramientas para identificar tendencias, sesgos y relaciones en la cobertura mediática.", 
                      height=150, disabled=True)
+    elif selected_view == "Alertas de Eventos":
+        # Esta vista lee solo la tabla de eventos, sin cargar el historial de titulares
+        st.title(f"🚨 {selected_view}")
+        hours = st.sidebar.slider("Ventana de horas:", min_value=6, max_value=24 * 7, value=48, step=6)
+        display_event_alerts(load_events(DB_FILE, hours))
     else:
-        # Cargar datos y mostrar filtros solo si no estamos en la página principal
-        df, df_quotes = load_data(DB_FILE)
+        # Los filtros se arman con las opciones del espejo analítico, sin cargar los titulares
+        options = load_filter_options()
 
-        if df.empty:
-            st.warning("No hay datos en la base de datos. Ejecuta el 'Scraper y Análisis Completo' desde la barra lateral.")
+        if options is None:
+            st.warning("No hay datos en el espejo analítico. Ejecuta el 'Scraper y Análisis Completo' desde la barra lateral "
+                       "(o `python main.py analytics rebuild` si la base de datos ya tiene titulares).")
             return
 
-        df_filtered = sidebar_filters(df)
+        filters = sidebar_filters(options)
         
         # Mostrar el generador de briefing en la barra lateral
-        briefing_section(df_filtered)
+        briefing_section(filters)
 
         # El título se muestra para todas las vistas de análisis
         st.title(f"📊 {selected_view}")
-        display_main_metrics(df_filtered)
+        display_main_metrics(filters)
         st.markdown("---")
 
-        # Renderizar la vista seleccionada
+        # Vistas agregadas: consultan el espejo analítico (DuckDB sobre Parquet) con los filtros
         if selected_view == "Análisis General": # Este bloque ahora usará la lista completa
-            display_general_analysis(df_filtered)
+            display_general_analysis(filters)
         elif selected_view == "Análisis de Tendencias":
-            display_trend_analysis(df_filtered)
+            display_trend_analysis(filters)
         elif selected_view == "Análisis Comparativo":
-            display_comparative_analysis(df_filtered)
+            display_comparative_analysis(filters)
         elif selected_view == "Análisis de Confiabilidad":
-            display_source_reliability_analysis(df_filtered)
+            display_source_reliability_analysis(filters)
         elif selected_view == "Análisis de Sesgo":
-            display_subjectivity_analysis(df_filtered)
-        elif selected_view == "Cámara de Eco":
-            display_echo_chamber_analysis(df_filtered)
-        elif selected_view == "Arcos Narrativos":
-            display_narrative_arc_analysis(df_filtered)
-        elif selected_view == "Análisis de Encuadre":
-            display_framing_analysis(df_filtered)
-        elif selected_view == "Mapa Geográfico":
-            display_geomapping_analysis(df_filtered)
-        elif selected_view == "Explorador de Citas":
-            display_quote_explorer(df_quotes)
-        elif selected_view == "Mapa de Entidades":
-            display_network_analysis(df_filtered)
+            display_subjectivity_analysis(filters)
         elif selected_view == "Análisis por Tópicos":
-            display_topic_analysis(df_filtered)
-        elif selected_view == "Explorador de Entidades":
-            display_entity_explorer(df_filtered)
+            display_topic_analysis(filters)
         elif selected_view == "Análisis de Puntos Ciegos":
-            display_blind_spot_analysis(df_filtered, all_sources)
+            display_blind_spot_analysis(filters, all_sources)
         elif selected_view == "Análisis Avanzado":
-            display_advanced_analysis(df_filtered)
+            display_advanced_analysis(filters)
+        else:
+            # Vistas que trabajan sobre las filas (texto, URLs, coordenadas): cargan los titulares de SQLite
+            df, df_quotes = load_data(DB_FILE)
+
+            if df.empty:
+                st.warning("No hay datos en la base de datos. Ejecuta el 'Scraper y Análisis Completo' desde la barra lateral.")
+                return
+
+            df_filtered = apply_filters(df, filters)
+
+            if selected_view == "Cámara de Eco":
+                display_echo_chamber_analysis(df_filtered)
+            elif selected_view == "Arcos Narrativos":
+                display_narrative_arc_analysis(df_filtered)
+            elif selected_view == "Análisis de Encuadre":
+                display_framing_analysis(df_filtered)
+            elif selected_view == "Mapa Geográfico":
+                display_geomapping_analysis(df_filtered)
+            elif selected_view == "Explorador de Citas":
+                display_quote_explorer(df_quotes)
+            elif selected_view == "Mapa de Entidades":
+                display_network_analysis(df_filtered)
+            elif selected_view == "Explorador de Entidades":
+                display_entity_explorer(df_filtered)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,14 +1,73 @@
 import sqlite3
 import json
+import re
 import os
+import zlib
+import queue
 import threading
+import contextlib
+import time
 from logger import logger
+from labels import SUBJECTIVITY_LABELS
 
 # Construir una ruta relativa al archivo actual para que sea portable
 SRC_DIR = os.path.dirname(os.path.abspath(__file__))
 BACKEND_ROOT = os.path.dirname(SRC_DIR) # Apunta a la carpeta 'backend'
 DB_FILE = os.path.join(BACKEND_ROOT, 'data', 'headlines.db')
 
+# Ajustes de SQLite para cada conexión. El modo WAL (que se activa con la primera conexión de escritura
+# y queda guardado en el archivo) permite que los lectores lean mientras una ingesta escribe.
+PRAGMAS = {
+    "busy_timeout": 30000,     # ms de espera si otra conexión tiene el lock de escritura
+    "synchronous": "NORMAL",   # Con WAL no corrompe la DB; ante un corte de energía se pierden a lo sumo las últimas transacciones
+    "mmap_size": 268435456,    # 256 MB de lecturas por memoria mapeada
+    "cache_size": -32768,      # 32 MB de caché de páginas por conexión (negativo = KiB)
+    "temp_store": "MEMORY",
+}
+READ_POOL_SIZE = 4
+
+def connect(db_file=None, read_only=False, **kwargs):
+    """
+    Abre una conexión a la base de datos con los PRAGMAS de rendimiento.
+    Las conexiones de escritura activan el modo WAL; las de solo lectura rechazan cualquier escritura (query_only).
+    """
+    conn = sqlite3.connect(db_file or DB_FILE, check_same_thread=False, **kwargs)
+    conn.row_factory = sqlite3.Row
+    for name, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
+    else:
+        conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+# --- Versión de los datos ---
+# Un archivo junto a la DB con un token que cambia cada vez que se confirma una escritura. La API lo usa
+# para cachear respuestas y responder 304 sin consultar SQLite. Es un timestamp en nanosegundos y no un
+# contador leído e incrementado: dos procesos que confirman a la vez no pueden pisarse y dejar la versión igual.
+
+def data_version_path(db_file=None):
+    return f"{db_file or DB_FILE}.version"
+
+def marcar_datos_modificados(db_file=None):
+    """Cambia la versión de los datos. Llamar después de cada COMMIT que modifica lo que sirve la API."""
+    path = data_version_path(db_file)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(str(time.time_ns()))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.error(f"No se pudo actualizar la versión de los datos: {e}")
+
+def version_de_datos(db_file=None):
+    """Versión actual de los datos ('0' si todavía no se registró ninguna escritura)."""
+    try:
+        with open(data_version_path(db_file), 'r') as f:
+            return f.read().strip() or '0'
+    except OSError:
+        return '0'
+
 # Usamos un objeto local al hilo para gestionar las conexiones a la DB en un entorno concurrente.
 thread_local_storage = threading.local()
 
@@ -17,9 +76,7 @@ def get_db_connection():
     # Cada hilo tendrá su propia conexión.
     if not hasattr(thread_local_storage, 'connection'):
         try:
-            conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-            conn.row_factory = sqlite3.Row
-            thread_local_storage.connection = conn
+            thread_local_storage.connection = connect()
         except sqlite3.Error as e:
             logger.error(f"Error al conectar a la base de datos SQLite: {e}")
             return None
@@ -31,6 +88,60 @@ def close_db_connection():
         thread_local_storage.connection.close()
         del thread_local_storage.connection
 
+class ReadConnectionPool:
+    """
+    Pool pequeño de conexiones de solo lectura, compartido por los hilos de la API y del dashboard.
+    Las conexiones se reutilizan entre peticiones (conservan su caché de páginas y el mmap); como
+    mucho hay `size` prestadas a la vez, y los demás hilos esperan a que se devuelva una.
+    """
+
+    def __init__(self, db_file=None, size=READ_POOL_SIZE):
+        self.db_file = db_file or DB_FILE
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Presta una conexión de solo lectura y la devuelve al pool al salir del bloque."""
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = connect(self.db_file, read_only=True)
+            try:
+                yield conn
+            finally:
+                # No devolver al pool una conexión con una transacción de lectura abierta (fijaría un snapshot viejo)
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+_read_pools = {} # DB_FILE -> ReadConnectionPool
+_read_pools_lock = threading.Lock()
+
+def read_connection(db_file=None):
+    """Context manager que presta una conexión de solo lectura del pool de la base de datos."""
+    db_file = db_file or DB_FILE
+    with _read_pools_lock:
+        pool = _read_pools.get(db_file)
+        if pool is None:
+            pool = _read_pools[db_file] = ReadConnectionPool(db_file)
+    return pool.connection()
+
+def close_read_pools():
+    """Cierra las conexiones inactivas de todos los pools de lectura."""
+    with _read_pools_lock:
+        for pool in _read_pools.values():
+            pool.close()
+        _read_pools.clear()
+
 def create_table():
     """Crea la tabla 'headlines' con las nuevas columnas para análisis."""
     conn = get_db_connection()
@@ -75,6 +186,18 @@ def create_table():
             except sqlite3.OperationalError:
                 pass # Columna ya existe
 
+            try:
+                cursor.execute("ALTER TABLE headlines ADD COLUMN framing_label TEXT;")
+                cursor.execute("ALTER TABLE headlines ADD COLUMN framing_score REAL;")
+            except sqlite3.OperationalError:
+                pass # Columna ya existe
+
+            try:
+                # ID del artículo original del que este es un casi-duplicado (NULL si es original)
+                cursor.execute("ALTER TABLE headlines ADD COLUMN canonical_id INTEGER;")
+            except sqlite3.OperationalError:
+                pass # Columna ya existe
+
             # --- Crear tabla de citas ---
             conn.execute("""
                 CREATE TABLE IF NOT EXISTS quotes (
@@ -86,48 +209,544 @@ def create_table():
                 );
             """)
 
-            logger.info("Tabla 'headlines' y 'quotes' verificadas/creadas en SQLite.")
+            # --- Crear tabla de caché de briefings ---
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS briefings (
+                    cache_key TEXT PRIMARY KEY,
+                    briefing_date TEXT,
+                    article_count INTEGER,
+                    briefing TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+
+            # --- Crear tabla de historias (centroides para el clustering incremental) ---
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stories (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    headline TEXT,
+                    centroid BLOB NOT NULL,
+                    size INTEGER NOT NULL DEFAULT 0,
+                    first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_stories_last_seen ON stories (last_seen);")
+            # Los story_id anteriores se numeraban 1..n en cada corrida: los nuevos IDs empiezan después del máximo.
+            conn.execute("""
+                INSERT INTO sqlite_sequence (name, seq)
+                SELECT 'stories', COALESCE(MAX(story_id), 0) FROM headlines
+                WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'stories');
+            """)
+
+            # --- Crear tablas del índice de casi-duplicados (MinHash LSH) ---
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_signatures (
+                    headline_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    signature BLOB NOT NULL,
+                    PRIMARY KEY (headline_id, kind)
+                );
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lsh_buckets (
+                    kind TEXT NOT NULL,
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    headline_id INTEGER NOT NULL
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_buckets ON lsh_buckets (kind, band, bucket);")
+
+            # --- Crear tablas de detección de eventos (estado de las series y ráfagas detectadas) ---
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS event_series (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    mean REAL NOT NULL DEFAULT 0,
+                    var REAL NOT NULL DEFAULT 0,
+                    n INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (kind, key)
+                );
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    expected REAL,
+                    zscore REAL,
+                    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    UNIQUE (kind, key, bucket)
+                );
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_events_bucket ON events (bucket);")
+
+            logger.info("Tablas 'headlines', 'quotes', 'briefings', 'stories', de deduplicación y de eventos verificadas/creadas en SQLite.")
+        apply_migrations(conn)
     except sqlite3.Error as e:
         logger.error(f"Error al crear la tabla: {e}")
 
-def guardar_titular_en_db(source, headline, url, sentiment=None, entities=None, topic=None, summary=None, full_text=None, subjectivity=None, latitude=None, longitude=None, story_id=None):
-    """Guarda un titular y sus análisis en la DB. Devuelve el ID del titular."""
+# --- Migraciones versionadas ---
+# Cada migración se aplica una sola vez: PRAGMA user_version guarda la última versión aplicada.
+# Las migraciones nuevas se agregan al final de MIGRATIONS; nunca se modifican las ya publicadas.
+
+def _migration_unique_url(conn):
+    """Elimina titulares con URL repetida (conserva el de menor ID) y agrega un índice UNIQUE sobre url."""
+    duplicates = conn.execute("""
+        SELECT h.id AS duplicate_id, k.keep_id
+        FROM headlines h
+        JOIN (SELECT url, MIN(id) AS keep_id FROM headlines GROUP BY url HAVING COUNT(*) > 1) k ON h.url = k.url
+        WHERE h.id <> k.keep_id
+    """).fetchall()
+    if duplicates:
+        pairs = [(row['keep_id'], row['duplicate_id']) for row in duplicates]
+        # Las citas del duplicado pasan al titular que se conserva, salvo las que ya tiene
+        conn.executemany("UPDATE quotes SET headline_id = ? WHERE headline_id = ?", pairs)
+        conn.execute("""
+            DELETE FROM quotes WHERE id NOT IN (
+                SELECT MIN(id) FROM quotes GROUP BY headline_id, quote_text, quoted_person
+            )
+        """)
+        conn.executemany("DELETE FROM headlines WHERE id = ?", [(duplicate_id,) for _, duplicate_id in pairs])
+        conn.executemany("DELETE FROM minhash_signatures WHERE headline_id = ?", [(duplicate_id,) for _, duplicate_id in pairs])
+        conn.executemany("DELETE FROM lsh_buckets WHERE headline_id = ?", [(duplicate_id,) for _, duplicate_id in pairs])
+        logger.info(f"Migración: eliminados {len(pairs)} titulares con URL duplicada.")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_headlines_url ON headlines (url);")
+
+def _migration_query_indexes(conn):
+    """Índices para los patrones de acceso de la API, el dashboard y el pipeline."""
+    # Listado paginado ordenado por fecha y recorridos cronológicos (reconstrucción de eventos)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_collection_date ON headlines (collection_date, id);")
+    # Titulares de un medio ordenados por fecha; el rowid incluido cubre las consultas que solo piden el id
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_source_date ON headlines (source, collection_date);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_topic_date ON headlines (topic, collection_date);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_headlines_story_id ON headlines (story_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_quotes_headline_id ON quotes (headline_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_briefings_date ON briefings (briefing_date, created_at);")
+
+def _migration_entity_tables(conn):
+    """
+    Tablas normalizadas de entidades: `entities` (una fila por texto y tipo) y `headline_entities`
+    (qué entidades menciona cada titular). Se completan a partir del JSON de headlines.entities.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entities (
+            id INTEGER PRIMARY KEY,
+            text TEXT NOT NULL,
+            label TEXT NOT NULL,
+            UNIQUE (text, label)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS headline_entities (
+            headline_id INTEGER NOT NULL,
+            entity_id INTEGER NOT NULL,
+            PRIMARY KEY (headline_id, entity_id)
+        ) WITHOUT ROWID;
+    """)
+    # Titulares que mencionan una entidad (la clave primaria ya cubre las entidades de un titular)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_headline_entities_entity ON headline_entities (entity_id, headline_id);")
+
+    # Backfill en SQL con json_each; los JSON malformados se ignoran
+    mentions = """
+        SELECT h.id AS headline_id, trim(json_extract(j.value, '$.text')) AS text, json_extract(j.value, '$.label') AS label
+        FROM headlines h, json_each(h.entities) j
+        WHERE h.entities IS NOT NULL AND json_valid(h.entities)
+    """
+    conn.execute(f"""
+        INSERT OR IGNORE INTO entities (text, label)
+        SELECT DISTINCT text, label FROM ({mentions}) WHERE text <> '' AND label IS NOT NULL
+    """)
+    cursor = conn.execute(f"""
+        INSERT OR IGNORE INTO headline_entities (headline_id, entity_id)
+        SELECT m.headline_id, e.id FROM ({mentions}) m JOIN entities e ON e.text = m.text AND e.label = m.label
+    """)
+    logger.info(f"Migración de entidades: {cursor.rowcount} menciones normalizadas.")
+
+def _migration_fts_index(conn):
+    """
+    Índice de texto completo (FTS5) sobre titular, resumen, cuerpo y citas, con una fila por titular
+    (rowid = headlines.id). El tokenizador unicode61 con remove_diacritics 2 ignora mayúsculas y
+    tildes ("economia" encuentra "Economía"). Los triggers lo mantienen sincronizado con headlines y quotes.
+    """
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS headlines_fts USING fts5(
+            headline, summary, full_text, quotes,
+            tokenize = 'unicode61 remove_diacritics 2'
+        );
+    """)
+    # Un UPDATE de story_id o de los análisis no toca el índice: el trigger de UPDATE solo mira las columnas indexadas
+    triggers = [
+        """CREATE TRIGGER IF NOT EXISTS headlines_fts_insert AFTER INSERT ON headlines BEGIN
+               INSERT INTO headlines_fts (rowid, headline, summary, full_text, quotes)
+               VALUES (new.id, new.headline, new.summary, new.full_text, NULL);
+           END;""",
+        """CREATE TRIGGER IF NOT EXISTS headlines_fts_update AFTER UPDATE OF headline, summary, full_text ON headlines BEGIN
+               UPDATE headlines_fts SET headline = new.headline, summary = new.summary, full_text = new.full_text
+               WHERE rowid = new.id;
+           END;""",
+        """CREATE TRIGGER IF NOT EXISTS headlines_fts_delete AFTER DELETE ON headlines BEGIN
+               DELETE FROM headlines_fts WHERE rowid = old.id;
+           END;""",
+        """CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+               UPDATE headlines_fts SET quotes = (SELECT group_concat(quote_text, ' ') FROM quotes WHERE headline_id = new.headline_id)
+               WHERE rowid = new.headline_id;
+           END;""",
+        """CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+               UPDATE headlines_fts SET quotes = (SELECT group_concat(quote_text, ' ') FROM quotes WHERE headline_id = old.headline_id)
+               WHERE rowid = old.headline_id;
+           END;""",
+    ]
+    for trigger in triggers: # executescript confirmaría la transacción de la migración
+        conn.execute(trigger)
+
+    conn.execute("DELETE FROM headlines_fts")
+    conn.execute("""
+        INSERT INTO headlines_fts (rowid, headline, summary, full_text, quotes)
+        SELECT h.id, h.headline, h.summary, h.full_text,
+               (SELECT group_concat(q.quote_text, ' ') FROM quotes q WHERE q.headline_id = h.id)
+        FROM headlines h
+    """)
+
+def comprimir_cuerpo(text):
+    """Comprime el cuerpo de un artículo (UTF-8 + zlib) para guardarlo en article_bodies."""
+    return zlib.compress(text.encode('utf-8'), 6) if text else None
+
+def descomprimir_cuerpo(blob):
+    return zlib.decompress(blob).decode('utf-8') if blob is not None else None
+
+def _bytes_de_tabla(conn, table):
+    """
+    Bytes de datos de las filas de una tabla (sin sus índices) según dbstat; None si SQLite no tiene dbstat.
+    Se mide el payload y no las páginas: hasta el próximo VACUUM las páginas liberadas siguen asignadas.
+    """
+    try:
+        return conn.execute("SELECT SUM(payload) FROM dbstat WHERE name = ?", (table,)).fetchone()[0] or 0
+    except sqlite3.Error:
+        return None
+
+def _migration_article_bodies(conn):
+    """
+    Saca los cuerpos de los artículos (headlines.full_text) de la tabla headlines y los guarda comprimidos
+    en article_bodies, para que las filas de headlines sean chicas (más filas por página, lecturas más rápidas).
+    El índice FTS conserva su propia copia del texto, así que la búsqueda y los snippets no cambian.
+    """
+    rows, raw_bytes = conn.execute(
+        "SELECT COUNT(full_text), COALESCE(SUM(length(CAST(full_text AS BLOB))), 0) FROM headlines"
+    ).fetchone()
+    headlines_before = _bytes_de_tabla(conn, 'headlines')
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS article_bodies (
+            headline_id INTEGER PRIMARY KEY,
+            body BLOB NOT NULL
+        );
+    """)
+    conn.create_function("comprimir_cuerpo", 1, comprimir_cuerpo, deterministic=True)
+    conn.execute("""
+        INSERT OR REPLACE INTO article_bodies (headline_id, body)
+        SELECT id, comprimir_cuerpo(full_text) FROM headlines WHERE full_text IS NOT NULL AND full_text <> ''
+    """)
+
+    # Los triggers del FTS que leían new.full_text impiden borrar la columna: se recrean sin ella.
+    # El cuerpo del índice lo escribe ahora insertar_cuerpo (ver insertar_titular).
+    conn.execute("DROP TRIGGER IF EXISTS headlines_fts_insert")
+    conn.execute("DROP TRIGGER IF EXISTS headlines_fts_update")
+    conn.execute("""CREATE TRIGGER headlines_fts_insert AFTER INSERT ON headlines BEGIN
+                        INSERT INTO headlines_fts (rowid, headline, summary, full_text, quotes)
+                        VALUES (new.id, new.headline, new.summary, NULL, NULL);
+                    END;""")
+    conn.execute("""CREATE TRIGGER headlines_fts_update AFTER UPDATE OF headline, summary ON headlines BEGIN
+                        UPDATE headlines_fts SET headline = new.headline, summary = new.summary WHERE rowid = new.id;
+                    END;""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS article_bodies_delete AFTER DELETE ON headlines BEGIN
+                        DELETE FROM article_bodies WHERE headline_id = old.id;
+                    END;""")
+    conn.execute("ALTER TABLE headlines DROP COLUMN full_text")
+
+    compressed_bytes = conn.execute("SELECT COALESCE(SUM(length(body)), 0) FROM article_bodies").fetchone()[0]
+    headlines_after = _bytes_de_tabla(conn, 'headlines')
+    logger.info(f"Cuerpos de artículos: {rows} movidos a article_bodies, {raw_bytes / 1024 ** 2:.1f} MB sin comprimir -> "
+                f"{compressed_bytes / 1024 ** 2:.1f} MB comprimidos"
+                + (f" ({compressed_bytes / raw_bytes:.0%})." if raw_bytes else "."))
+    if headlines_before is not None:
+        logger.info(f"Datos de la tabla headlines: {headlines_before / 1024 ** 2:.1f} MB -> {headlines_after / 1024 ** 2:.1f} MB. "
+                    "Ejecutar 'python main.py vacuum' para devolver al disco el espacio liberado.")
+    return {'rows': rows, 'raw_bytes': raw_bytes, 'compressed_bytes': compressed_bytes,
+            'headlines_before': headlines_before, 'headlines_after': headlines_after}
+
+# --- Rollups de conteos por hora ---
+# Dimensiones de headline_rollup; los NULL se guardan como '' para que entren en la clave primaria
+ROLLUP_DIMENSIONS = ('source', 'topic', 'sentiment_label', 'subjectivity_label')
+
+def _rollup_key(row):
+    """Expresiones de la clave de headline_rollup para una fila de headlines (`new`, `old` o un alias)."""
+    return (f"COALESCE(strftime('%Y-%m-%d %H:00:00', {row}.collection_date), ''), {row}.source, "
+            f"COALESCE({row}.topic, ''), COALESCE({row}.sentiment_label, ''), COALESCE({row}.subjectivity_label, '')")
+
+def _rellenar_rollups(conn, keep_months=()):
+    """
+    Recalcula headline_rollup desde headlines (dentro de la transacción de quien llama). Los buckets de
+    `keep_months` ('AAAA-MM', meses archivados que ya no están en headlines) se conservan.
+    Devuelve la cantidad de buckets.
+    """
+    conn.execute("DELETE FROM headline_rollup WHERE substr(bucket, 1, 7) NOT IN (SELECT value FROM json_each(?))",
+                 (json.dumps(list(keep_months)),))
+    conn.execute(f"""
+        INSERT INTO headline_rollup (bucket, {', '.join(ROLLUP_DIMENSIONS)}, count)
+        SELECT {_rollup_key('h')}, COUNT(*) FROM headlines h GROUP BY 1, 2, 3, 4, 5
+    """)
+    return conn.execute("SELECT COUNT(*) FROM headline_rollup").fetchone()[0]
+
+def recontar_rollups_de_rango(conn, date_from, date_to):
+    """
+    Recalcula desde headlines los buckets de headline_rollup entre `date_from` (inclusivo) y `date_to`
+    (exclusivo), usando la conexión dada, sin confirmar. Lo usa la restauración de un mes archivado.
+    """
+    conn.execute("DELETE FROM headline_rollup WHERE bucket >= ? AND bucket < ?", (date_from, date_to))
+    conn.execute(f"""
+        INSERT INTO headline_rollup (bucket, {', '.join(ROLLUP_DIMENSIONS)}, count)
+        SELECT {_rollup_key('h')}, COUNT(*) FROM headlines h
+        WHERE h.collection_date >= ? AND h.collection_date < ? GROUP BY 1, 2, 3, 4, 5
+    """, (date_from, date_to))
+
+def _migration_rollups(conn):
+    """
+    Tabla headline_rollup: cantidad de titulares por hora × medio × tópico × sentimiento × subjetividad.
+    La mantienen los triggers de headlines (también al actualizar o borrar un titular), así que los conteos
+    del dashboard y de /api/stats leen unos pocos buckets en lugar de recorrer todos los titulares.
+    Los conteos por día se obtienen sumando las horas.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS headline_rollup (
+            bucket TEXT NOT NULL,
+            source TEXT NOT NULL,
+            topic TEXT NOT NULL,
+            sentiment_label TEXT NOT NULL,
+            subjectivity_label TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, source, topic, sentiment_label, subjectivity_label)
+        ) WITHOUT ROWID;
+    """)
+    key_columns = f"bucket, {', '.join(ROLLUP_DIMENSIONS)}"
+    increment = f"""INSERT INTO headline_rollup ({key_columns}, count) VALUES ({_rollup_key('new')}, 1)
+                    ON CONFLICT ({key_columns}) DO UPDATE SET count = count + 1;"""
+    # Los valores de la fila vieja se comparan contra la clave con un SELECT para no repetir las expresiones
+    decrement = f"""UPDATE headline_rollup SET count = count - 1
+                    WHERE ({key_columns}) = (SELECT {_rollup_key('old')});
+                    DELETE FROM headline_rollup WHERE ({key_columns}) = (SELECT {_rollup_key('old')}) AND count <= 0;"""
+    triggers = [
+        f"""CREATE TRIGGER IF NOT EXISTS headline_rollup_insert AFTER INSERT ON headlines BEGIN
+                {increment}
+            END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS headline_rollup_update
+            AFTER UPDATE OF collection_date, {', '.join(ROLLUP_DIMENSIONS)} ON headlines BEGIN
+                {decrement}
+                {increment}
+            END;""",
+        f"""CREATE TRIGGER IF NOT EXISTS headline_rollup_delete AFTER DELETE ON headlines BEGIN
+                {decrement}
+            END;""",
+    ]
+    for trigger in triggers: # executescript confirmaría la transacción de la migración
+        conn.execute(trigger)
+    buckets = _rellenar_rollups(conn)
+    logger.info(f"Migración de rollups: {buckets} buckets calculados.")
+
+def _migration_archived_months(conn):
+    """
+    Tabla archived_months: los meses cuyos titulares se movieron al archivo en Parquet (ver archive.py).
+    Sus buckets de headline_rollup se conservan, así que las estadísticas siguen cubriendo todo el historial.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS archived_months (
+            month TEXT PRIMARY KEY,
+            headlines INTEGER NOT NULL,
+            quotes INTEGER NOT NULL,
+            archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def _migration_row_counts(conn):
+    """
+    Tabla row_counts con la cantidad de filas de headlines, mantenida por triggers: el total de
+    /api/headlines se lee de una fila en lugar de recorrer la tabla con COUNT(*).
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS row_counts (
+            name TEXT PRIMARY KEY,
+            count INTEGER NOT NULL
+        );
+    """)
+    conn.execute("INSERT OR REPLACE INTO row_counts (name, count) SELECT 'headlines', COUNT(*) FROM headlines")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS headlines_count_insert AFTER INSERT ON headlines BEGIN
+                        UPDATE row_counts SET count = count + 1 WHERE name = 'headlines';
+                    END;""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS headlines_count_delete AFTER DELETE ON headlines BEGIN
+                        UPDATE row_counts SET count = count - 1 WHERE name = 'headlines';
+                    END;""")
+
+def _migration_scrape_jobs(conn):
+    """
+    Cola persistente de trabajos de scraping (ver scrape_jobs.py): la API encola y un proceso worker
+    aparte (`python main.py worker`) los ejecuta, registrando la etapa y el progreso de cada uno.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS scrape_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            status TEXT NOT NULL DEFAULT 'queued', -- queued, running, succeeded, failed, cancelled
+            sources TEXT,                          -- lista JSON de medios; NULL = las fuentes activas
+            stage TEXT,
+            collected INTEGER NOT NULL DEFAULT 0,
+            fetched INTEGER NOT NULL DEFAULT 0,
+            analyzed INTEGER NOT NULL DEFAULT 0,
+            saved INTEGER NOT NULL DEFAULT 0,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            worker TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_scrape_jobs_status ON scrape_jobs (status, id);")
+    # Como mucho un trabajo activo: la base de datos lo garantiza aunque encolen varios procesos de la API a la vez
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_scrape_jobs_one_active ON scrape_jobs ((1)) WHERE status IN ('queued', 'running');")
+
+MIGRATIONS = [
+    (1, "Índice UNIQUE sobre headlines.url", _migration_unique_url),
+    (2, "Índices de consulta de headlines, quotes y briefings", _migration_query_indexes),
+    (3, "Tablas normalizadas entities y headline_entities", _migration_entity_tables),
+    (4, "Índice FTS5 de titulares, resúmenes, cuerpos y citas", _migration_fts_index),
+    (5, "Cuerpos de artículos comprimidos en article_bodies", _migration_article_bodies),
+    (6, "Rollups de conteos por hora en headline_rollup", _migration_rollups),
+    (7, "Registro de meses archivados en archived_months", _migration_archived_months),
+    (8, "Conteo de titulares mantenido por triggers en row_counts", _migration_row_counts),
+    (9, "Cola persistente de trabajos de scraping en scrape_jobs", _migration_scrape_jobs),
+]
+
+def compactar_db():
+    """
+    Ejecuta VACUUM para devolver al disco las páginas libres (por ejemplo, después de mover los cuerpos
+    a article_bodies). Devuelve el tamaño del archivo en bytes antes y después.
+    """
     conn = get_db_connection()
     if conn is None:
-        return
+        return None
+    before = os.path.getsize(DB_FILE)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") # Con WAL, VACUUM escribe primero en el log
+    except sqlite3.Error as e:
+        logger.error(f"Error al compactar la base de datos: {e}", exc_info=True)
+        return None
+    after = os.path.getsize(DB_FILE)
+    logger.info(f"Base de datos compactada: {before / 1024 ** 2:.1f} MB -> {after / 1024 ** 2:.1f} MB.")
+    return before, after
+
+def apply_migrations(conn):
+    """Aplica, cada una en su propia transacción, las migraciones con versión mayor a PRAGMA user_version."""
+    current_version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        with conn:
+            conn.execute("BEGIN") # Transacción explícita: sqlite3 no abre una por sí solo antes de un DDL
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        logger.info(f"Migración {version} aplicada: {description}.")
 
+def insertar_titular(conn, source, headline, url, sentiment=None, entities=None, topic=None, summary=None, full_text=None, subjectivity=None, latitude=None, longitude=None, story_id=None, canonical_id=None):
+    """
+    Inserta un titular con un upsert sobre la URL (índice UNIQUE) usando la conexión dada, sin confirmar
+    la transacción (la maneja quien llama: guardar_titular_en_db o el DBWriter).
+    Devuelve una tupla (headline_id, was_new); was_new es False si la URL ya existía.
+    """
     sentiment_label = sentiment['label'] if sentiment else None
     sentiment_score = sentiment['score'] if sentiment else None
     entities_json = json.dumps(entities) if entities else None
     subjectivity_label = subjectivity['label'] if subjectivity else None
     subjectivity_score = subjectivity['score'] if subjectivity else None
 
+    # Una sola sentencia: si la URL ya existe no se inserta nada y RETURNING no devuelve filas.
+    # (El índice UNIQUE también evita que dos hilos inserten la misma URL a la vez.)
+    row = conn.execute(
+        """INSERT INTO headlines 
+           (source, headline, url, sentiment_label, sentiment_score, entities, topic, summary, subjectivity_label, subjectivity_score, latitude, longitude, story_id, canonical_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+           ON CONFLICT (url) DO NOTHING
+           RETURNING id""",
+        (source, headline, url, sentiment_label, sentiment_score, entities_json, topic, summary, subjectivity_label, subjectivity_score, latitude, longitude, story_id, canonical_id)
+    ).fetchone()
+    if row is not None:
+        insertar_cuerpo(conn, row[0], full_text)
+        insertar_entidades(conn, row[0], entities)
+        logger.info(f"✓ Titular guardado: {headline[:40]}...")
+        return row[0], True
+
+    # Titular duplicado: completar su story_id si no lo tiene
+    row = conn.execute(
+        "UPDATE headlines SET story_id = COALESCE(story_id, ?) WHERE url = ? RETURNING id",
+        (story_id, url)
+    ).fetchone()
+    logger.info(f"- Titular duplicado (omitido): {headline[:40]}...")
+    return (row[0] if row else None), False
+
+def insertar_cuerpo(conn, headline_id, full_text):
+    """Guarda el cuerpo comprimido de un artículo y lo agrega al índice FTS, usando la conexión dada, sin confirmar."""
+    if not full_text:
+        return
+    conn.execute("INSERT OR REPLACE INTO article_bodies (headline_id, body) VALUES (?, ?)", (headline_id, comprimir_cuerpo(full_text)))
+    conn.execute("UPDATE headlines_fts SET full_text = ? WHERE rowid = ?", (full_text, headline_id))
+
+def obtener_cuerpo_articulo(conn, headline_id):
+    """Devuelve el cuerpo descomprimido de un artículo, o None si no tiene. Solo para las vistas de detalle."""
+    row = conn.execute("SELECT body FROM article_bodies WHERE headline_id = ?", (headline_id,)).fetchone()
+    return descomprimir_cuerpo(row[0]) if row else None
+
+def insertar_entidades(conn, headline_id, entities):
+    """Enlaza un titular con sus entidades (creándolas si no existen) usando la conexión dada, sin confirmar."""
+    mentions = {(entity['text'].strip(), entity['label']) for entity in entities or [] if entity.get('text', '').strip() and entity.get('label')}
+    if not mentions:
+        return
+    conn.executemany("INSERT OR IGNORE INTO entities (text, label) VALUES (?, ?)", mentions)
+    conn.executemany(
+        "INSERT OR IGNORE INTO headline_entities (headline_id, entity_id) SELECT ?, id FROM entities WHERE text = ? AND label = ?",
+        [(headline_id, text, label) for text, label in mentions]
+    )
+
+def guardar_titular_en_db(source, headline, url, sentiment=None, entities=None, topic=None, summary=None, full_text=None, subjectivity=None, latitude=None, longitude=None, story_id=None, canonical_id=None):
+    """Guarda un titular y sus análisis en la DB en su propia transacción. Devuelve una tupla (headline_id, was_new)."""
+    conn = get_db_connection()
+    if conn is None:
+        return None, False
+
     try:
         with conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM headlines WHERE url = ?", (url,)) # Usar URL como clave única es más robusto
-            row = cursor.fetchone()
-            
-            if row is None:
-                cursor.execute(
-                    """INSERT INTO headlines 
-                       (source, headline, url, sentiment_label, sentiment_score, entities, topic, summary, full_text, subjectivity_label, subjectivity_score, latitude, longitude, story_id)
-                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                    (source, headline, url, sentiment_label, sentiment_score, entities_json, topic, summary, full_text, subjectivity_label, subjectivity_score, latitude, longitude, story_id)
-                )
-                headline_id = cursor.lastrowid
-                logger.info(f"✓ Titular guardado: {headline[:40]}...")
-                return headline_id, True
-            else:
-                headline_id = row['id']
-                # Si el titular ya existe, quizás queramos actualizar su story_id si no lo tiene
-                cursor.execute("UPDATE headlines SET story_id = ? WHERE id = ? AND story_id IS NULL", (story_id, headline_id))
-                logger.info(f"- Titular duplicado (omitido): {headline[:40]}...")
-                return headline_id, False
+            result = insertar_titular(conn, source, headline, url, sentiment, entities, topic, summary, full_text, subjectivity, latitude, longitude, story_id, canonical_id)
+        if result[1]:
+            marcar_datos_modificados()
+        return result
     except sqlite3.Error as e:
         logger.error(f"Error al guardar el titular en SQLite: {e}", exc_info=True)
     return None, False
 
+def insertar_citas(conn, headline_id, quotes):
+    """Inserta una lista de citas asociadas a un titular usando la conexión dada, sin confirmar la transacción."""
+    if not quotes or headline_id is None:
+        return 0
+    conn.executemany(
+        "INSERT INTO quotes (headline_id, quote_text, quoted_person) VALUES (?, ?, ?)",
+        [(headline_id, quote['text'], quote['person']) for quote in quotes]
+    )
+    logger.info(f"  -> Guardadas {len(quotes)} citas.")
+    return len(quotes)
+
 def guardar_citas_en_db(headline_id, quotes):
     """Guarda una lista de citas asociadas a un titular."""
     if not quotes or headline_id is None:
@@ -139,12 +758,799 @@ def guardar_citas_en_db(headline_id, quotes):
     
     try:
         with conn:
-            cursor = conn.cursor()
-            for quote in quotes:
-                cursor.execute(
-                    "INSERT INTO quotes (headline_id, quote_text, quoted_person) VALUES (?, ?, ?)",
-                    (headline_id, quote['text'], quote['person'])
-                )
-            logger.info(f"  -> Guardadas {len(quotes)} citas.")
+            insertar_citas(conn, headline_id, quotes)
+        marcar_datos_modificados()
     except sqlite3.Error as e:
         logger.error(f"Error al guardar citas en SQLite: {e}", exc_info=True)
+
+def obtener_titulares_sin_framing(topics, headline_ids=None):
+    """
+    Devuelve los titulares (id, headline, topic) que aún no tienen encuadre y cuyo tópico
+    tiene etiquetas de framing configuradas. Si se pasan IDs, se limita a esos titulares.
+    """
+    conn = get_db_connection()
+    if conn is None or not topics:
+        return []
+
+    query = f"SELECT id, headline, topic FROM headlines WHERE framing_label IS NULL AND topic IN ({','.join('?' * len(topics))})"
+    params = list(topics)
+    if headline_ids is not None:
+        if not headline_ids:
+            return []
+        query += f" AND id IN ({','.join('?' * len(headline_ids))})"
+        params.extend(headline_ids)
+
+    try:
+        return [dict(row) for row in conn.execute(query, params).fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al leer titulares sin encuadre: {e}", exc_info=True)
+        return []
+
+def guardar_framing_en_db(framings):
+    """Guarda en lote los encuadres calculados. Recibe una lista de tuplas (headline_id, framing)."""
+    rows = [(f['label'], f['score'], headline_id) for headline_id, f in framings if f]
+    if not rows:
+        return
+
+    conn = get_db_connection()
+    if conn is None:
+        return
+
+    try:
+        with conn:
+            conn.executemany("UPDATE headlines SET framing_label = ?, framing_score = ? WHERE id = ?", rows)
+        marcar_datos_modificados()
+        logger.info(f"  -> Guardados {len(rows)} encuadres.")
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar encuadres en SQLite: {e}", exc_info=True)
+
+def obtener_briefing_cacheado(cache_key):
+    """Devuelve el briefing guardado para una clave de caché, o None si no existe."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute("SELECT briefing FROM briefings WHERE cache_key = ?", (cache_key,)).fetchone()
+        return row['briefing'] if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Error al leer la caché de briefings: {e}", exc_info=True)
+        return None
+
+def obtener_briefing_del_dia(briefing_date):
+    """Devuelve el último briefing precalculado para una fecha (YYYY-MM-DD), o None."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        row = conn.execute(
+            "SELECT briefing, article_count, created_at FROM briefings WHERE briefing_date = ? ORDER BY created_at DESC LIMIT 1",
+            (briefing_date,)
+        ).fetchone()
+        return dict(row) if row else None
+    except sqlite3.Error as e:
+        logger.error(f"Error al leer el briefing del día: {e}", exc_info=True)
+        return None
+
+def guardar_briefing(cache_key, briefing, article_count, briefing_date=None):
+    """Guarda un briefing en la caché."""
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO briefings (cache_key, briefing_date, article_count, briefing) VALUES (?, ?, ?, ?)",
+                (cache_key, briefing_date, article_count, briefing)
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar el briefing en SQLite: {e}", exc_info=True)
+
+def cargar_historias_activas(window_days):
+    """Devuelve las historias vistas en los últimos `window_days` días (id, size y centroide en bytes)."""
+    conn = get_db_connection()
+    if conn is None:
+        return []
+    try:
+        rows = conn.execute(
+            "SELECT id, size, centroid FROM stories WHERE last_seen >= datetime('now', ?)",
+            (f"-{int(window_days)} days",)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    except sqlite3.Error as e:
+        logger.error(f"Error al cargar las historias activas: {e}", exc_info=True)
+        return []
+
+def guardar_historias(updated_stories, new_stories):
+    """
+    Actualiza los centroides de historias existentes y crea las nuevas en una única transacción.
+    - updated_stories: lista de tuplas (story_id, centroid_bytes, size).
+    - new_stories: lista de tuplas (headline, centroid_bytes, size).
+    Devuelve la lista de IDs asignados a las historias nuevas (en el mismo orden).
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return []
+    try:
+        with conn:
+            conn.executemany(
+                "UPDATE stories SET centroid = ?, size = ?, last_seen = CURRENT_TIMESTAMP WHERE id = ?",
+                [(centroid, size, story_id) for story_id, centroid, size in updated_stories]
+            )
+            new_ids = []
+            for headline, centroid, size in new_stories:
+                cursor = conn.execute("INSERT INTO stories (headline, centroid, size) VALUES (?, ?, ?)", (headline, centroid, size))
+                new_ids.append(cursor.lastrowid)
+        return new_ids
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar las historias en SQLite: {e}", exc_info=True)
+        return []
+
+def obtener_ids_por_url(urls):
+    """Devuelve un diccionario {url: id} con las URLs que ya existen en la tabla 'headlines'."""
+    conn = get_db_connection()
+    if conn is None or not urls:
+        return {}
+    result = {}
+    try:
+        urls = list(urls)
+        for i in range(0, len(urls), 500): # Respetar el límite de parámetros de SQLite
+            chunk = urls[i:i + 500]
+            rows = conn.execute(f"SELECT id, url FROM headlines WHERE url IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            result.update({row['url']: row['id'] for row in rows})
+    except sqlite3.Error as e:
+        logger.error(f"Error al buscar titulares por URL: {e}", exc_info=True)
+    return result
+
+def filtrar_ids_titulares(source=None, topic=None, date_from=None, date_to=None, headline_ids=None, limit=None):
+    """
+    Devuelve los IDs de los titulares que cumplen los filtros (medio, tópico y rango de fechas, inclusivo).
+    Si se pasan `headline_ids`, solo se consideran esos titulares.
+    """
+    conditions, params = [], []
+    if source is not None:
+        conditions.append("source = ?")
+        params.append(source)
+    if topic is not None:
+        conditions.append("topic = ?")
+        params.append(topic)
+    # Rangos sobre la columna (y no sobre date(collection_date)) para que SQLite pueda usar los índices
+    if date_from is not None:
+        conditions.append("collection_date >= ?")
+        params.append(str(date_from))
+    if date_to is not None:
+        conditions.append("collection_date < date(?, '+1 day')")
+        params.append(str(date_to))
+    where = " AND ".join(conditions) or "1"
+
+    try:
+        # Se usa desde la API: lee con una conexión del pool de solo lectura
+        with read_connection() as conn:
+            if headline_ids is None:
+                query = f"SELECT id FROM headlines WHERE {where} ORDER BY id DESC"
+                if limit is not None:
+                    query += f" LIMIT {int(limit)}"
+                return [row['id'] for row in conn.execute(query, params).fetchall()]
+
+            result = []
+            headline_ids = list(headline_ids)
+            for i in range(0, len(headline_ids), 500): # Respetar el límite de parámetros de SQLite
+                chunk = headline_ids[i:i + 500]
+                query = f"SELECT id FROM headlines WHERE {where} AND id IN ({','.join('?' * len(chunk))})"
+                result.extend(row['id'] for row in conn.execute(query, params + chunk).fetchall())
+            return result
+    except sqlite3.Error as e:
+        logger.error(f"Error al filtrar titulares: {e}", exc_info=True)
+        return []
+
+def contar_titulares(conn):
+    """Cantidad de titulares en la DB (de row_counts, sin recorrer la tabla)."""
+    row = conn.execute("SELECT count FROM row_counts WHERE name = 'headlines'").fetchone()
+    return row[0] if row else 0
+
+def listar_titulares(conn, limit, before=None):
+    """
+    Página de titulares del más reciente al más antiguo (paginación por clave): `before` es la tupla
+    (collection_date, id) del último titular de la página anterior. Con el índice (collection_date, id)
+    el costo de una página no depende de su profundidad, a diferencia de OFFSET.
+    """
+    query = "SELECT * FROM headlines"
+    params = []
+    if before is not None:
+        query += " WHERE (collection_date, id) < (?, ?)"
+        params.extend(before)
+    query += " ORDER BY collection_date DESC, id DESC LIMIT ?"
+    params.append(int(limit))
+    return [dict(row) for row in conn.execute(query, params).fetchall()]
+
+def titulares_de_fuente(conn, source):
+    """Titulares de un medio, del más reciente al más antiguo."""
+    query = "SELECT * FROM headlines WHERE source = ? ORDER BY collection_date DESC"
+    return [dict(row) for row in conn.execute(query, (source,)).fetchall()]
+
+def titulares_por_ids(conn, headline_ids):
+    """Titulares con los IDs dados (en cualquier orden)."""
+    query = "SELECT * FROM headlines WHERE id IN (SELECT value FROM json_each(?))"
+    return [dict(row) for row in conn.execute(query, (_ids_json(headline_ids),)).fetchall()]
+
+def obtener_titular(conn, headline_id):
+    """Un titular por su ID, o None si no existe."""
+    row = conn.execute("SELECT * FROM headlines WHERE id = ?", (headline_id,)).fetchone()
+    return dict(row) if row else None
+
+def listar_citas(conn):
+    """Todas las citas con el titular y la URL del artículo del que se extrajeron."""
+    query = "SELECT q.quote_text, q.quoted_person, h.headline, h.url FROM quotes q JOIN headlines h ON q.headline_id = h.id"
+    return [dict(row) for row in conn.execute(query).fetchall()]
+
+def listar_eventos(conn, since, kind=None, limit=100):
+    """Ráfagas detectadas desde la hora `since`, de la más reciente a la más antigua (solo lee la tabla 'events')."""
+    query = """
+        SELECT e.kind, e.key, e.bucket, e.count, e.expected, e.zscore, e.detected_at, s.headline AS story_headline
+        FROM events e
+        LEFT JOIN stories s ON e.kind = 'story' AND s.id = CAST(e.key AS INTEGER)
+        WHERE e.bucket >= ? AND (? IS NULL OR e.kind = ?)
+        ORDER BY e.bucket DESC, e.zscore DESC
+        LIMIT ?
+    """
+    return [dict(row) for row in conn.execute(query, (since, kind, kind, int(limit))).fetchall()]
+
+# --- Trabajos de scraping ---
+SCRAPE_JOB_ACTIVE = ('queued', 'running')
+SCRAPE_JOB_PROGRESS = ('stage', 'collected', 'fetched', 'analyzed', 'saved')
+
+def crear_trabajo_scrape(sources=None):
+    """
+    Encola un trabajo de scraping, salvo que ya haya uno en cola o en ejecución.
+    Devuelve una tupla (job_id, created): con created=False, job_id es el del trabajo activo.
+    """
+    conn = get_db_connection()
+    try:
+        with conn:
+            cursor = conn.execute("INSERT INTO scrape_jobs (sources) VALUES (?)", (json.dumps(sources) if sources is not None else None,))
+        return cursor.lastrowid, True
+    except sqlite3.IntegrityError:
+        # idx_scrape_jobs_one_active: ya hay un trabajo en cola o en ejecución
+        active = conn.execute("SELECT id FROM scrape_jobs WHERE status IN ('queued', 'running') ORDER BY id LIMIT 1").fetchone()
+        return (active[0] if active else None), False
+
+def tomar_trabajo_scrape(worker):
+    """Marca como 'running' el trabajo en cola más antiguo y lo devuelve (None si no hay ninguno)."""
+    conn = get_db_connection()
+    with conn:
+        row = conn.execute(
+            """UPDATE scrape_jobs SET status = 'running', worker = ?, started_at = CURRENT_TIMESTAMP
+               WHERE id = (SELECT id FROM scrape_jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+               RETURNING *""",
+            (worker,)
+        ).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['sources'] = json.loads(job['sources']) if job['sources'] else None
+    return job
+
+def actualizar_trabajo_scrape(job_id, **progress):
+    """Guarda la etapa y los contadores de progreso de un trabajo (ver SCRAPE_JOB_PROGRESS)."""
+    if not set(progress) <= set(SCRAPE_JOB_PROGRESS):
+        raise ValueError(f"Campos de progreso no válidos: {sorted(set(progress) - set(SCRAPE_JOB_PROGRESS))}")
+    if not progress:
+        return
+    conn = get_db_connection()
+    with conn:
+        conn.execute(f"UPDATE scrape_jobs SET {', '.join(f'{name} = ?' for name in progress)} WHERE id = ?", [*progress.values(), job_id])
+
+def finalizar_trabajo_scrape(job_id, status, error=None):
+    conn = get_db_connection()
+    with conn:
+        conn.execute("UPDATE scrape_jobs SET status = ?, error = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?", (status, error, job_id))
+
+def cancelar_trabajo_scrape(job_id):
+    """
+    Cancela un trabajo: uno en cola se cancela en el acto; a uno en ejecución se le pide que se detenga
+    (el worker lo comprueba entre etapas y artículos). Devuelve el trabajo, o None si no existe.
+    """
+    conn = get_db_connection()
+    with conn:
+        conn.execute("""UPDATE scrape_jobs SET status = 'cancelled', finished_at = CURRENT_TIMESTAMP
+                        WHERE id = ? AND status = 'queued'""", (job_id,))
+        conn.execute("UPDATE scrape_jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+    return obtener_trabajo_scrape(conn, job_id)
+
+def cancelacion_solicitada(job_id):
+    row = get_db_connection().execute("SELECT cancel_requested FROM scrape_jobs WHERE id = ?", (job_id,)).fetchone()
+    return bool(row and row[0])
+
+def marcar_trabajos_interrumpidos():
+    """Marca como fallidos los trabajos que quedaron 'running' (el worker que los ejecutaba se detuvo). Devuelve cuántos."""
+    conn = get_db_connection()
+    with conn:
+        return conn.execute(
+            """UPDATE scrape_jobs SET status = 'failed', error = 'El worker se detuvo durante la ejecución.', finished_at = CURRENT_TIMESTAMP
+               WHERE status = 'running'"""
+        ).rowcount
+
+def obtener_trabajo_scrape(conn, job_id):
+    """Un trabajo de scraping con su estado y progreso, o None si no existe."""
+    row = conn.execute("SELECT * FROM scrape_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['sources'] = json.loads(job['sources']) if job['sources'] else None
+    job['cancel_requested'] = bool(job['cancel_requested'])
+    return job
+
+def ultimo_trabajo_scrape(conn):
+    """El trabajo de scraping más reciente, o None si nunca se encoló ninguno."""
+    row = conn.execute("SELECT id FROM scrape_jobs ORDER BY id DESC LIMIT 1").fetchone()
+    return obtener_trabajo_scrape(conn, row[0]) if row else None
+
+def obtener_analisis_titular(headline_id):
+    """Devuelve la fila con los análisis guardados de un titular (o None si no existe)."""
+    conn = get_db_connection()
+    if conn is None:
+        return None
+    try:
+        return conn.execute(
+            """SELECT sentiment_label, sentiment_score, entities, topic, summary, subjectivity_label,
+                      subjectivity_score, latitude, longitude, canonical_id
+               FROM headlines WHERE id = ?""",
+            (headline_id,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Error al leer los análisis del titular {headline_id}: {e}", exc_info=True)
+        return None
+
+def buscar_candidatos_lsh(kind, band_keys):
+    """
+    Devuelve las tuplas (headline_id, firma) de los artículos que comparten al menos un bucket LSH.
+    `band_keys` es una lista de tuplas (banda, bucket).
+    """
+    conn = get_db_connection()
+    if conn is None or not band_keys:
+        return []
+    try:
+        conditions = " OR ".join("(b.band = ? AND b.bucket = ?)" for _ in band_keys)
+        params = [kind] + [value for key in band_keys for value in key] + [kind]
+        rows = conn.execute(
+            f"""SELECT DISTINCT s.headline_id, s.signature
+                FROM lsh_buckets b JOIN minhash_signatures s ON s.headline_id = b.headline_id
+                WHERE b.kind = ? AND ({conditions}) AND s.kind = ?""",
+            params
+        ).fetchall()
+        return [(row['headline_id'], row['signature']) for row in rows]
+    except sqlite3.Error as e:
+        logger.error(f"Error al buscar candidatos de casi-duplicados: {e}", exc_info=True)
+        return []
+
+def guardar_firmas_minhash(entries):
+    """
+    Guarda firmas MinHash y sus buckets LSH en una única transacción.
+    Recibe una lista de tuplas (headline_id, kind, firma_bytes, band_keys).
+    """
+    if not entries:
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO minhash_signatures (headline_id, kind, signature) VALUES (?, ?, ?)",
+                [(headline_id, kind, signature) for headline_id, kind, signature, _ in entries]
+            )
+            conn.executemany(
+                "INSERT INTO lsh_buckets (kind, band, bucket, headline_id) VALUES (?, ?, ?, ?)",
+                [(kind, band, bucket, headline_id) for headline_id, kind, _, keys in entries for band, bucket in keys]
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar las firmas MinHash en SQLite: {e}", exc_info=True)
+
+def copiar_citas_de_canonicos(pairs):
+    """Copia las citas de los artículos originales a sus casi-duplicados. Recibe tuplas (headline_id, canonical_id)."""
+    if not pairs:
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                """INSERT INTO quotes (headline_id, quote_text, quoted_person)
+                   SELECT ?, quote_text, quoted_person FROM quotes WHERE headline_id = ?""",
+                pairs
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al copiar citas de los artículos originales: {e}", exc_info=True)
+
+def copiar_framing_de_canonicos(pairs):
+    """Copia el encuadre de los titulares originales a sus casi-duplicados. Recibe tuplas (headline_id, canonical_id)."""
+    if not pairs:
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                """UPDATE headlines SET
+                       framing_label = (SELECT framing_label FROM headlines WHERE id = ?),
+                       framing_score = (SELECT framing_score FROM headlines WHERE id = ?)
+                   WHERE id = ?""",
+                [(canonical_id, canonical_id, headline_id) for headline_id, canonical_id in pairs]
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al copiar el encuadre de los titulares originales: {e}", exc_info=True)
+
+def cargar_estados_series(keys):
+    """
+    Devuelve un diccionario {(kind, key): estado} con el estado de las series de eventos pedidas.
+    `keys` es un conjunto de tuplas (kind, key).
+    """
+    conn = get_db_connection()
+    if conn is None or not keys:
+        return {}
+    by_kind = {}
+    for kind, key in keys:
+        by_kind.setdefault(kind, []).append(key)
+    states = {}
+    try:
+        for kind, kind_keys in by_kind.items():
+            for i in range(0, len(kind_keys), 500): # Respetar el límite de parámetros de SQLite
+                chunk = kind_keys[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT * FROM event_series WHERE kind = ? AND key IN ({','.join('?' * len(chunk))})",
+                    [kind] + chunk
+                ).fetchall()
+                states.update({(row['kind'], row['key']): dict(row) for row in rows})
+    except sqlite3.Error as e:
+        logger.error(f"Error al cargar las series de eventos: {e}", exc_info=True)
+    return states
+
+def guardar_estados_series(states):
+    """Guarda (inserta o reemplaza) el estado de las series de eventos."""
+    if not states:
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO event_series (kind, key, bucket, count, mean, var, n)
+                   VALUES (:kind, :key, :bucket, :count, :mean, :var, :n)""",
+                states
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar las series de eventos: {e}", exc_info=True)
+
+def guardar_eventos(events):
+    """Guarda los eventos detectados; si ya existe el evento de esa serie y hora, conserva el pico."""
+    if not events:
+        return
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.executemany(
+                """INSERT INTO events (kind, key, bucket, count, expected, zscore)
+                   VALUES (:kind, :key, :bucket, :count, :expected, :zscore)
+                   ON CONFLICT (kind, key, bucket) DO UPDATE SET
+                       count = excluded.count, expected = excluded.expected, zscore = excluded.zscore
+                   WHERE excluded.count > events.count""",
+                events
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Error al guardar los eventos: {e}", exc_info=True)
+
+def reiniciar_deteccion_eventos():
+    """Borra las series y los eventos (para reconstruirlos desde el historial)."""
+    conn = get_db_connection()
+    if conn is None:
+        return
+    try:
+        with conn:
+            conn.execute("DELETE FROM event_series")
+            conn.execute("DELETE FROM events")
+    except sqlite3.Error as e:
+        logger.error(f"Error al reiniciar la detección de eventos: {e}", exc_info=True)
+
+# --- Agregados de entidades (dashboard) ---
+# Los titulares filtrados se pasan como un único parámetro JSON y se expanden con json_each,
+# así que no hay límite de cantidad de parámetros.
+
+def _ids_json(headline_ids):
+    return json.dumps([int(headline_id) for headline_id in headline_ids])
+
+def _labels_condition(labels):
+    if labels is None:
+        return "", []
+    return f" AND e.label IN ({','.join('?' * len(labels))})", list(labels)
+
+def _consultar_agregado(query, params, descripcion):
+    try:
+        with read_connection() as conn:
+            return [dict(row) for row in conn.execute(query, params).fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error al calcular {descripcion}: {e}", exc_info=True)
+        return []
+
+def contar_entidades(headline_ids, labels=None, limit=None):
+    """Menciones por entidad (texto y tipo) entre los titulares dados, de mayor a menor."""
+    label_condition, label_params = _labels_condition(labels)
+    query = f"""
+        SELECT e.id, e.text, e.label, COUNT(*) AS mentions
+        FROM headline_entities he JOIN entities e ON e.id = he.entity_id
+        WHERE he.headline_id IN (SELECT value FROM json_each(?)){label_condition}
+        GROUP BY e.id ORDER BY mentions DESC, e.text
+    """
+    params = [_ids_json(headline_ids)] + label_params
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return _consultar_agregado(query, params, "los conteos de entidades")
+
+def ids_titulares_con_entidad(text, headline_ids):
+    """IDs de los titulares dados que mencionan una entidad (por su texto, de cualquier tipo)."""
+    query = """
+        SELECT DISTINCT he.headline_id AS id
+        FROM entities e JOIN headline_entities he ON he.entity_id = e.id
+        WHERE e.text = ? AND he.headline_id IN (SELECT value FROM json_each(?))
+    """
+    return [row['id'] for row in _consultar_agregado(query, (text, _ids_json(headline_ids)), "los titulares de una entidad")]
+
+def coocurrencias_entidades(headline_ids, limit=None):
+    """Pares de entidades (por texto) que aparecen en un mismo titular y cuántos titulares comparten."""
+    query = """
+        SELECT a.text AS text_a, MIN(a.label) AS label_a, b.text AS text_b, MIN(b.label) AS label_b,
+               COUNT(DISTINCT x.headline_id) AS weight
+        FROM headline_entities x
+        JOIN headline_entities y ON y.headline_id = x.headline_id AND y.entity_id <> x.entity_id
+        JOIN entities a ON a.id = x.entity_id
+        JOIN entities b ON b.id = y.entity_id
+        WHERE x.headline_id IN (SELECT value FROM json_each(?)) AND a.text < b.text
+        GROUP BY a.text, b.text ORDER BY weight DESC
+    """
+    params = [_ids_json(headline_ids)]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+    return _consultar_agregado(query, params, "las co-ocurrencias de entidades")
+
+def entidades_por_medio(headline_ids, labels=None):
+    """Menciones de cada entidad (por texto) desglosadas por medio, entre los titulares dados."""
+    label_condition, label_params = _labels_condition(labels)
+    query = f"""
+        SELECT h.source, e.text, COUNT(*) AS mentions
+        FROM headline_entities he
+        JOIN entities e ON e.id = he.entity_id
+        JOIN headlines h ON h.id = he.headline_id
+        WHERE he.headline_id IN (SELECT value FROM json_each(?)){label_condition}
+        GROUP BY h.source, e.text
+    """
+    return _consultar_agregado(query, [_ids_json(headline_ids)] + label_params, "las entidades por medio")
+
+def medios_con_entidades_en_comun(headline_ids):
+    """Pares de medios y cuántas entidades distintas (por texto) mencionaron ambos."""
+    query = """
+        WITH source_entities AS (
+            SELECT DISTINCT h.source, e.text
+            FROM headline_entities he
+            JOIN entities e ON e.id = he.entity_id
+            JOIN headlines h ON h.id = he.headline_id
+            WHERE he.headline_id IN (SELECT value FROM json_each(?))
+        )
+        SELECT a.source AS source_a, b.source AS source_b, COUNT(*) AS shared_entities
+        FROM source_entities a JOIN source_entities b ON a.text = b.text AND a.source < b.source
+        GROUP BY a.source, b.source
+    """
+    return _consultar_agregado(query, [_ids_json(headline_ids)], "las entidades en común entre medios")
+
+# --- Estadísticas desde los rollups (dashboard y /api/stats) ---
+# Leen headline_rollup: el costo depende de la cantidad de buckets del rango, no de la de titulares.
+
+def _rollup_where(sources=None, topics=None, date_from=None, date_to=None):
+    """Condiciones sobre headline_rollup para los filtros de medio, tópico y rango de fechas (inclusivo)."""
+    conditions, params = [], []
+    if sources:
+        conditions.append("source IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(sources)))
+    if topics:
+        conditions.append("topic IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(topics)))
+    if date_from is not None:
+        conditions.append("bucket >= ?")
+        params.append(str(date_from))
+    if date_to is not None:
+        conditions.append("bucket < date(?, '+1 day')")
+        params.append(str(date_to))
+    return " AND ".join(conditions) or "1", params
+
+def contar_rollup(by=(), granularity=None, sources=None, topics=None, date_from=None, date_to=None):
+    """
+    Cantidad de titulares agrupada por las dimensiones `by` (ver ROLLUP_DIMENSIONS) y, con `granularity`
+    'day' u 'hour', por período ('bucket'). Los titulares sin valor en una dimensión agrupada no se cuentan.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    if not set(by) <= set(ROLLUP_DIMENSIONS):
+        raise ValueError(f"Dimensiones no válidas: {sorted(set(by) - set(ROLLUP_DIMENSIONS))}")
+    if granularity not in (None, 'day', 'hour'):
+        raise ValueError(f"Granularidad no válida: {granularity}")
+    where, params = _rollup_where(sources, topics, date_from, date_to)
+    period = {'day': "substr(bucket, 1, 10)", 'hour': "bucket"}.get(granularity)
+    groups = ([period] if period else []) + by
+    columns = ([f"{period} AS bucket"] if period else []) + by
+    not_empty = "".join(f" AND {column} <> ''" for column in by)
+    query = f"""
+        SELECT {', '.join(columns + ['SUM(count) AS count'])} FROM headline_rollup
+        WHERE {where}{not_empty}
+        {'GROUP BY ' + ', '.join(groups) if groups else ''}
+        ORDER BY {'1' if granularity else 'count DESC'}
+    """
+    return _consultar_agregado(query, params, "los conteos de los rollups")
+
+def resumen_rollup(sources=None, topics=None, date_from=None, date_to=None):
+    """Cantidad de titulares, medios y tópicos que cumplen los filtros."""
+    where, params = _rollup_where(sources, topics, date_from, date_to)
+    query = f"""
+        SELECT COALESCE(SUM(count), 0) AS headlines, COUNT(DISTINCT source) AS sources, COUNT(DISTINCT NULLIF(topic, '')) AS topics
+        FROM headline_rollup WHERE {where}
+    """
+    rows = _consultar_agregado(query, params, "el resumen de los rollups")
+    return rows[0] if rows else {'headlines': 0, 'sources': 0, 'topics': 0}
+
+def indice_objetividad(sources=None, topics=None, date_from=None, date_to=None):
+    """Por medio: porcentaje de titulares objetivos entre los analizados por subjetividad ('analyzed')."""
+    where, params = _rollup_where(sources, topics, date_from, date_to)
+    query = f"""
+        SELECT source, 100.0 * SUM(CASE WHEN subjectivity_label = ? THEN count ELSE 0 END) / SUM(count) AS objectivity,
+               SUM(count) AS analyzed
+        FROM headline_rollup WHERE {where} AND subjectivity_label <> ''
+        GROUP BY source ORDER BY objectivity
+    """
+    return _consultar_agregado(query, [SUBJECTIVITY_LABELS[0]] + list(params), "el índice de objetividad")
+
+def reconstruir_rollups():
+    """
+    Recalcula headline_rollup desde todo el historial de titulares. Los meses archivados conservan
+    los conteos que tenían al archivarse. Devuelve la cantidad de buckets.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        return 0
+    try:
+        with conn:
+            archived = [row[0] for row in conn.execute("SELECT month FROM archived_months")]
+            buckets = _rellenar_rollups(conn, keep_months=archived)
+        marcar_datos_modificados()
+        logger.info(f"Rollups reconstruidos: {buckets} buckets.")
+        return buckets
+    except sqlite3.Error as e:
+        logger.error(f"Error al reconstruir los rollups: {e}", exc_info=True)
+        return 0
+
+# --- Búsqueda de texto completo (FTS5) ---
+# Pesos BM25 por columna: headline, summary, full_text, quotes
+FTS_WEIGHTS = (10.0, 4.0, 1.0, 2.0)
+
+def fts_query(text):
+    """
+    Convierte el texto de búsqueda de un usuario en una consulta FTS5 segura: cada palabra entre comillas
+    (así los operadores y signos no rompen la sintaxis) y como prefijo ("elecc" encuentra "elecciones").
+    Todas las palabras deben aparecer. Devuelve None si no hay palabras.
+    """
+    words = re.findall(r"\w+", text or "")
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+def buscar_titulares(text, limit=50, order_by="relevance"):
+    """
+    Busca titulares por texto en el titular, el resumen, el cuerpo y las citas.
+    Devuelve los titulares ordenados por relevancia (BM25) o por fecha, con un fragmento ('snippet')
+    donde las coincidencias están marcadas con <mark>.
+    """
+    match = fts_query(text)
+    if match is None:
+        return []
+    order = "rank" if order_by == "relevance" else "h.collection_date DESC"
+    query = f"""
+        SELECT h.*, bm25(headlines_fts, {', '.join(map(str, FTS_WEIGHTS))}) AS rank,
+               snippet(headlines_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM headlines_fts JOIN headlines h ON h.id = headlines_fts.rowid
+        WHERE headlines_fts MATCH ?
+        ORDER BY {order} LIMIT ?
+    """
+    try:
+        with read_connection() as conn:
+            return [dict(row) for row in conn.execute(query, (match, int(limit))).fetchall()]
+    except sqlite3.Error as e:
+        logger.error(f"Error en la búsqueda de texto completo: {e}", exc_info=True)
+        return []
+
+def ids_titulares_por_texto(text):
+    """IDs de todos los titulares que coinciden con la búsqueda (para los filtros del dashboard)."""
+    match = fts_query(text)
+    if match is None:
+        return set()
+    try:
+        with read_connection() as conn:
+            return {row[0] for row in conn.execute("SELECT rowid FROM headlines_fts WHERE headlines_fts MATCH ?", (match,))}
+    except sqlite3.Error as e:
+        logger.error(f"Error en la búsqueda de texto completo: {e}", exc_info=True)
+        return set()
+
+# --- Exportaciones ---
+# Columnas de las citas exportadas: las de quotes más algunas del titular del que se extrajeron.
+QUOTE_EXPORT_COLUMNS = {
+    'id': 'q.id', 'headline_id': 'q.headline_id', 'quote_text': 'q.quote_text', 'quoted_person': 'q.quoted_person',
+    'source': 'h.source', 'headline': 'h.headline', 'url': 'h.url', 'collection_date': 'h.collection_date',
+}
+EXPORT_BATCH_SIZE = 1000
+
+def consulta_exportacion(kind, fields=None, sources=None, topics=None, date_from=None, date_to=None, keyword=None):
+    """
+    Arma la consulta de una exportación de titulares (`kind`='headlines') o citas ('quotes'): solo las
+    columnas `fields` (todas si es None) y las filas que cumplen los filtros de medio, tópico, rango de
+    fechas de recolección (inclusivo) y búsqueda de texto completo. Devuelve (columnas, consulta, parámetros).
+    Lanza ValueError si el tipo o alguna columna no son válidos.
+    """
+    if kind == 'headlines':
+        with read_connection() as conn:
+            available = {row['name']: f"h.{row['name']}" for row in conn.execute("PRAGMA table_info(headlines)")}
+        source_sql = "headlines h"
+        order = "h.collection_date, h.id"
+    elif kind == 'quotes':
+        available = QUOTE_EXPORT_COLUMNS
+        source_sql = "quotes q JOIN headlines h ON h.id = q.headline_id"
+        order = "q.id"
+    else:
+        raise ValueError(f"Exportación no válida: {kind}")
+    columns = list(fields) if fields else list(available)
+    unknown = [column for column in columns if column not in available]
+    if unknown:
+        raise ValueError(f"Columnas no válidas: {unknown}. Disponibles: {', '.join(available)}")
+
+    conditions, params = [], []
+    if sources:
+        conditions.append("h.source IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(sources)))
+    if topics:
+        conditions.append("h.topic IN (SELECT value FROM json_each(?))")
+        params.append(json.dumps(list(topics)))
+    if date_from is not None:
+        conditions.append("h.collection_date >= ?")
+        params.append(str(date_from))
+    if date_to is not None:
+        conditions.append("h.collection_date < date(?, '+1 day')")
+        params.append(str(date_to))
+    if keyword:
+        match = fts_query(keyword)
+        if match is None:
+            conditions.append("0")
+        else:
+            conditions.append("h.id IN (SELECT rowid FROM headlines_fts WHERE headlines_fts MATCH ?)")
+            params.append(match)
+    query = f"""
+        SELECT {', '.join(available[column] for column in columns)} FROM {source_sql}
+        WHERE {' AND '.join(conditions) or '1'}
+        ORDER BY {order}
+    """
+    return columns, query, params
+
+def iterar_filas(query, params=(), batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generador que recorre el resultado de una consulta en lotes de `batch_size` filas (tuplas), con
+    memoria constante sin importar el tamaño del resultado. Usa su propia conexión de solo lectura y no
+    una del pool: una exportación larga (o un cliente lento) no deja a la API sin conexiones.
+    """
+    conn = connect(read_only=True)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [tuple(row) for row in rows]
+    finally:
+        conn.close()
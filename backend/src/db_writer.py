@@ -0,0 +1,184 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+import db
+from logger import logger
+
+_STOP = object()
+
+class DBWriter:
+    """
+    Escritor único de la base de datos: un hilo dedicado, alimentado por una cola, que agrupa las
+    escrituras de muchos hilos en pocas transacciones.
+
+    Cada escritura es una función `fn(conn, *args, **kwargs)` (por ejemplo `db.insertar_titular`) que
+    se encola junto con un Future. El hilo escritor toma las escrituras encoladas (hasta `max_batch` o
+    `max_wait_ms`), las ejecuta en una sola transacción y resuelve los Futures recién después del
+    COMMIT, así que el valor devuelto (p. ej. el ID del titular) ya es durable.
+
+    Cada escritura corre dentro de su propio SAVEPOINT: si falla, se deshace solo esa escritura y su
+    Future recibe la excepción; el resto del lote se confirma igual.
+
+    `close()` procesa todo lo que queda en la cola, confirma el último lote y cierra la conexión.
+    """
+
+    def __init__(self, db_file=None, max_batch=500, max_wait_ms=20, max_queue_size=10000):
+        self.db_file = db_file or db.DB_FILE
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._metrics = {"writes": 0, "errors": 0, "batches": 0, "commit_ms": 0.0}
+        # La conexión de escritura de la ingesta (WAL, ver db.connect). isolation_level=None: las
+        # transacciones (BEGIN/COMMIT/SAVEPOINT) se manejan explícitamente
+        self._conn = db.connect(self.db_file, isolation_level=None)
+        self._thread = threading.Thread(target=self._run, name="db_writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args, **kwargs):
+        """Encola una escritura y devuelve un Future con su resultado (disponible después del COMMIT)."""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("El escritor de la base de datos ya está cerrado.")
+            self._queue.put((fn, args, kwargs, future))
+        return future
+
+    def write(self, fn, *args, **kwargs):
+        """Encola una escritura y espera su resultado."""
+        return self.submit(fn, *args, **kwargs).result()
+
+    def _collect_batch(self):
+        """
+        Espera la primera escritura y junta las que ya estén encoladas, hasta `max_batch` escrituras o
+        `max_wait_ms` desde la primera (group commit). No se espera a que lleguen más: los hilos que
+        necesitan el ID de su titular están bloqueados hasta el COMMIT, así que esperar solo agrega
+        latencia; con carga sostenida las escrituras se acumulan en la cola mientras se confirma el lote anterior.
+        """
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch and time.monotonic() < deadline:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _write_batch(self, batch):
+        results = [] # tuplas (future, resultado, excepción)
+        start = time.perf_counter()
+        try:
+            self._conn.execute("BEGIN IMMEDIATE")
+            for fn, args, kwargs, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self._conn.execute("SAVEPOINT op")
+                try:
+                    results.append((future, fn(self._conn, *args, **kwargs), None))
+                    self._conn.execute("RELEASE op")
+                except Exception as e:
+                    self._conn.execute("ROLLBACK TO op")
+                    self._conn.execute("RELEASE op")
+                    results.append((future, None, e))
+            self._conn.execute("COMMIT")
+            if any(error is None for _, _, error in results):
+                db.marcar_datos_modificados(self.db_file)
+        except sqlite3.Error as e:
+            # Falló la transacción completa (p. ej. disco lleno o base bloqueada): ninguna escritura es durable
+            logger.error(f"Error al confirmar un lote de escrituras en SQLite: {e}", exc_info=True)
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            results = [(future, None, e) for _, _, _, future in batch if future.running()]
+
+        self._metrics["batches"] += 1
+        self._metrics["commit_ms"] += (time.perf_counter() - start) * 1000
+        for future, result, error in results:
+            self._metrics["writes"] += 1
+            if error is not None:
+                self._metrics["errors"] += 1
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect_batch()
+            if batch:
+                self._write_batch(batch)
+
+    def close(self):
+        """Procesa las escrituras pendientes, confirma el último lote y cierra la conexión."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+        self._conn.close()
+        if self._metrics["batches"]:
+            logger.info(f"Escritor de la DB cerrado: {self._metrics['writes']} escrituras en {self._metrics['batches']} transacciones "
+                        f"({self._metrics['errors']} con error).")
+
+    def get_metrics(self):
+        metrics = dict(self._metrics)
+        metrics["avg_batch_size"] = metrics["writes"] / metrics["batches"] if metrics["batches"] else 0.0
+        return metrics
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+# --- Bloque de prueba: rendimiento de inserción ---
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import concurrent.futures
+
+    N_HEADLINES, N_THREADS = 5000, 10
+    QUOTES = [{'text': 'Una cita de prueba', 'person': 'Alguien'}, {'text': 'Otra cita', 'person': 'Otra persona'}]
+
+    def headline_args(i):
+        return ("Fuente", f"Titular sintético número {i}", f"http://example.com/{i}",
+                {'label': 'NEU', 'score': 0.9}, [{'text': 'Milei', 'label': 'PER'}], "POLÍTICA",
+                "Resumen", "Cuerpo del artículo " * 200)
+
+    def current_path(i):
+        # El camino anterior: una transacción para el titular, otra para sus citas y cerrar la conexión
+        headline_id, _ = db.guardar_titular_en_db(*headline_args(i))
+        db.guardar_citas_en_db(headline_id, QUOTES)
+        db.close_db_connection()
+
+    def writer_path(writer, i):
+        headline_id, _ = writer.write(db.insertar_titular, *headline_args(i))
+        writer.submit(db.insertar_citas, headline_id, QUOTES)
+
+    print(f"🚀 Benchmark de inserción: {N_HEADLINES} titulares con {len(QUOTES)} citas cada uno, {N_THREADS} hilos")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in ("actual (commit por fila)", "DBWriter (lotes)"):
+            db.DB_FILE = os.path.join(tmp_dir, f"{name.split()[0]}.db")
+            db.create_table()
+            db.close_db_connection()
+            start = time.perf_counter()
+            if name.startswith("DBWriter"):
+                with DBWriter() as writer, concurrent.futures.ThreadPoolExecutor(N_THREADS) as executor:
+                    list(executor.map(lambda i: writer_path(writer, i), range(N_HEADLINES)))
+                metrics = writer.get_metrics()
+                extra = f" | {metrics['batches']} transacciones, {metrics['avg_batch_size']:.1f} escrituras por lote"
+            else:
+                with concurrent.futures.ThreadPoolExecutor(N_THREADS) as executor:
+                    list(executor.map(current_path, range(N_HEADLINES)))
+                extra = ""
+            elapsed = time.perf_counter() - start
+            print(f"{name:<26}: {elapsed:6.2f} s | {N_HEADLINES / elapsed:8,.0f} titulares/s{extra}")
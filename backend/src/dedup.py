@@ -0,0 +1,142 @@
+import re
+import hashlib
+import unicodedata
+import numpy as np
+from db import buscar_candidatos_lsh, guardar_firmas_minhash
+from logger import logger
+
+NUM_PERM = 128
+BANDS = 16 # 16 bandas de 8 filas: un par con similitud 0.8 es candidato con probabilidad ~95%
+ROWS_PER_BAND = NUM_PERM // BANDS
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+BODY_SHINGLE_WORDS = 3
+HEADLINE_SHINGLE_CHARS = 4
+
+# Permutaciones fijas: las firmas guardadas en la DB solo son comparables si se usan siempre las mismas
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, int(MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, int(MERSENNE_PRIME), size=NUM_PERM, dtype=np.uint64)
+
+def normalize_text(text):
+    """Pasa a minúsculas, elimina tildes y signos de puntuación, y colapsa los espacios."""
+    text = unicodedata.normalize('NFKD', text.lower())
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', text))
+
+def body_shingles(text, k=BODY_SHINGLE_WORDS):
+    """Shingles de `k` palabras del cuerpo del artículo."""
+    words = normalize_text(text).split()
+    if len(words) <= k:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+def headline_shingles(text, k=HEADLINE_SHINGLE_CHARS):
+    """Shingles de `k` caracteres del titular (los titulares son demasiado cortos para shingles de palabras)."""
+    text = normalize_text(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+def minhash_signature(shingles):
+    """Calcula la firma MinHash (NUM_PERM valores de 32 bits) de un conjunto de shingles."""
+    if not shingles:
+        return None
+    hashes = np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=4).digest(), 'little') for s in shingles],
+        dtype=np.uint64
+    )
+    # (a * x + b) mod p, truncado a 32 bits; el desbordamiento de uint64 es intencional (como en datasketch)
+    with np.errstate(over='ignore'):
+        permuted = ((hashes[:, None] * _PERM_A + _PERM_B) % MERSENNE_PRIME) & MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+def band_keys(signature):
+    """Devuelve la clave de bucket (entero de 64 bits con signo) de cada banda de la firma."""
+    keys = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes()
+        keys.append((band, int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), 'little', signed=True)))
+    return keys
+
+def estimated_similarity(signature_a, signature_b):
+    """Similitud de Jaccard estimada a partir de dos firmas MinHash."""
+    return float(np.mean(signature_a == signature_b))
+
+class NearDuplicateDetector:
+    """
+    Detector de casi-duplicados (copias de agencias, reescrituras leves) con MinHash LSH.
+
+    Mantiene dos índices: uno de cuerpos de artículos (shingles de palabras) y otro de titulares
+    (shingles de caracteres). Los buckets LSH y las firmas se guardan en la DB, así que el índice
+    persiste entre corridas. Dentro de una corrida, los artículos aún no guardados también se indexan
+    en memoria para detectar las copias que llegan en el mismo lote.
+    """
+
+    def __init__(self, body_threshold=0.8, headline_threshold=0.85):
+        self.thresholds = {"body": body_threshold, "headline": headline_threshold}
+        self._pending = {"body": {}, "headline": {}} # kind -> {(band, key): [(ref, firma)]}
+
+    def _find(self, kind, signature):
+        """Devuelve (referencia, similitud) del mejor candidato por encima del umbral, o (None, 0.0)."""
+        if signature is None:
+            return None, 0.0
+        keys = band_keys(signature)
+        candidates = {}
+        for headline_id, blob in buscar_candidatos_lsh(kind, keys):
+            candidates[("db", headline_id)] = np.frombuffer(blob, dtype=np.uint32)
+        for key in keys:
+            for ref, candidate_signature in self._pending[kind].get(key, []):
+                candidates[ref] = candidate_signature
+
+        best, best_similarity = None, 0.0
+        for ref, candidate_signature in candidates.items():
+            similarity = estimated_similarity(signature, candidate_signature)
+            if similarity >= self.thresholds[kind] and similarity > best_similarity:
+                best, best_similarity = ref, similarity
+        return best, best_similarity
+
+    def _add_pending(self, kind, ref, signature):
+        for key in band_keys(signature):
+            self._pending[kind].setdefault(key, []).append((ref, signature))
+
+    def check(self, items):
+        """
+        Busca casi-duplicados para una lista de (titular, cuerpo).
+        Devuelve, para cada elemento, un diccionario con:
+          - "body_match" / "headline_match": referencia al artículo original, ("db", headline_id) si ya
+            está en la DB o ("batch", índice) si es un elemento anterior del mismo lote; None si no hay.
+          - "signatures": las firmas calculadas, para registrarlas con `register` una vez guardado el artículo.
+        """
+        results = []
+        duplicates = 0
+        for i, (headline, body) in enumerate(items):
+            signatures = {
+                "headline": minhash_signature(headline_shingles(headline)) if headline else None,
+                "body": minhash_signature(body_shingles(body)) if body else None,
+            }
+            result = {"signatures": signatures}
+            for kind in ("body", "headline"):
+                match, _ = self._find(kind, signatures[kind])
+                result[f"{kind}_match"] = match
+                # Solo los originales se indexan: las copias ya quedan representadas por su original
+                if match is None and signatures[kind] is not None:
+                    self._add_pending(kind, ("batch", i), signatures[kind])
+            duplicates += result["body_match"] is not None or result["headline_match"] is not None
+            results.append(result)
+        logger.info(f"Detección de casi-duplicados: {duplicates} de {len(items)} artículos son copias de otros.")
+        return results
+
+    def register(self, entries):
+        """
+        Persiste en la DB las firmas de los artículos originales ya guardados.
+        `entries` es una lista de (headline_id, resultado de `check`).
+        """
+        rows = []
+        for headline_id, result in entries:
+            for kind in ("body", "headline"):
+                signature = result["signatures"][kind]
+                if signature is not None and result[f"{kind}_match"] is None:
+                    rows.append((headline_id, kind, signature.tobytes(), band_keys(signature)))
+        guardar_firmas_minhash(rows)
+        self._pending = {"body": {}, "headline": {}}
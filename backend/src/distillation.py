@@ -0,0 +1,205 @@
+import os
+import math
+import time
+import threading
+import joblib
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import accuracy_score, classification_report
+from db import get_db_connection
+from embedding_store import EmbeddingStore, EMBEDDING_MODEL
+from logger import logger
+
+# Construir rutas relativas al archivo actual para mayor portabilidad
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Apunta a la carpeta 'backend'
+DISTILLED_MODELS_DIR = os.path.join(BASE_DIR, 'models')
+DEFAULT_EMBEDDING_MODEL = EMBEDDING_MODEL
+
+# Tareas que se pueden destilar: columna de la tabla 'headlines' que actúa como etiqueta del "profesor" zero-shot
+DISTILLATION_TASKS = {
+    "topic": "topic",
+    "subjectivity": "subjectivity_label",
+}
+
+def model_path(task):
+    """Ruta del archivo donde se guarda el clasificador destilado de una tarea."""
+    return os.path.join(DISTILLED_MODELS_DIR, f"distilled_{task}.joblib")
+
+def load_training_data(task, min_samples_per_label=5):
+    """
+    Carga los titulares y las etiquetas zero-shot guardadas para una tarea.
+    Descarta las etiquetas con menos de `min_samples_per_label` ejemplos (y nunca deja una con uno solo,
+    que haría fallar la división estratificada en entrenamiento y prueba).
+    """
+    column = DISTILLATION_TASKS[task]
+    conn = get_db_connection()
+    if conn is None:
+        return [], [], []
+
+    rows = conn.execute(f"SELECT id, headline, {column} AS label FROM headlines WHERE {column} IS NOT NULL").fetchall()
+    counts = {}
+    for row in rows:
+        counts[row['label']] = counts.get(row['label'], 0) + 1
+
+    min_samples_per_label = max(min_samples_per_label, 2)
+    rare = sorted(label for label, n in counts.items() if n < min_samples_per_label)
+    if rare:
+        logger.warning(f"Se descartan etiquetas con menos de {min_samples_per_label} ejemplos para la tarea '{task}': {', '.join(rare)}")
+    rows = [row for row in rows if counts[row['label']] >= min_samples_per_label]
+    return [row['id'] for row in rows], [row['headline'] for row in rows], [row['label'] for row in rows]
+
+def _training_embeddings(encoder, embedding_model, headline_ids, texts, batch_size):
+    """
+    Obtiene los embeddings de entrenamiento. Si el modelo es el del EmbeddingStore, reutiliza los
+    vectores ya guardados y solo codifica los titulares que faltan.
+    """
+    if embedding_model != EMBEDDING_MODEL:
+        return encoder.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=True)
+
+    stored = EmbeddingStore().get(headline_ids)
+    missing = [i for i, headline_id in enumerate(headline_ids) if headline_id not in stored]
+    logger.info(f"Embeddings reutilizados del almacén: {len(stored)}; a calcular: {len(missing)}.")
+    embeddings = np.zeros((len(texts), encoder.get_sentence_embedding_dimension()), dtype=np.float32)
+    for i, headline_id in enumerate(headline_ids):
+        if headline_id in stored:
+            embeddings[i] = stored[headline_id]
+    if missing:
+        embeddings[missing] = encoder.encode([texts[i] for i in missing], batch_size=batch_size, normalize_embeddings=True, show_progress_bar=True)
+    return embeddings
+
+def measure_teacher_throughput(task, texts):
+    """Mide cuántos titulares por segundo procesa el clasificador zero-shot (el "profesor")."""
+    from analysis import analyzer # Importación diferida: carga todos los modelos de NLP
+    teacher = analyzer.classify_topic if task == "topic" else analyzer.analyze_subjectivity
+    start = time.perf_counter()
+    for text in texts:
+        teacher(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) / elapsed if elapsed > 0 else float('inf')
+
+def train_distilled_classifier(task, embedding_model=DEFAULT_EMBEDDING_MODEL, test_size=0.2, batch_size=64, teacher_sample=0):
+    """
+    Entrena un clasificador compacto (embeddings de oraciones + cabeza lineal) a partir de las
+    etiquetas zero-shot guardadas en la DB y lo guarda en disco.
+    Devuelve un reporte con la concordancia con el modelo zero-shot ("profesor") sobre un conjunto de prueba.
+    """
+    headline_ids, texts, labels = load_training_data(task)
+    if len(set(labels)) < 2:
+        logger.warning(f"No hay suficientes etiquetas para destilar la tarea '{task}'.")
+        return None
+
+    logger.info(f"Destilando clasificador '{task}' a partir de {len(texts)} titulares etiquetados...")
+    encoder = SentenceTransformer(embedding_model)
+    embeddings = _training_embeddings(encoder, embedding_model, headline_ids, texts, batch_size)
+
+    # Con pocos titulares el conjunto de prueba (o el de entrenamiento) puede tener menos filas que etiquetas,
+    # y entonces no se puede estratificar
+    n_test = math.ceil(test_size * len(labels))
+    stratify = labels if min(n_test, len(labels) - n_test) >= len(set(labels)) else None
+    X_train, X_test, y_train, y_test, _, texts_test = train_test_split(
+        embeddings, labels, texts, test_size=test_size, stratify=stratify, random_state=42
+    )
+    classifier = LogisticRegression(max_iter=1000, class_weight='balanced')
+    classifier.fit(X_train, y_train)
+
+    # Concordancia con el profesor sobre el conjunto de prueba
+    predictions = classifier.predict(X_test)
+    agreement = accuracy_score(y_test, predictions)
+
+    # Throughput de extremo a extremo (embedding + cabeza lineal) sobre los textos de prueba
+    start = time.perf_counter()
+    classifier.predict(encoder.encode(texts_test, batch_size=batch_size, normalize_embeddings=True))
+    elapsed = time.perf_counter() - start
+    throughput = len(texts_test) / elapsed if elapsed > 0 else float('inf')
+
+    # Opcionalmente, comparar contra el throughput del profesor sobre una muestra pequeña
+    teacher_throughput = measure_teacher_throughput(task, texts_test[:teacher_sample]) if teacher_sample else None
+
+    os.makedirs(DISTILLED_MODELS_DIR, exist_ok=True)
+    joblib.dump({
+        "task": task,
+        "embedding_model": embedding_model,
+        "classifier": classifier,
+        "agreement": agreement,
+        "n_samples": len(texts),
+        "trained_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+    }, model_path(task))
+
+    report = {
+        "task": task,
+        "n_samples": len(texts),
+        "n_labels": len(classifier.classes_),
+        "agreement": agreement,
+        "throughput": throughput,
+        "teacher_throughput": teacher_throughput,
+        "classification_report": classification_report(y_test, predictions, zero_division=0),
+    }
+    logger.info(f"Clasificador '{task}' destilado: concordancia {agreement:.1%}, {throughput:.0f} titulares/s.")
+    return report
+
+class DistilledClassifier:
+    """Clasificador destilado cargado desde disco, usable en lugar del zero-shot."""
+
+    def __init__(self, task):
+        data = joblib.load(model_path(task))
+        self.task = task
+        self.classifier = data['classifier']
+        self.agreement = data.get('agreement')
+        self.encoder = SentenceTransformer(data['embedding_model'])
+
+    def predict(self, texts, batch_size=64):
+        """Devuelve una lista de {"label", "score"} para cada texto."""
+        if not texts:
+            return []
+        embeddings = self.encoder.encode(list(texts), batch_size=batch_size, normalize_embeddings=True)
+        probabilities = self.classifier.predict_proba(embeddings)
+        best = probabilities.argmax(axis=1)
+        return [
+            {"label": self.classifier.classes_[i], "score": float(probabilities[row, i])}
+            for row, i in enumerate(best)
+        ]
+
+_distilled_classifiers = {}
+_distilled_lock = threading.Lock()
+
+def get_distilled_classifier(task):
+    """Devuelve el clasificador destilado de una tarea (cargado una sola vez), o None si no existe."""
+    with _distilled_lock:
+        if task not in _distilled_classifiers:
+            classifier = None
+            if os.path.exists(model_path(task)):
+                try:
+                    classifier = DistilledClassifier(task)
+                    logger.info(f"Clasificador destilado '{task}' cargado.")
+                except Exception:
+                    logger.error(f"Error al cargar el clasificador destilado '{task}'.", exc_info=True)
+            else:
+                logger.warning(f"No existe un clasificador destilado para '{task}'. Ejecute: python main.py distill {task}")
+            _distilled_classifiers[task] = classifier
+        return _distilled_classifiers[task]
+
+def uses_distilled(config, task):
+    """True si "classifiers" de config.json elige el clasificador destilado para la tarea."""
+    return config.get("classifiers", {}).get(task) == "distilled"
+
+def classify_batch(model, task, texts, batch_size=16):
+    """
+    Clasifica un lote de textos para `task` ("topic" o "subjectivity") con el clasificador que elige
+    "classifiers" en config.json: el destilado si existe y, si no, el zero-shot de `model` (un NewsAnalyzer).
+    Para "topic" devuelve etiquetas; para "subjectivity", diccionarios {"label", "score"}.
+    """
+    if not texts:
+        return []
+    if uses_distilled(model.config, task):
+        distilled = get_distilled_classifier(task)
+        if distilled:
+            try:
+                predictions = distilled.predict(texts, batch_size=batch_size)
+                return [p['label'] for p in predictions] if task == "topic" else predictions
+            except Exception:
+                logger.error(f"Error en la clasificación destilada '{task}' para un lote de {len(texts)} textos.", exc_info=True)
+    if task == "topic":
+        return model.classify_topic_batch(texts, batch_size=batch_size)
+    return model.analyze_subjectivity_batch(texts, batch_size=batch_size)
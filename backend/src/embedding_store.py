@@ -0,0 +1,283 @@
+import os
+import json
+import threading
+import numpy as np
+from filelock import FileLock
+from logger import logger
+
+# Construir rutas relativas al archivo actual para mayor portabilidad
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_ROOT = os.path.dirname(SRC_DIR) # Apunta a la carpeta 'backend'
+EMBEDDINGS_DIR = os.path.join(BACKEND_ROOT, 'data', 'embeddings')
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+EMBEDDING_DIM = 384
+
+class EmbeddingStore:
+    """
+    Almacén persistente de embeddings de titulares, indexado por headlines.id.
+
+    Los vectores se guardan normalizados en float16 en un archivo binario de solo-agregado
+    (vectors.f16) y los IDs en otro paralelo (ids.i64). meta.json registra cuántas filas son válidas
+    y en qué generación de archivos están: se actualiza después de escribir los datos, así que un lector
+    nunca ve filas a medio escribir. compact() escribe una generación nueva (vectors.<gen>.f16,
+    ids.<gen>.i64) y la activa reescribiendo solo meta.json, de modo que una caída a mitad de camino
+    deja el almacén en la generación anterior.
+    Los archivos se abren con np.memmap, por lo que leer vectores no copia el archivo a memoria.
+    Si un ID se agrega más de una vez, gana la última versión (compact() elimina las anteriores).
+    """
+
+    def __init__(self, directory=EMBEDDINGS_DIR, dim=EMBEDDING_DIM):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.dim = dim
+        self._lock = threading.Lock()
+        # Bloqueo entre procesos: append() y compact() de procesos distintos no se pisan
+        self._file_lock = FileLock(os.path.join(directory, 'store.lock'))
+        self._cache = None # (generation, count, ids_memmap, vectors_memmap, sorted_ids, sorted_rows)
+        os.makedirs(directory, exist_ok=True)
+        meta = self._read_meta()
+        if meta and meta.get('dim') != dim:
+            raise ValueError(f"El almacén de embeddings tiene dimensión {meta.get('dim')}, se esperaba {dim}.")
+
+    def _read_meta(self):
+        try:
+            with open(self.meta_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _state(self):
+        """Devuelve (generación, filas válidas) según meta.json."""
+        meta = self._read_meta()
+        return (meta.get('generation', 0), meta['count']) if meta else (0, 0)
+
+    def _paths(self, generation):
+        """Rutas de los archivos de vectores e IDs de una generación (la 0 conserva los nombres originales)."""
+        suffix = f".{generation}" if generation else ""
+        return (os.path.join(self.directory, f'vectors{suffix}.f16'), os.path.join(self.directory, f'ids{suffix}.i64'))
+
+    @property
+    def vectors_path(self):
+        return self._paths(self._state()[0])[0]
+
+    @property
+    def ids_path(self):
+        return self._paths(self._state()[0])[1]
+
+    def _write_meta(self, count, generation):
+        tmp_path = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({"dim": self.dim, "count": count, "generation": generation, "dtype": "float16", "model": EMBEDDING_MODEL}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.meta_path) # Reemplazo atómico
+
+    def __len__(self):
+        return self._state()[1]
+
+    def append(self, headline_ids, vectors):
+        """Agrega vectores al final del almacén. Los vectores se normalizan y se guardan en float16."""
+        if len(headline_ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(headline_ids), self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.where(norms > 0, norms, 1)).astype(np.float16)
+        ids = np.asarray(headline_ids, dtype=np.int64)
+
+        with self._lock, self._file_lock:
+            generation, count = self._state()
+            vectors_path, ids_path = self._paths(generation)
+            # Descartar bytes de una escritura interrumpida que meta.json no llegó a registrar
+            for path, row_bytes in ((vectors_path, self.dim * 2), (ids_path, 8)):
+                with open(path, 'ab') as f:
+                    f.truncate(count * row_bytes)
+            for path, data in ((vectors_path, vectors), (ids_path, ids)):
+                with open(path, 'ab') as f:
+                    f.write(data.tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._write_meta(count + len(ids), generation)
+            self._cache = None
+
+    def _load(self):
+        """Abre (o reutiliza) los memmaps y el índice ordenado de IDs -> fila."""
+        generation, count = self._state()
+        if self._cache is not None and self._cache[:2] == (generation, count):
+            return self._cache[1:]
+        if count == 0:
+            ids = np.zeros(0, dtype=np.int64)
+            vectors = np.zeros((0, self.dim), dtype=np.float16)
+        else:
+            vectors_path, ids_path = self._paths(generation)
+            try:
+                ids = np.memmap(ids_path, dtype=np.int64, mode='r', shape=(count,))
+                vectors = np.memmap(vectors_path, dtype=np.float16, mode='r', shape=(count, self.dim))
+            except FileNotFoundError:
+                # Una compactación activó otra generación (y borró esta) entre la lectura de meta.json y la apertura
+                self._cache = None
+                return self._load()
+        # Última aparición de cada ID: se busca sobre el arreglo invertido
+        unique_ids, reversed_rows = np.unique(ids[::-1], return_index=True)
+        sorted_rows = count - 1 - reversed_rows
+        self._cache = (generation, count, ids, vectors, unique_ids, sorted_rows)
+        return self._cache[1:]
+
+    def vectors(self):
+        """Devuelve (ids, vectores) como memmaps de solo lectura, sin copiar los datos."""
+        _, ids, vectors, _, _ = self._load()
+        return ids, vectors
+
+    def rows_for(self, headline_ids):
+        """Devuelve las filas de los IDs pedidos (-1 para los que no están en el almacén)."""
+        _, _, _, unique_ids, sorted_rows = self._load()
+        headline_ids = np.asarray(headline_ids, dtype=np.int64)
+        rows = np.full(len(headline_ids), -1, dtype=np.int64)
+        if len(unique_ids) == 0:
+            return rows
+        positions = np.minimum(np.searchsorted(unique_ids, headline_ids), len(unique_ids) - 1)
+        found = unique_ids[positions] == headline_ids
+        rows[found] = sorted_rows[positions[found]]
+        return rows
+
+    def get(self, headline_ids):
+        """
+        Devuelve un diccionario {headline_id: vector float32} con los IDs que están en el almacén.
+        Solo se copian las filas pedidas.
+        """
+        _, _, vectors, _, _ = self._load()
+        rows = self.rows_for(headline_ids)
+        return {int(hid): np.array(vectors[row], dtype=np.float32) for hid, row in zip(headline_ids, rows) if row >= 0}
+
+    def missing(self, headline_ids):
+        """Devuelve los IDs que todavía no tienen embedding en el almacén."""
+        rows = self.rows_for(headline_ids)
+        return [int(hid) for hid, row in zip(headline_ids, rows) if row < 0]
+
+    def compact(self, keep_ids=None, chunk_size=100_000):
+        """
+        Reescribe el almacén dejando solo la última versión de cada ID (y, opcionalmente, solo los IDs
+        de `keep_ids`, por ejemplo los que siguen existiendo en la DB). Devuelve las filas eliminadas.
+
+        Los datos se escriben en una generación nueva de archivos, que se activa al reescribir meta.json;
+        los archivos de la generación anterior se borran después (los lectores que ya los tenían abiertos
+        siguen leyéndolos sin problema).
+        """
+        with self._lock, self._file_lock:
+            self._cache = None
+            generation = self._state()[0]
+            count, _, vectors, unique_ids, sorted_rows = self._load()
+            if keep_ids is not None:
+                mask = np.isin(unique_ids, np.asarray(list(keep_ids), dtype=np.int64))
+                unique_ids, sorted_rows = unique_ids[mask], sorted_rows[mask]
+            # Mantener el orden de inserción original
+            order = np.argsort(sorted_rows)
+            rows, kept_ids = sorted_rows[order], unique_ids[order]
+
+            new_generation = generation + 1
+            new_vectors, new_ids = self._paths(new_generation)
+            with open(new_vectors, 'wb') as fv, open(new_ids, 'wb') as fi:
+                for start in range(0, len(rows), chunk_size):
+                    fv.write(np.ascontiguousarray(vectors[rows[start:start + chunk_size]]).tobytes())
+                fi.write(kept_ids.astype(np.int64).tobytes())
+                for f in (fv, fi):
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            self._write_meta(len(rows), new_generation)
+            self._cache = None
+            for path in self._paths(generation):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            removed = count - len(rows)
+            logger.info(f"Almacén de embeddings compactado: {len(rows)} vectores, {removed} filas eliminadas.")
+            return removed
+
+_encoder = None
+_encoder_lock = threading.Lock()
+
+def load_encoder():
+    """Carga (una sola vez) el modelo de sentence-transformers usado para los embeddings de titulares."""
+    global _encoder
+    with _encoder_lock:
+        if _encoder is None:
+            from sentence_transformers import SentenceTransformer
+            _encoder = SentenceTransformer(EMBEDDING_MODEL)
+        return _encoder
+
+def sync_embeddings_from_db(store=None, batch_size=256):
+    """
+    Calcula y guarda los embeddings de los titulares de la DB que todavía no están en el almacén.
+    Devuelve el número de vectores agregados.
+    """
+    from db import get_db_connection # Importación diferida: el almacén no depende de la DB
+    store = store or EmbeddingStore()
+    conn = get_db_connection()
+    if conn is None:
+        return 0
+
+    rows = conn.execute("SELECT id, headline FROM headlines ORDER BY id").fetchall()
+    missing = set(store.missing([row['id'] for row in rows]))
+    pending = [(row['id'], row['headline']) for row in rows if row['id'] in missing]
+    if not pending:
+        return 0
+
+    logger.info(f"Calculando embeddings de {len(pending)} titulares sin vector...")
+    encoder = load_encoder()
+    for i in range(0, len(pending), batch_size * 16):
+        chunk = pending[i:i + batch_size * 16]
+        vectors = encoder.encode([headline for _, headline in chunk], batch_size=batch_size, normalize_embeddings=True)
+        store.append([headline_id for headline_id, _ in chunk], vectors)
+    return len(pending)
+
+def _resident_memory_mb():
+    """
+    Memoria residente del proceso en MB, leída de /proc (solo Linux), separada en
+    privada (RssAnon) y páginas de archivos mapeados (RssFile, compartidas con el page cache y liberables).
+    """
+    memory = {}
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(('RssAnon:', 'RssFile:')):
+                    key, value = line.split(':')
+                    memory[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory.get('RssAnon', float('nan')), memory.get('RssFile', float('nan'))
+
+# --- Bloque de prueba: memoria residente con 1M de vectores ---
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    def report(label, elapsed, baseline):
+        anon, file = _resident_memory_mb()
+        print(f"{label}: {elapsed * 1000:.1f} ms | RSS privada +{anon - baseline[0]:.0f} MB | RSS de archivo mapeado +{file - baseline[1]:.0f} MB")
+
+    n_vectors = 1_000_000
+    print(f"🚀 Creando un almacén temporal con {n_vectors:,} vectores de dimensión {EMBEDDING_DIM}...")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = EmbeddingStore(tmp_dir)
+        rng = np.random.default_rng(0)
+        for start in range(0, n_vectors, 100_000):
+            store.append(np.arange(start, start + 100_000), rng.standard_normal((100_000, EMBEDDING_DIM), dtype=np.float32))
+        size_mb = os.path.getsize(store.vectors_path) / 1024 ** 2
+        print(f"Tamaño en disco: {size_mb:.0f} MB (float16; en float32 serían {size_mb * 2:.0f} MB)")
+
+        reader = EmbeddingStore(tmp_dir)
+        baseline = _resident_memory_mb()
+        start = time.perf_counter()
+        ids, vectors = reader.vectors()
+        report("Apertura con memmap e índice de IDs", time.perf_counter() - start, baseline)
+
+        start = time.perf_counter()
+        reader.get(rng.integers(0, n_vectors, 1000))
+        report("Lectura de 1.000 vectores aleatorios", time.perf_counter() - start, baseline)
+
+        start = time.perf_counter()
+        query = vectors[0]
+        for block in range(0, n_vectors, 100_000):
+            vectors[block:block + 100_000] @ query
+        report("Recorrido completo (producto interno)", time.perf_counter() - start, baseline)
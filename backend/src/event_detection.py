@@ -0,0 +1,183 @@
+import os
+import json
+import math
+import datetime
+from db import get_db_connection, cargar_estados_series, guardar_estados_series, guardar_eventos, reiniciar_deteccion_eventos
+from logger import logger
+
+# Cantidad máxima de horas vacías que se aplican al EWMA al cerrar un hueco: después de una semana sin
+# menciones la media ya es prácticamente cero, así que el costo de cada actualización queda acotado.
+MAX_GAP_HOURS = 168
+BUCKET_FORMAT = '%Y-%m-%d %H:00:00'
+
+# Construir rutas relativas al archivo actual para mayor portabilidad
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Apunta a la carpeta 'backend'
+CONFIG_PATH = os.path.join(BASE_DIR, 'config', 'config.json')
+
+def hour_bucket(timestamp):
+    """Devuelve el inicio de la hora (datetime) de un timestamp (datetime o texto 'AAAA-MM-DD HH:MM:SS')."""
+    if isinstance(timestamp, str):
+        timestamp = datetime.datetime.fromisoformat(timestamp[:19])
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+def headline_observations(row):
+    """Extrae las observaciones (tipo, clave) de un titular: sus entidades, su tópico y su historia."""
+    observations = []
+    try:
+        entities = json.loads(row['entities']) if row['entities'] else []
+    except (json.JSONDecodeError, TypeError):
+        entities = []
+    for text in {entity['text'].strip() for entity in entities if entity.get('text')}:
+        observations.append(("entity", text))
+    if row['topic']:
+        observations.append(("topic", row['topic']))
+    if row['story_id'] is not None:
+        observations.append(("story", str(row['story_id'])))
+    return observations
+
+class EventDetector:
+    """
+    Detector de ráfagas (bursts) en streaming sobre series horarias de menciones.
+
+    Para cada entidad, tópico e historia se guarda solo un estado de tamaño fijo: la hora en curso, su
+    conteo, y la media y varianza exponencialmente ponderadas (EWMA) de las horas anteriores. Cada
+    observación actualiza ese estado en O(1); al pasar a una hora nueva, la hora anterior (y las horas
+    vacías intermedias) se incorporan al EWMA. Una serie entra en ráfaga cuando el conteo de la hora en
+    curso supera `min_count` y su z-score respecto del EWMA supera `z_threshold`.
+
+    Una serie nueva parte de una media cero (antes no tuvo menciones), así que una entidad que aparece
+    de golpe es una ráfaga. Para que eso sea cierto hace falta historia: durante las primeras
+    `warmup_hours` desde el inicio del historial (`history_start`) no se emiten eventos.
+
+    Las observaciones que llegan tarde (de una hora anterior a la hora en curso) se suman a la hora en curso.
+    """
+
+    def __init__(self, alpha=0.1, z_threshold=3.0, min_count=5, min_std=1.0, warmup_hours=24):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.min_std = min_std # Evita z-scores enormes en series con muy poca historia
+        self.warmup = datetime.timedelta(hours=warmup_hours)
+
+    def _update_ewma(self, state, value):
+        diff = value - state['mean']
+        state['mean'] += self.alpha * diff
+        state['var'] = (1 - self.alpha) * (state['var'] + self.alpha * diff * diff)
+        state['n'] += 1
+
+    def _advance(self, state, bucket):
+        """Cierra la hora en curso del estado y avanza hasta `bucket`."""
+        current = hour_bucket(state['bucket'])
+        if bucket <= current:
+            return
+        self._update_ewma(state, state['count'])
+        empty_hours = int((bucket - current).total_seconds() // 3600) - 1
+        for _ in range(min(empty_hours, MAX_GAP_HOURS)):
+            self._update_ewma(state, 0)
+        state['bucket'] = bucket.strftime(BUCKET_FORMAT)
+        state['count'] = 0
+
+    def zscore(self, state):
+        """z-score del conteo de la hora en curso frente a la media y desviación EWMA."""
+        std = max(math.sqrt(state['var']), self.min_std)
+        return (state['count'] - state['mean']) / std
+
+    def observe(self, observations, history_start=None):
+        """
+        Procesa una lista de observaciones (tipo, clave, timestamp) en orden cronológico.
+        Actualiza los estados de las series en la DB y guarda los eventos detectados.
+        `history_start` es el timestamp del primer titular del historial (para el período de calentamiento).
+        Devuelve la lista de eventos detectados.
+        """
+        if not observations:
+            return []
+        warmed_up_from = hour_bucket(history_start) + self.warmup if history_start else None
+        observations = sorted(observations, key=lambda o: hour_bucket(o[2]))
+        states = cargar_estados_series({(kind, key) for kind, key, _ in observations})
+
+        events = {}
+        for kind, key, timestamp in observations:
+            bucket = hour_bucket(timestamp)
+            state = states.get((kind, key))
+            if state is None:
+                state = {'kind': kind, 'key': key, 'bucket': bucket.strftime(BUCKET_FORMAT), 'count': 0, 'mean': 0.0, 'var': 0.0, 'n': 0}
+                states[(kind, key)] = state
+            self._advance(state, bucket)
+            state['count'] += 1
+
+            z = self.zscore(state)
+            warmed_up = warmed_up_from is None or bucket >= warmed_up_from
+            if warmed_up and state['count'] >= self.min_count and z >= self.z_threshold:
+                # Un evento por serie y hora: se conserva el pico de la hora
+                events[(kind, key, state['bucket'])] = {
+                    'kind': kind, 'key': key, 'bucket': state['bucket'], 'count': state['count'],
+                    'expected': state['mean'], 'zscore': z,
+                }
+
+        guardar_estados_series(list(states.values()))
+        guardar_eventos(list(events.values()))
+        if events:
+            logger.info(f"Detección de eventos: {len(events)} ráfagas detectadas.")
+        return list(events.values())
+
+def get_event_detector():
+    """Crea un EventDetector con los parámetros de "event_detection" en config.json."""
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            params = json.load(f).get("event_detection", {})
+    except (OSError, json.JSONDecodeError):
+        logger.warning("No se pudo leer config.json; se usan los parámetros por defecto de detección de eventos.")
+        params = {}
+    return EventDetector(
+        alpha=params.get("alpha", 0.1),
+        z_threshold=params.get("z_threshold", 3.0),
+        min_count=params.get("min_count", 5),
+        min_std=params.get("min_std", 1.0),
+        warmup_hours=params.get("warmup_hours", 24),
+    )
+
+def _history_start(conn):
+    return conn.execute("SELECT MIN(collection_date) FROM headlines").fetchone()[0]
+
+def _rows_to_observations(rows):
+    return [(kind, key, row['collection_date']) for row in rows for kind, key in headline_observations(row)]
+
+def run_event_detection(headline_ids, chunk_size=500):
+    """Etapa del pipeline: alimenta el detector con los titulares recién guardados."""
+    conn = get_db_connection()
+    if conn is None or not headline_ids:
+        return []
+    detector = get_event_detector()
+    rows = []
+    headline_ids = list(headline_ids)
+    for i in range(0, len(headline_ids), chunk_size):
+        chunk = headline_ids[i:i + chunk_size]
+        rows.extend(conn.execute(
+            f"SELECT id, collection_date, entities, topic, story_id FROM headlines WHERE id IN ({','.join('?' * len(chunk))})",
+            chunk
+        ).fetchall())
+    return detector.observe(_rows_to_observations(rows), history_start=_history_start(conn))
+
+def rebuild_events(chunk_size=5000):
+    """Reinicia las series y eventos y vuelve a procesar todo el historial en orden cronológico."""
+    conn = get_db_connection()
+    if conn is None:
+        return 0
+    reiniciar_deteccion_eventos()
+    detector = get_event_detector()
+    history_start = _history_start(conn)
+    detected = 0
+    last = ('', 0)
+    while True:
+        # Paginación por (collection_date, id) para no mantener un cursor abierto entre escrituras
+        rows = conn.execute(
+            """SELECT id, collection_date, entities, topic, story_id FROM headlines
+               WHERE (collection_date, id) > (?, ?) ORDER BY collection_date, id LIMIT ?""",
+            (*last, chunk_size)
+        ).fetchall()
+        if not rows:
+            break
+        detected += len(detector.observe(_rows_to_observations(rows), history_start=history_start))
+        last = (rows[-1]['collection_date'], rows[-1]['id'])
+    logger.info(f"Reconstrucción de eventos completada: {detected} ráfagas detectadas.")
+    return detected
@@ -1,4 +1,11 @@
+import datetime
+import hashlib
+import pandas as pd
 from analysis import analyzer
+from db import (
+    get_db_connection, obtener_titulares_sin_framing, guardar_framing_en_db,
+    obtener_briefing_cacheado, guardar_briefing
+)
 from logger import logger # El logger se mantiene en la raíz de src
 
 def summarize_text(text, max_length=150, min_length=30):
@@ -11,36 +18,176 @@ def summarize_text(text, max_length=150, min_length=30):
         logger.error(f"Error en resumen de texto: '{text[:50]}...'", exc_info=True)
         return None
 
-def generate_briefing(articles_df, max_length=300, min_length=75):
+def run_framing_stage(headline_ids=None, batch_size=16):
+    """
+    Etapa de clasificación de encuadre (framing) del pipeline.
+    Agrupa los titulares pendientes por tópico, los clasifica en lotes con las etiquetas
+    de `framing_labels` de config.json y guarda el resultado en la DB.
+    Si no se pasan IDs, procesa todos los titulares sin encuadre (backfill).
+    Devuelve el número de titulares clasificados.
+    """
+    framing_labels = analyzer.config.get("framing_labels", {})
+    if not analyzer.zero_shot_classifier or not framing_labels:
+        logger.warning("No hay clasificador zero-shot o etiquetas de encuadre configuradas. Se omite la etapa de framing.")
+        return 0
+
+    pending = obtener_titulares_sin_framing(list(framing_labels.keys()), headline_ids)
+    if not pending:
+        return 0
+
+    logger.info(f"Clasificando el encuadre de {len(pending)} titulares...")
+    by_topic = {}
+    for row in pending:
+        by_topic.setdefault(row['topic'], []).append(row)
+
+    classified = 0
+    for topic, rows in by_topic.items():
+        for i in range(0, len(rows), batch_size):
+            batch = rows[i:i + batch_size]
+            framings = analyzer.classify_framing_batch([r['headline'] for r in batch], topic, batch_size=batch_size)
+            results = [(r['id'], f) for r, f in zip(batch, framings) if f]
+            guardar_framing_en_db(results)
+            classified += len(results)
+
+    logger.info(f"Etapa de framing completada: {classified} titulares clasificados.")
+    return classified
+
+# Prompt del paso final (reduce) del briefing
+BRIEFING_PROMPT = "Eres un analista de noticias experto. A continuación se presentan resúmenes de varias historias. Tu tarea es crear un único briefing de noticias, coherente y bien redactado, que capture los eventos y narrativas más importantes del día. Conecta las ideas y presenta la información de forma consolidada. Basa tu resumen únicamente en el texto proporcionado.\n\n### RESÚMENES DE NOTICIAS:\n\n"
+# Prompt del paso map: resumen de los artículos de una misma historia
+STORY_PROMPT = "Resume en pocas frases la siguiente historia a partir de los resúmenes de sus artículos.\n\n"
+# El límite de tokens de muchos modelos es 1024, pero el de caracteres es mayor. 4096 es un límite seguro.
+MAX_INPUT_CHARS = 4096
+MAX_REDUCE_ROUNDS = 5
+NO_SUMMARY_TEXT = "No se pudo generar un resumen."
+BRIEFING_ERROR_TEXT = "No se pudo generar el briefing a partir de los artículos seleccionados."
+
+def summarize_batch(texts, max_length=150, min_length=30, batch_size=8):
+    """Resume varios textos en una sola llamada al pipeline. Devuelve un resumen (o None) por texto."""
+    if not analyzer.summarizer or not texts:
+        return [None] * len(texts)
+    try:
+        results = analyzer.summarizer(list(texts), max_length=max_length, min_length=min_length, do_sample=False, batch_size=batch_size)
+        return [r['summary_text'] for r in results]
+    except Exception:
+        logger.error(f"Error en resumen de un lote de {len(texts)} textos.", exc_info=True)
+        return [None] * len(texts)
+
+def _chunk_texts(texts, max_chars):
+    """Agrupa una lista de textos en bloques de viñetas que no superan max_chars caracteres."""
+    chunks, current = [], ""
+    for text in texts:
+        line = f"- {text[:max_chars - 3]}\n"
+        if current and len(current) + len(line) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current:
+        chunks.append(current)
+    return chunks
+
+def _bullets_length(texts):
+    """Largo de los textos como viñetas ("- texto\\n"), tal como se arman los prompts."""
+    return sum(len(text) + 3 for text in texts)
+
+def briefing_cache_key(article_ids):
+    """Clave de caché del briefing: hash de los IDs de los artículos seleccionados."""
+    ids = ",".join(str(i) for i in sorted(int(i) for i in article_ids))
+    return hashlib.sha256(ids.encode('utf-8')).hexdigest()
+
+def _story_texts(articles_df):
+    """
+    Agrupa los artículos por story_id y devuelve, por cada historia, la lista de textos a resumir
+    (el resumen del artículo o, si no lo hay, su titular). Las historias más grandes van primero.
+    Los artículos sin historia se tratan como historias de un único artículo.
+    """
+    stories = {}
+    for article in articles_df.sort_values('collection_date', ascending=False).itertuples(index=False):
+        summary = getattr(article, 'summary', None)
+        text = summary if isinstance(summary, str) and summary and summary != NO_SUMMARY_TEXT else article.headline
+        story_id = getattr(article, 'story_id', None)
+        key = ('story', int(story_id)) if pd.notna(story_id) else ('article', article.id)
+        stories.setdefault(key, []).append(text)
+    return sorted(stories.values(), key=len, reverse=True)
+
+def generate_briefing(articles_df, max_length=300, min_length=75, use_cache=True, briefing_date=None):
     """
     Genera un resumen consolidado (briefing) a partir de una lista de artículos (DataFrame).
-    Utiliza los resúmenes de cada artículo para construir el prompt.
+
+    Funciona en dos pasos (map-reduce):
+    1. Map: agrupa los artículos por historia (story_id) y resume cada historia en lote.
+    2. Reduce: resume los resúmenes de las historias, en varias rondas si no entran en un único prompt.
+
+    El resultado se guarda en caché con un hash de los IDs de los artículos seleccionados.
     """
     if articles_df.empty:
         return "No hay artículos para generar el resumen."
 
-    # Crear un prompt más claro para el modelo de resumen
-    prompt = "Eres un analista de noticias experto. A continuación se presentan resúmenes de varios artículos. Tu tarea es crear un único briefing de noticias, coherente y bien redactado, que capture los eventos y narrativas más importantes del día. Conecta las ideas y presenta la información de forma consolidada. Basa tu resumen únicamente en el texto proporcionado.\n\n### RESÚMENES DE NOTICIAS:\n\n"
-    
-    # Combinar los resúmenes de los artículos, asegurándose de no exceder el límite de caracteres del modelo
-    full_text = ""
-    # El límite de tokens de muchos modelos es 1024, pero el de caracteres es mayor. 4096 es un límite seguro.
-    max_input_chars = 4096 - len(prompt) 
-
-    # Priorizar artículos con resúmenes más largos o más recientes si es necesario
-    articles_df_sorted = articles_df.sort_values('collection_date', ascending=False)
-
-    for index, article in articles_df_sorted.iterrows():
-        summary = article.get('summary', article['headline']) # Usar resumen si existe, si no, el titular
-        if len(full_text) + len(summary) + 20 < max_input_chars:
-            full_text += f"- {summary}\n"
-        else:
-            break # Dejar de añadir textos si se excede el límite
-
-    if not full_text:
-        return "Los resúmenes de los artículos son demasiado largos para generar un briefing consolidado."
-
-    # Añadir el prompt al principio del texto
-    final_input = prompt + full_text
-    
-    return summarize_text(final_input, max_length=max_length, min_length=min_length)
\ No newline at end of file
+    cache_key = briefing_cache_key(articles_df['id'])
+    if use_cache:
+        cached = obtener_briefing_cacheado(cache_key)
+        if cached:
+            logger.info(f"Briefing obtenido de la caché ({len(articles_df)} artículos).")
+            return cached
+
+    # --- Map: un resumen por historia ---
+    map_inputs, digests = [], []
+    for texts in _story_texts(articles_df):
+        if len(texts) == 1 and len(texts[0]) <= MAX_INPUT_CHARS // 4:
+            digests.append(texts[0]) # Una historia de un solo artículo ya tiene su resumen
+            continue
+        for chunk in _chunk_texts(texts, MAX_INPUT_CHARS - len(STORY_PROMPT)):
+            map_inputs.append(STORY_PROMPT + chunk)
+
+    logger.info(f"Generando briefing de {len(articles_df)} artículos: {len(map_inputs)} bloques de historias a resumir.")
+    summaries = summarize_batch(map_inputs)
+    if not all(summaries):
+        logger.error(f"No se pudieron resumir {summaries.count(None)} de {len(map_inputs)} bloques de historias; no se genera un briefing parcial.")
+        return BRIEFING_ERROR_TEXT
+    digests = summaries + digests
+
+    # --- Reduce: combinar los resúmenes de historias hasta que entren en un único prompt ---
+    # Ninguna historia se descarta: si una ronda falla o no achica el texto, el briefing no se genera
+    max_reduce_chars = MAX_INPUT_CHARS - len(BRIEFING_PROMPT)
+    rounds = 0
+    while _bullets_length(digests) > max_reduce_chars:
+        if rounds == MAX_REDUCE_ROUNDS:
+            logger.error(f"Los resúmenes de historias no entran en un prompt tras {MAX_REDUCE_ROUNDS} rondas de reducción; no se genera el briefing.")
+            return BRIEFING_ERROR_TEXT
+        chunks = _chunk_texts(digests, max_reduce_chars)
+        reduced = summarize_batch([BRIEFING_PROMPT + c for c in chunks])
+        if not all(reduced):
+            logger.error(f"Falló la ronda {rounds + 1} de reducción del briefing ({reduced.count(None)} de {len(chunks)} bloques sin resumen).")
+            return BRIEFING_ERROR_TEXT
+        if _bullets_length(reduced) >= _bullets_length(digests):
+            logger.error(f"La ronda {rounds + 1} de reducción del briefing no achicó el texto; no se genera el briefing.")
+            return BRIEFING_ERROR_TEXT
+        digests, rounds = reduced, rounds + 1
+
+    final_input = BRIEFING_PROMPT + "".join(f"- {d}\n" for d in digests)
+    briefing = summarize_text(final_input, max_length=max_length, min_length=min_length)
+
+    if briefing:
+        guardar_briefing(cache_key, briefing, len(articles_df), briefing_date)
+    return briefing
+
+def precompute_daily_briefing(day=None):
+    """
+    Precalcula y guarda en caché el briefing de los artículos recolectados en un día
+    (por defecto, hoy). Pensado para ejecutarse al final de cada corrida de ingesta.
+    """
+    day = day or datetime.date.today().isoformat()
+    conn = get_db_connection()
+    if conn is None:
+        return None
+
+    articles_df = pd.read_sql(
+        "SELECT id, headline, summary, story_id, collection_date FROM headlines WHERE collection_date >= ? AND collection_date < date(?, '+1 day')",
+        conn, params=(day, day)
+    )
+    if articles_df.empty:
+        logger.info(f"No hay artículos del {day} para precalcular el briefing.")
+        return None
+
+    logger.info(f"Precalculando el briefing del {day}...")
+    return generate_briefing(articles_df, briefing_date=day)
@@ -7,40 +7,61 @@ from stopwords import STOPWORDS
 from streamlit_agraph import agraph, Node, Edge, Config
 import pydeck as pdk
 import os
+from db import ids_titulares_por_texto, contar_entidades, ids_titulares_con_entidad, coocurrencias_entidades, medios_con_entidades_en_comun, contar_rollup, resumen_rollup, indice_objetividad
+from analytics_store import get_analytics_store
+
+# --- Conteos agregados ---
+def _rollup_filters(filters):
+    """
+    Los filtros de la barra lateral como argumentos de las funciones de rollup de db.py, o None si incluyen
+    una búsqueda por palabra clave: esos IDs no están en los rollups y los resuelve el espejo analítico.
+    """
+    if filters.get('headline_ids') is not None:
+        return None
+    return {key: filters.get(key) for key in ('sources', 'topics', 'date_from', 'date_to')}
+
+def aggregate_counts(by, filters, daily=False):
+    """Cantidad de titulares por `by` (y por día, columna 'date'), desde los rollups o desde el espejo analítico."""
+    rollup_filters = _rollup_filters(filters)
+    if rollup_filters is None:
+        store = get_analytics_store()
+        return store.daily_counts(by, filters) if daily else store.counts(by, filters)
+    by = [by] if isinstance(by, str) else list(by)
+    rows = contar_rollup(by, granularity='day' if daily else None, **rollup_filters)
+    df = pd.DataFrame(rows, columns=(['bucket'] if daily else []) + by + ['count'])
+    return df.rename(columns={'bucket': 'date'})
 
 # --- Main Metrics ---
-def display_main_metrics(df):
-    """Muestra las métricas principales del dashboard."""
+def display_main_metrics(filters):
+    """Muestra las métricas principales del dashboard (agregadas en el espejo analítico)."""
     st.subheader("Métricas Generales")
     col1, col2, col3 = st.columns(3)
     
-    if df.empty or 'source' not in df.columns or 'topic' not in df.columns:
-        col1.metric("Total de Titulares Analizados", 0)
-        col2.metric("Total de Medios", 0)
-        col3.metric("Total de Tópicos", 0)
-    else:
-        col1.metric("Total de Titulares Analizados", len(df))
-        col2.metric("Total de Medios", df['source'].nunique())
-        col3.metric("Total de Tópicos", df['topic'].nunique())
+    rollup_filters = _rollup_filters(filters)
+    summary = resumen_rollup(**rollup_filters) if rollup_filters is not None else get_analytics_store().summary(filters)
+    col1.metric("Total de Titulares Analizados", summary['headlines'])
+    col2.metric("Total de Medios", summary['sources'])
+    col3.metric("Total de Tópicos", summary['topics'])
     
     st.markdown("---")
 
 # --- General Analysis ---
-def display_general_analysis(df):
+def display_general_analysis(filters):
     """
     Muestra los gráficos de análisis general con un layout mejorado y una nube de palabras con stylecloud.
     """
     st.subheader("Visión General")
+    store = get_analytics_store()
 
     # --- Fila 1: Gráficos Principales ---
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("#### Distribución por Sentimiento")
-        if not df['sentiment_label'].dropna().empty:
-            sentiment_counts = df['sentiment_label'].value_counts()
-            fig = px.pie(sentiment_counts, values=sentiment_counts.values, names=sentiment_counts.index,
-                         color=sentiment_counts.index,
+        sentiment_counts = store.counts('sentiment_label', filters)
+        if not sentiment_counts.empty:
+            fig = px.pie(sentiment_counts, values='count', names='sentiment_label',
+                         color='sentiment_label',
                          color_discrete_map={'POS': '#28a745', 'NEU': '#6c757d', 'NEG': '#dc3545'},
                          hole=0.3)
             fig.update_layout(margin=dict(l=0, r=0, t=0, b=0), legend_title_text='Sentimiento')
@@ -50,11 +71,11 @@ def display_general_analysis(df):
 
     with col2:
         st.markdown("#### Titulares por Medio")
-        if not df.empty:
-            source_counts = df['source'].value_counts()
-            fig = px.bar(source_counts, y=source_counts.index, x=source_counts.values, 
+        source_counts = store.counts('source', filters)
+        if not source_counts.empty:
+            fig = px.bar(source_counts, y='source', x='count', 
                          orientation='h',
-                         labels={'y': 'Medio', 'x': 'Cantidad de Titulares'})
+                         labels={'source': 'Medio', 'count': 'Cantidad de Titulares'})
             fig.update_layout(margin=dict(l=0, r=0, t=0, b=0), yaxis={'categoryorder':'total ascending'})
             st.plotly_chart(fig, use_container_width=True)
         else:
@@ -64,8 +85,10 @@ def display_general_analysis(df):
 
     # --- Fila 2: Nube de Palabras Clave ---
     st.markdown("#### Nube de Palabras Clave")
-    if not df.empty:
-        text = ' '.join(df['headline'].dropna())
+    # Los titulares más recientes alcanzan para las 40 palabras de la nube
+    recent = store.headlines(filters, limit=5000)
+    if not recent.empty:
+        text = ' '.join(recent['headline'].dropna())
         if text:
             stylecloud.gen_stylecloud(
                 text=text,
@@ -81,15 +104,14 @@ def display_general_analysis(df):
             st.warning("No hay texto para generar la nube de palabras.")
 
 # --- Trend Analysis ---
-def display_trend_analysis(df):
+def display_trend_analysis(filters):
     """Muestra el análisis de tendencias de sentimiento y por palabra clave con un diseño mejorado."""
     st.subheader("Análisis de Tendencias")
+    store = get_analytics_store()
 
     # --- 1. Evolución del Sentimiento (Gráfico existente mejorado) ---
     st.markdown("#### Evolución del Sentimiento en el Tiempo")
-    df_trends = df.copy()
-    df_trends['date'] = pd.to_datetime(df_trends['collection_date']).dt.date
-    sentiment_over_time = df_trends.groupby(['date', 'sentiment_label']).size().reset_index(name='count')
+    sentiment_over_time = aggregate_counts('sentiment_label', filters, daily=True)
     
     if not sentiment_over_time.empty:
         fig = px.line(sentiment_over_time, x='date', y='count', color='sentiment_label', 
@@ -113,13 +135,14 @@ def display_trend_analysis(df):
     keyword = st.text_input("Ingresa una palabra clave para analizar su tendencia:", placeholder="Ej: Dólar, Elecciones, Messi...")
 
     if keyword:
-        keyword_df = df[df['headline'].str.contains(keyword, case=False, na=False)].copy()
+        # Los IDs de la búsqueda FTS se combinan con los de la búsqueda de la barra lateral, si la hay
+        keyword_ids = ids_titulares_por_texto(keyword)
+        if filters.get('headline_ids') is not None:
+            keyword_ids &= set(filters['headline_ids'])
+        keyword_trend = store.daily_counts(filters={**filters, 'headline_ids': keyword_ids})
         
-        if not keyword_df.empty:
-            keyword_df['date'] = pd.to_datetime(keyword_df['collection_date']).dt.date
-            keyword_trend = keyword_df.groupby('date').size().reset_index(name='count')
-            
-            st.success(f"Se encontraron {len(keyword_df)} titulares que contienen la palabra '{keyword}'.")
+        if not keyword_trend.empty:
+            st.success(f"Se encontraron {keyword_trend['count'].sum()} artículos que mencionan '{keyword}' (en el titular, el resumen, el cuerpo o las citas).")
 
             fig_keyword = px.area(keyword_trend, x='date', y='count', 
                                   title=f"Tendencia de la palabra clave: '{keyword}'",
@@ -138,24 +161,22 @@ def display_trend_analysis(df):
 def display_entity_explorer(df):
     """Muestra el explorador de entidades con un diseño mejorado."""
     st.subheader("Explorador de Entidades Nombradas")
-    all_entities = []
-    for _, row in df.iterrows():
-        for entity in row['entities']:
-            all_entities.append(entity)
+    headline_ids = df['id'].tolist()
+    all_entities = pd.DataFrame(contar_entidades(headline_ids))
             
-    if not all_entities:
+    if all_entities.empty:
         st.warning("No se encontraron entidades en los titulares filtrados.")
         return
 
-    entities_df = pd.DataFrame(all_entities)
     entity_type_filter = st.multiselect(
         "Filtrar por tipo de entidad:", 
-        options=entities_df['label'].unique(), 
-        default=entities_df['label'].unique()
+        options=all_entities['label'].unique(), 
+        default=all_entities['label'].unique()
     )
     
-    filtered_entities_df = entities_df[entities_df['label'].isin(entity_type_filter)]
-    ner_counts = filtered_entities_df['text'].value_counts().nlargest(20)
+    # Conteo en SQL sobre headline_entities, ya filtrado por tipo
+    entities_df = pd.DataFrame(contar_entidades(headline_ids, labels=entity_type_filter), columns=['text', 'label', 'mentions'])
+    ner_counts = entities_df.groupby('text')['mentions'].sum().nlargest(20)
     
     if not ner_counts.empty:
         fig = px.bar(ner_counts, x=ner_counts.values, y=ner_counts.index, orientation='h', 
@@ -173,23 +194,21 @@ def display_entity_explorer(df):
     st.subheader("Titulares por Entidad")
     selected_entity = st.selectbox("Selecciona una entidad para ver los titulares asociados:", options=ner_counts.index)
     if selected_entity:
-        def find_entity(entities):
-            return any(e['text'] == selected_entity for e in entities)
-        
-        entity_headlines = df[df['entities'].apply(find_entity)]
+        entity_headlines = df[df['id'].isin(ids_titulares_con_entidad(selected_entity, headline_ids))]
         st.dataframe(entity_headlines[['headline', 'source', 'collection_date']])
 
 # --- Topic Analysis ---
-def display_topic_analysis(df):
+def display_topic_analysis(filters):
     """Muestra el análisis de tópicos con un diseño mejorado."""
     st.subheader("Análisis por Tópicos")
+    store = get_analytics_store()
 
     st.markdown("#### Distribución de Titulares por Tópico")
-    if not df['topic'].dropna().empty:
-        topic_counts = df['topic'].value_counts()
-        fig = px.bar(topic_counts, y=topic_counts.index, x=topic_counts.values,
+    topic_counts = aggregate_counts('topic', filters)
+    if not topic_counts.empty:
+        fig = px.bar(topic_counts, y='topic', x='count',
                      orientation='h',
-                     labels={'y': 'Tópico', 'x': 'Cantidad de Titulares'},
+                     labels={'topic': 'Tópico', 'count': 'Cantidad de Titulares'},
                      template="plotly_white")
         fig.update_traces(marker_color='#1a6fba')
         fig.update_layout(
@@ -203,27 +222,27 @@ def display_topic_analysis(df):
     st.markdown("---")
     
     st.markdown("#### Titulares por Tópico")
-    topics = df['topic'].dropna().unique()
+    topics = topic_counts['topic'].tolist() if not topic_counts.empty else []
     if len(topics) > 0:
         selected_topic = st.selectbox("Selecciona un tópico para ver los titulares asociados:", options=topics)
         if selected_topic:
-            topic_headlines = df[df['topic'] == selected_topic]
+            topic_headlines = store.headlines({**filters, 'topics': [selected_topic]})
             st.dataframe(topic_headlines[['headline', 'source', 'collection_date']])
     else:
         st.info("No hay tópicos disponibles para seleccionar.")
 
 # --- Advanced Analysis ---
-def display_advanced_analysis(df):
+def display_advanced_analysis(filters):
     """Muestra gráficos de análisis avanzado con un diseño mejorado."""
     st.subheader("Análisis Avanzado")
+    store = get_analytics_store()
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.markdown("#### Distribución de Tópicos (Treemap)")
-        if not df['topic'].dropna().empty:
-            topic_counts = df['topic'].value_counts().reset_index()
-            topic_counts.columns = ['topic', 'count']
+        topic_counts = store.counts('topic', filters)
+        if not topic_counts.empty:
             fig = px.treemap(topic_counts, path=['topic'], values='count',
                              title='Distribución de Titulares por Tópico',
                              color_continuous_scale='Blues',
@@ -235,8 +254,10 @@ def display_advanced_analysis(df):
             
     with col2:
         st.markdown("#### Sentimiento vs. Cantidad de Entidades")
-        if not df.empty:
-            fig = px.scatter(df, x='sentiment_score', y='entity_count', color='sentiment_label',
+        # Una muestra de titulares: el gráfico de dispersión no mejora con más puntos
+        sample = store.entity_count_sample(filters)
+        if not sample.empty:
+            fig = px.scatter(sample, x='sentiment_score', y='entity_count', color='sentiment_label',
                              labels={'sentiment_score': 'Puntaje de Sentimiento', 'entity_count': 'Cantidad de Entidades'},
                              title='Relación entre Sentimiento y Entidades',
                              color_discrete_map={'POS': '#28a745', 'NEU': '#6c757d', 'NEG': '#dc3545'},
@@ -249,11 +270,13 @@ def display_advanced_analysis(df):
     st.info("Nota: La interactividad entre gráficos no está implementada en esta versión.")
 
 # --- Comparative Analysis ---
-def display_comparative_analysis(df):
+def display_comparative_analysis(filters):
     """Muestra una comparación lado a lado de dos medios con un diseño mejorado."""
     st.subheader("Análisis Comparativo Lado a Lado")
 
-    sources = sorted(df['source'].unique())
+    # Conteos por medio y sentimiento en una sola consulta
+    sentiment_by_source = get_analytics_store().counts(['source', 'sentiment_label'], filters)
+    sources = sorted(sentiment_by_source['source'].unique()) if not sentiment_by_source.empty else []
     if len(sources) < 2:
         st.warning("Selecciona al menos dos medios en el filtro de la barra lateral para comparar.")
         return
@@ -272,8 +295,8 @@ def display_comparative_analysis(df):
     
     col1, col2 = st.columns(2)
     
-    df1 = df[df['source'] == source1]
-    df2 = df[df['source'] == source2]
+    df1 = sentiment_by_source[sentiment_by_source['source'] == source1]
+    df2 = sentiment_by_source[sentiment_by_source['source'] == source2]
 
     # --- Columna 1 ---
     with col1:
@@ -282,9 +305,8 @@ def display_comparative_analysis(df):
             st.warning("No hay datos para este medio con los filtros actuales.")
         else:
             st.markdown("##### Sentimiento General")
-            sentiment_counts = df1['sentiment_label'].value_counts()
-            fig = px.pie(sentiment_counts, values=sentiment_counts.values, names=sentiment_counts.index, 
-                         color=sentiment_counts.index,
+            fig = px.pie(df1, values='count', names='sentiment_label', 
+                         color='sentiment_label',
                          color_discrete_map={'POS': '#28a745', 'NEU': '#6c757d', 'NEG': '#dc3545'}, 
                          hole=.4, template="plotly_white")
             fig.update_layout(margin=dict(l=0, r=0, t=0, b=0), legend_title_text='Sentimiento')
@@ -297,9 +319,8 @@ def display_comparative_analysis(df):
             st.warning("No hay datos para este medio con los filtros actuales.")
         else:
             st.markdown("##### Sentimiento General")
-            sentiment_counts = df2['sentiment_label'].value_counts()
-            fig = px.pie(sentiment_counts, values=sentiment_counts.values, names=sentiment_counts.index, 
-                         color=sentiment_counts.index,
+            fig = px.pie(df2, values='count', names='sentiment_label', 
+                         color='sentiment_label',
                          color_discrete_map={'POS': '#28a745', 'NEU': '#6c757d', 'NEG': '#dc3545'}, 
                          hole=.4, template="plotly_white")
             fig.update_layout(margin=dict(l=0, r=0, t=0, b=0), legend_title_text='Sentimiento')
@@ -310,25 +331,17 @@ def display_network_analysis(df):
     """Muestra un grafo de red de entidades interactivo con un diseño mejorado."""
     st.subheader("Mapa de Relaciones entre Entidades")
 
-    if df.empty or df['entities'].apply(len).sum() < 2:
+    if df.empty or df['entity_count'].sum() < 2:
         st.warning("No hay suficientes datos o entidades para generar un mapa de relaciones.")
         return
 
+    # Co-ocurrencias calculadas en SQL: cantidad de titulares que mencionan a ambas entidades
     edge_weights = {}
     entity_types = {}
-
-    for entities_list in df['entities']:
-        entities = [(e['text'], e['label']) for e in entities_list]
-        
-        for name, label in entities:
-            if name not in entity_types:
-                entity_types[name] = label
-
-        from itertools import combinations
-        entity_names = [e[0] for e in entities]
-        for p1, p2 in combinations(entity_names, 2):
-            edge = tuple(sorted((p1, p2)))
-            edge_weights[edge] = edge_weights.get(edge, 0) + 1
+    for pair in coocurrencias_entidades(df['id'].tolist()):
+        edge_weights[(pair['text_a'], pair['text_b'])] = pair['weight']
+        entity_types.setdefault(pair['text_a'], pair['label_a'])
+        entity_types.setdefault(pair['text_b'], pair['label_b'])
 
     if not edge_weights:
         st.warning("No se encontraron relaciones entre entidades para los filtros seleccionados.")
@@ -371,15 +384,11 @@ def display_network_analysis(df):
     agraph(nodes=nodes, edges=edges, config=config)
 
 # --- Subjectivity Analysis ---
-def display_subjectivity_analysis(df):
+def display_subjectivity_analysis(filters):
     """Muestra un análisis de la subjetividad de los titulares por medio con un diseño mejorado."""
     st.subheader("Análisis de Subjetividad (Objetivo vs. Opinión)")
 
-    if 'subjectivity_label' not in df.columns or df['subjectivity_label'].dropna().empty:
-        st.warning("No hay datos de subjetividad para mostrar. Asegúrate de que el scraper se haya ejecutado con la nueva versión.")
-        return
-
-    subjectivity_counts = df.groupby(['source', 'subjectivity_label']).size().reset_index(name='count')
+    subjectivity_counts = aggregate_counts(['source', 'subjectivity_label'], filters)
     
     if not subjectivity_counts.empty:
         fig = px.bar(subjectivity_counts, x='source', y='count', color='subjectivity_label',
@@ -391,7 +400,7 @@ def display_subjectivity_analysis(df):
         fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
         st.plotly_chart(fig, use_container_width=True)
     else:
-        st.warning("No se encontraron datos de subjetividad para los filtros seleccionados.")
+        st.warning("No hay datos de subjetividad para mostrar con los filtros seleccionados. Asegúrate de que el scraper se haya ejecutado con la nueva versión.")
 
 # --- Geomapping Analysis ---
 def display_geomapping_analysis(df):
@@ -481,34 +490,18 @@ def display_echo_chamber_analysis(df):
     - **Grosor de la línea:** Mientras más gruesa la línea, más fuerte es la conexión (más temas/entidades en común).
     """ )
 
-    if df.empty or df['entities'].apply(len).sum() < 2:
+    if df.empty or df['entity_count'].sum() < 2:
         st.warning("No hay suficientes datos o entidades para generar este análisis.")
         return
 
     # --- Procesamiento de Datos para el Grafo ---
     source_connections = {}
     
-    # 1. Conexiones por Entidades
-    entity_to_sources = {}
-    for i, row in df.iterrows():
-        # Asegurarse de que 'entities' es una lista
-        entities_data = row['entities']
-        if not isinstance(entities_data, list):
-            entities_data = [] # O manejar el error de otra forma
-
-        entities = [e['text'] for e in entities_data]
-        source = row['source']
-        for entity in entities:
-            if entity not in entity_to_sources:
-                entity_to_sources[entity] = set()
-            entity_to_sources[entity].add(source)
+    # 1. Conexiones por Entidades: cantidad de entidades que mencionaron ambos medios (agregado en SQL)
+    for pair in medios_con_entidades_en_comun(df['id'].tolist()):
+        source_connections[(pair['source_a'], pair['source_b'])] = pair['shared_entities']
 
     from itertools import combinations
-    for entity, sources in entity_to_sources.items():
-        if len(sources) > 1:
-            for s1, s2 in combinations(sources, 2):
-                edge = tuple(sorted((s1, s2)))
-                source_connections[edge] = source_connections.get(edge, 0) + 1
 
     # 2. Conexiones por Tópicos
     topic_to_sources = {}
@@ -625,13 +618,14 @@ def display_narrative_arc_analysis(df):
     for _, row in story_df.iterrows():
         with st.expander(f"**{row['collection_date'].strftime('%Y-%m-%d %H:%M')}** - *{row['source']}*: {row['headline']}"):
             st.markdown(f"**Sentimiento:** {row['sentiment_label']} | **Tópico:** {row['topic']}")
-            if isinstance(row['entities'], list) and row['entities']:
-                entities_str = ", ".join([e['text'] for e in row['entities']][:5])
+            key_entities = contar_entidades([row['id']], limit=5)
+            if key_entities:
+                entities_str = ", ".join(entity['text'] for entity in key_entities)
                 st.markdown(f"**Entidades clave:** {entities_str}")
             st.markdown(f"[Leer artículo completo]({row['url']})")
 
 # --- Source Reliability Analysis ---
-def display_source_reliability_analysis(df):
+def display_source_reliability_analysis(filters):
     """
     Muestra un análisis de la confiabilidad de las fuentes basado en su objetividad.
     Calcula y muestra un "Índice de Objetividad" para cada medio.
@@ -643,16 +637,13 @@ def display_source_reliability_analysis(df):
     **Índice de Objetividad = (Artículos Objetivos / Total de Artículos Analizados) * 100**
     """)
 
-    if 'subjectivity_label' not in df.columns or df['subjectivity_label'].dropna().empty:
-        st.warning("No hay datos de subjetividad para generar este análisis. Asegúrate de que el scraper se haya ejecutado con la funcionalidad de análisis de subjetividad.")
-        return
-
-    # Calcular la proporción
-    objectivity_counts = df.groupby('source')['subjectivity_label'].value_counts(normalize=True).unstack(fill_value=0)
-    if 'OBJECTIVE' not in objectivity_counts.columns:
-        objectivity_counts['OBJECTIVE'] = 0 # Asegurarse de que la columna exista
-
-    objectivity_index = (objectivity_counts['OBJECTIVE'] * 100).sort_values(ascending=True).reset_index(name='Índice de Objetividad (%)')
+    # La proporción se calcula sobre los rollups (solo titulares con subjetividad analizada)
+    rollup_filters = _rollup_filters(filters)
+    if rollup_filters is not None:
+        objectivity_index = pd.DataFrame(indice_objetividad(**rollup_filters), columns=['source', 'objectivity', 'analyzed'])
+    else:
+        objectivity_index = get_analytics_store().objectivity_index(filters)
+    objectivity_index = objectivity_index.rename(columns={'objectivity': 'Índice de Objetividad (%)'})
 
     if not objectivity_index.empty:
         fig = px.bar(objectivity_index, 
@@ -666,10 +657,10 @@ def display_source_reliability_analysis(df):
         fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
         st.plotly_chart(fig, use_container_width=True)
     else:
-        st.warning("No se pudo calcular el Índice de Objetividad con los filtros actuales.")
+        st.warning("No hay datos de subjetividad para generar este análisis con los filtros actuales. Asegúrate de que el scraper se haya ejecutado con la funcionalidad de análisis de subjetividad.")
 
 # --- Blind Spot Analysis ---
-def display_blind_spot_analysis(df, all_sources_config):
+def display_blind_spot_analysis(filters, all_sources_config):
     """
     Muestra un análisis de "puntos ciegos" comparando la cobertura de tópicos
     entre medios locales e internacionales.
@@ -679,41 +670,31 @@ def display_blind_spot_analysis(df, all_sources_config):
     Este análisis compara los temas o entidades más cubiertos por medios internacionales con la cobertura que reciben en los medios locales.
     Permite identificar noticias o narrativas importantes a nivel global que podrían estar siendo ignoradas o subrepresentadas localmente.
     """)
+    store = get_analytics_store()
 
     # --- Controles de Usuario ---
     analysis_type = st.radio("Analizar por:", ("Tópicos", "Entidades"), horizontal=True)
     # Crear un mapeo de nombre de fuente a tipo
     source_to_type = {source['name']: source.get('type', 'local') for source in all_sources_config}
-    df['source_type'] = df['source'].map(source_to_type)
+    source_counts = store.counts('source', filters)
+    source_types = set(source_counts['source'].map(source_to_type)) if not source_counts.empty else set()
 
-    df_international = df[df['source_type'] == 'international']
-    df_local = df[df['source_type'] == 'local']
-
-    if df_international.empty:
+    if 'international' not in source_types:
         st.warning("No hay datos de medios internacionales para realizar el análisis. Asegúrate de seleccionar y ejecutar el scraper para fuentes internacionales.")
         return
     
-    if df_local.empty:
+    if 'local' not in source_types:
         st.warning("No hay datos de medios locales para la comparación.")
         return
 
     # --- Lógica de Análisis ---
-
-    top_items_international = pd.Series(dtype=float)
-    items_local = pd.Series(dtype=float)
-    column_name = ""
-    item_label = ""
+    # Top 10 de los medios internacionales y cobertura local de esos mismos ítems, en una sola consulta
 
     if analysis_type == "Tópicos":
-        column_name = 'topic'
         item_label = 'Tópico'
-        # 1. Encontrar los tópicos más importantes en medios internacionales
-        top_items_international = df_international[column_name].value_counts(normalize=True).nlargest(10)
-        # 2. Calcular la cobertura de esos mismos tópicos en medios locales
-        items_local = df_local[df_local[column_name].isin(top_items_international.index)][column_name].value_counts(normalize=True)
+        blind_spots = store.blind_spots(source_to_type, by='topic', filters=filters)
 
     elif analysis_type == "Entidades":
-        column_name = 'entity_text'
         item_label = 'Entidad'
 
         # Filtro adicional para tipo de entidad
@@ -724,40 +705,15 @@ def display_blind_spot_analysis(df, all_sources_config):
             default=entity_types_options,
             help="Selecciona los tipos de entidad a incluir en el análisis (PER: Persona, ORG: Organización, LOC: Lugar)."
         )
-        
-        # Función para aplanar la lista de entidades
-        def get_entities_df(df_source, types_to_include):
-            df_exploded = df_source.explode('entities').dropna(subset=['entities'])
-            if not df_exploded.empty:
-                # Extraer texto y etiqueta de la entidad
-                df_exploded['entity_text'] = df_exploded['entities'].apply(lambda e: e['text'])
-                df_exploded['entity_label'] = df_exploded['entities'].apply(lambda e: e['label'])
-                # Filtrar por los tipos de entidad seleccionados
-                return df_exploded[df_exploded['entity_label'].isin(types_to_include)]
-            return pd.DataFrame(columns=['entity_text', 'entity_label'])
-
-        df_international_entities = get_entities_df(df_international, selected_entity_types)
-        df_local_entities = get_entities_df(df_local, selected_entity_types)
-
-        if not df_international_entities.empty:
-            top_items_international = df_international_entities[column_name].value_counts(normalize=True).nlargest(10)
-        
-        if not df_local_entities.empty:
-            items_local = df_local_entities[df_local_entities[column_name].isin(top_items_international.index)][column_name].value_counts(normalize=True)
+        blind_spots = store.blind_spots(source_to_type, by='entity', labels=selected_entity_types, filters=filters) if selected_entity_types else pd.DataFrame()
     
     # --- Visualización ---
-    if top_items_international.empty:
+    if blind_spots.empty:
         st.warning(f"No se encontraron {analysis_type.lower()} en los medios internacionales con los filtros actuales.")
         return
 
     # 3. Combinar los datos para la visualización
-    # Crear un DataFrame de comparación robusto
-    comparison_df = pd.DataFrame({
-        item_label: top_items_international.index,
-        'Internacional': top_items_international.values * 100
-    })
-    # Mapear los valores locales, rellenando con 0 si no existen
-    comparison_df['Local'] = comparison_df[item_label].map(items_local * 100).fillna(0)
+    comparison_df = blind_spots.rename(columns={'item': item_label, 'international_pct': 'Internacional', 'local_pct': 'Local'})
 
     comparison_df_melted = comparison_df.melt(id_vars=item_label, var_name='Tipo de Cobertura', value_name='Porcentaje (%)')
 
@@ -840,4 +796,49 @@ def display_framing_analysis(df):
             fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
             st.plotly_chart(fig, use_container_width=True)
         else:
-            st.info(f"No se encontraron datos de encuadre para el tópico '{selected_topic}' con los filtros actuales.")
\ No newline at end of file
+            st.info(f"No se encontraron datos de encuadre para el tópico '{selected_topic}' con los filtros actuales.")
+
+def display_event_alerts(df_events):
+    """
+    Muestra las ráfagas de menciones (eventos de último momento) detectadas por event_detection.py
+    para entidades, tópicos e historias.
+    """
+    st.subheader("Alertas de Eventos")
+    st.info("""
+    Un evento se detecta cuando una entidad, un tópico o una historia recibe en una hora muchas más menciones
+    de lo habitual (z-score sobre la media móvil exponencial de las horas anteriores).
+    """)
+
+    if df_events.empty:
+        st.warning("No se detectaron eventos en la ventana seleccionada.")
+        return
+
+    kind_names = {"entity": "Entidad", "topic": "Tópico", "story": "Historia"}
+    df_events = df_events.copy()
+    df_events['tipo'] = df_events['kind'].map(kind_names)
+    df_events['nombre'] = df_events['story_headline'].where(df_events['kind'] == 'story', df_events['key']).fillna(df_events['key'])
+
+    selected_kinds = st.multiselect("Tipos de evento:", options=list(kind_names.values()), default=list(kind_names.values()))
+    df_events = df_events[df_events['tipo'].isin(selected_kinds)]
+    if df_events.empty:
+        st.warning("No hay eventos de los tipos seleccionados.")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Eventos detectados", len(df_events))
+    col2.metric("Series en ráfaga", df_events[['kind', 'key']].drop_duplicates().shape[0])
+    col3.metric("Z-score máximo", f"{df_events['zscore'].max():.1f}")
+
+    fig = px.scatter(df_events, x='bucket', y='zscore', size='count', color='tipo', hover_name='nombre',
+                     labels={'bucket': 'Hora', 'zscore': 'Z-score', 'count': 'Menciones', 'tipo': 'Tipo'},
+                     template="plotly_white")
+    fig.update_layout(margin=dict(l=0, r=0, t=40, b=0))
+    st.plotly_chart(fig, use_container_width=True)
+
+    st.dataframe(
+        df_events[['bucket', 'tipo', 'nombre', 'count', 'expected', 'zscore']].rename(columns={
+            'bucket': 'Hora', 'tipo': 'Tipo', 'nombre': 'Nombre', 'count': 'Menciones',
+            'expected': 'Esperado', 'zscore': 'Z-score'
+        }),
+        use_container_width=True, hide_index=True
+    )
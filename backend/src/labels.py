@@ -0,0 +1,9 @@
+# Etiquetas de los clasificadores zero-shot. Viven en un módulo propio, sin dependencias, para que la DB
+# y los agregados puedan usarlas sin cargar los modelos de NLP (y para evitar dependencias circulares).
+TOPIC_LABELS = [
+    "INSEGURIDAD", "ECONOMÍA", "INFLACIÓN", "DÓLAR", "POBREZA", 
+    "POLÍTICA", "CORRUPCIÓN", "JUSTICIA", "MEDIOS", "TRABAJO", 
+    "EDUCACIÓN", "SALUD", "PANDEMIA", "GÉNERO", "OTROS SOCIALES", 
+    "OTROS NO SOCIALES"
+]
+SUBJECTIVITY_LABELS = ["noticia objetiva", "artículo de opinión"]
@@ -0,0 +1,70 @@
+"""
+Prueba de carga de la API: N clientes concurrentes repiten peticiones GET contra uno o más endpoints
+y se informa el throughput y la latencia (p50/p95/p99) de cada uno.
+
+Uso (con la API levantada, p. ej. `uvicorn api:app --port 8001`):
+    python load_test.py --clients 50 --requests 2000 /api/headlines /api/headlines/source/Clarin /api/stats/summary
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+DEFAULT_PATHS = ["/api/headlines", "/api/quotes", "/api/stats/summary", "/api/events"]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+async def run_client(client, path, queue, latencies, errors):
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            response = await client.get(path)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+
+async def load_test(base_url, path, clients, requests):
+    """Ejecuta `requests` peticiones a `path` repartidas entre `clients` clientes concurrentes."""
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_client(client, path, queue, latencies, errors) for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+    return {
+        "path": path,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los endpoints de la API.")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_PATHS, help="Rutas a probar (por defecto: %(default)s)")
+    parser.add_argument("--url", default="http://localhost:8001", help="URL base de la API")
+    parser.add_argument("--clients", type=int, default=50, help="Clientes concurrentes")
+    parser.add_argument("--requests", type=int, default=1000, help="Peticiones por ruta")
+    args = parser.parse_args()
+
+    print(f"{'ruta':<40} {'peticiones':>10} {'errores':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for path in args.paths:
+        result = asyncio.run(load_test(args.url, path, args.clients, args.requests))
+        print(f"{result['path']:<40} {result['requests']:>10} {result['errors']:>8} {result['rps']:>9.1f} "
+              f"{result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+
+if __name__ == "__main__":
+    main()
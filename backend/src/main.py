@@ -54,6 +54,154 @@ def run_scraper_and_analysis():
         logger.error("No se pudo adquirir el bloqueo para el scraping. ¿Hay otro proceso en ejecución?")
     logger.info("Proceso de scraping y análisis completado.")
 
+def run_framing_backfill():
+    """Calcula el encuadre (framing) de todos los titulares existentes que aún no lo tienen."""
+    logger.info("Iniciando backfill de encuadres...")
+    try:
+        with lock.acquire(timeout=10):
+            from framing_analysis import run_framing_stage
+            classified = run_framing_stage()
+            print(f"✅ Backfill de encuadres completado: {classified} titulares clasificados.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para el backfill. ¿Hay otro proceso en ejecución?")
+
+def run_distillation(tasks):
+    """Entrena los clasificadores destilados y muestra su concordancia con el modelo zero-shot."""
+    from distillation import train_distilled_classifier, DISTILLATION_TASKS
+
+    for task in tasks:
+        if task not in DISTILLATION_TASKS:
+            print(f"❌ Tarea desconocida '{task}'. Opciones: {', '.join(DISTILLATION_TASKS)}")
+            continue
+        report = train_distilled_classifier(task, teacher_sample=16)
+        if report is None:
+            print(f"❌ No hay suficientes datos etiquetados para destilar '{task}'.")
+            continue
+
+        print(f"\n--- Clasificador destilado: {task} ---")
+        print(f"Titulares de entrenamiento: {report['n_samples']} ({report['n_labels']} etiquetas)")
+        print(f"Concordancia con el modelo zero-shot: {report['agreement']:.1%}")
+        print(f"Throughput destilado: {report['throughput']:.0f} titulares/s")
+        if report['teacher_throughput']:
+            speedup = report['throughput'] / report['teacher_throughput']
+            print(f"Throughput zero-shot: {report['teacher_throughput']:.1f} titulares/s (aceleración: {speedup:.0f}x)")
+        print(report['classification_report'])
+    print('Para usarlos, configura "classifiers": {"topic": "distilled", "subjectivity": "distilled"} en config.json.')
+
+def manage_embeddings(compact=False):
+    """
+    Completa el almacén de embeddings con los titulares que no tienen vector, opcionalmente lo compacta,
+    y actualiza el índice de búsqueda semántica.
+    """
+    try:
+        with lock.acquire(timeout=10):
+            from embedding_store import EmbeddingStore, sync_embeddings_from_db
+            from db import get_db_connection
+
+            store = EmbeddingStore()
+            added = sync_embeddings_from_db(store)
+            print(f"✅ Embeddings agregados: {added}. Total en el almacén: {len(store)}.")
+            if compact:
+                existing_ids = [row[0] for row in get_db_connection().execute("SELECT id FROM headlines")]
+                removed = store.compact(keep_ids=existing_ids)
+                print(f"✅ Almacén compactado: {removed} filas eliminadas, {len(store)} vectores.")
+
+            from ann_index import HeadlineIndex
+            indexed = HeadlineIndex(store).sync()
+            print(f"✅ Índice de búsqueda semántica actualizado: {indexed} filas nuevas indexadas.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para actualizar los embeddings. ¿Hay otro proceso en ejecución?")
+
+def run_events_rebuild():
+    """Reconstruye las series de menciones y los eventos detectados a partir de todo el historial."""
+    logger.info("Iniciando reconstrucción de eventos...")
+    try:
+        with lock.acquire(timeout=10):
+            from event_detection import rebuild_events
+            detected = rebuild_events()
+            print(f"✅ Eventos reconstruidos: {detected} ráfagas detectadas.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para la reconstrucción de eventos. ¿Hay otro proceso en ejecución?")
+
+def run_vacuum():
+    """Compacta la base de datos (VACUUM) e informa el tamaño antes y después."""
+    try:
+        with lock.acquire(timeout=10):
+            from db import compactar_db
+            sizes = compactar_db()
+            if sizes:
+                print(f"✅ Base de datos compactada: {sizes[0] / 1024 ** 2:.1f} MB -> {sizes[1] / 1024 ** 2:.1f} MB.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para compactar la base de datos. ¿Hay otro proceso en ejecución?")
+
+def manage_analytics(rebuild=False):
+    """Sincroniza (o reconstruye desde cero) el espejo analítico en Parquet que consulta el dashboard."""
+    try:
+        with lock.acquire(timeout=10):
+            from analytics_store import get_analytics_store
+            written = get_analytics_store().sync(full=rebuild)
+            print(f"✅ Espejo analítico {'reconstruido' if rebuild else 'actualizado'}: {written} titulares escritos.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para actualizar el espejo analítico. ¿Hay otro proceso en ejecución?")
+
+def run_rollups_rebuild():
+    """Recalcula la tabla de rollups (conteos por hora) a partir de todo el historial de titulares."""
+    try:
+        with lock.acquire(timeout=10):
+            from db import reconstruir_rollups
+            buckets = reconstruir_rollups()
+            print(f"✅ Rollups reconstruidos: {buckets} buckets.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para reconstruir los rollups. ¿Hay otro proceso en ejecución?")
+
+def manage_archive(args):
+    """
+    Archiva en Parquet los meses fuera de la ventana caliente ("retention" en config.json), o los meses
+    indicados ('AAAA-MM'). 'list' muestra los meses archivados y 'query "<SQL>"' consulta el archivo
+    (vistas archived_headlines y archived_quotes) sin restaurarlo.
+    """
+    import archive
+
+    if args[:1] == ["list"]:
+        for row in archive.list_archived_months():
+            print(f"{row['month']}: {row['headlines']} titulares, {row['quotes']} citas (archivado el {row['archived_at']})")
+        return
+    if args[:1] == ["query"]:
+        print(archive.query_archive(" ".join(args[1:])).to_string())
+        return
+    try:
+        with lock.acquire(timeout=10):
+            archived = {month: archive.archive_month(month) for month in args} if args else archive.archive_old_months()
+            for month, count in archived.items():
+                print(f"✅ {month}: {count} titulares archivados.")
+            if not archived:
+                print("No hay meses fuera de la ventana caliente para archivar.")
+            else:
+                print("Ejecutar 'python main.py vacuum' para devolver al disco el espacio liberado.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para archivar. ¿Hay otro proceso en ejecución?")
+
+def run_restore(months):
+    """Vuelve a cargar en la base de datos los meses archivados indicados ('AAAA-MM')."""
+    try:
+        with lock.acquire(timeout=10):
+            from archive import restore_month
+            for month in months:
+                print(f"✅ {month}: {restore_month(month)} titulares restaurados.")
+    except Timeout:
+        logger.error("No se pudo adquirir el bloqueo para restaurar. ¿Hay otro proceso en ejecución?")
+
+def run_scrape_worker(once=False):
+    """
+    Worker de scraping: ejecuta los trabajos que encola la API (POST /api/scrape), fuera del proceso web.
+    Con 'once', procesa los trabajos en cola y termina.
+    """
+    from scrape_jobs import run_worker
+    try:
+        run_worker(lock, once=once)
+    except KeyboardInterrupt:
+        logger.info("Worker de scraping detenido.")
+
 def manage_sources():
     """Muestra una interfaz de línea de comandos para activar/desactivar fuentes."""
     import json
@@ -109,6 +257,26 @@ if __name__ == "__main__":
         run_scraper_and_analysis()
     elif len(sys.argv) > 1 and sys.argv[1] == "sources":
         manage_sources()
+    elif len(sys.argv) > 1 and sys.argv[1] == "framing":
+        run_framing_backfill()
+    elif len(sys.argv) > 1 and sys.argv[1] == "embeddings":
+        manage_embeddings(compact="compact" in sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "events":
+        run_events_rebuild()
+    elif len(sys.argv) > 1 and sys.argv[1] == "vacuum":
+        run_vacuum()
+    elif len(sys.argv) > 1 and sys.argv[1] == "rollups":
+        run_rollups_rebuild()
+    elif len(sys.argv) > 1 and sys.argv[1] == "analytics":
+        manage_analytics(rebuild="rebuild" in sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "archive":
+        manage_archive(sys.argv[2:])
+    elif len(sys.argv) > 2 and sys.argv[1] == "restore":
+        run_restore(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "worker":
+        run_scrape_worker(once="once" in sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "distill":
+        run_distillation(sys.argv[2:] or ["topic", "subjectivity"])
     else:
         # Cierra la conexión a la base de datos del hilo principal antes de que Streamlit la use,
         # para evitar conflictos de concurrencia con la base de datos.
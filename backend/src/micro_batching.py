@@ -0,0 +1,140 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger
+
+class QueueFullError(Exception):
+    """Se lanza cuando la cola de micro-batching está llena (backpressure)."""
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes en lotes para ejecutar la inferencia de los modelos una sola vez por lote.
+
+    Cada petición se encola junto con un Future. Un worker asíncrono toma la primera petición de la cola
+    y espera como máximo `max_wait_ms` a que lleguen más (hasta `max_batch_size`). Luego ejecuta
+    `process_batch` en un hilo aparte para no bloquear el event loop, y resuelve los Futures con
+    los resultados en el mismo orden.
+    """
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=15, max_queue_size=256, request_timeout=10.0):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.request_timeout = request_timeout
+        # Un único hilo: los modelos se ejecutan de a un lote por vez.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="micro_batcher")
+        self._queue = None
+        self._worker = None
+        self._metrics = {
+            "requests": 0,
+            "rejected": 0,
+            "timeouts": 0,
+            "errors": 0,
+            "batches": 0,
+            "batched_items": 0,
+            "batch_size_histogram": {},
+            "last_batch_ms": None,
+            "total_batch_ms": 0.0,
+        }
+
+    def start(self):
+        """Inicia el worker en el event loop actual."""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Detiene el worker y libera el hilo de inferencia."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=False)
+
+    async def submit(self, item, timeout=None):
+        """
+        Encola un elemento y espera su resultado.
+        Lanza QueueFullError si la cola está llena y asyncio.TimeoutError si se supera el timeout.
+        """
+        self.start()
+        self._metrics["requests"] += 1
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((item, future))
+        except asyncio.QueueFull:
+            self._metrics["rejected"] += 1
+            raise QueueFullError("La cola de análisis está llena.")
+
+        try:
+            # Si vence el timeout, wait_for cancela el Future y el worker descarta el elemento.
+            return await asyncio.wait_for(future, timeout or self.request_timeout)
+        except asyncio.TimeoutError:
+            self._metrics["timeouts"] += 1
+            raise
+
+    async def _collect_batch(self):
+        """Espera el primer elemento y junta los que lleguen dentro de la ventana de latencia."""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Descartar las peticiones que ya vencieron mientras esperaban en la cola
+        return [(item, future) for item, future in batch if not future.done()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.process_batch, [item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                self._metrics["errors"] += 1
+                logger.error(f"Error al procesar un lote de {len(batch)} elementos.", exc_info=True)
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            histogram = self._metrics["batch_size_histogram"]
+            histogram[len(batch)] = histogram.get(len(batch), 0) + 1
+            self._metrics["batches"] += 1
+            self._metrics["batched_items"] += len(batch)
+            self._metrics["last_batch_ms"] = round(elapsed_ms, 2)
+            self._metrics["total_batch_ms"] += elapsed_ms
+
+    def metrics(self):
+        """Devuelve las métricas de la cola: profundidad, tamaños de lote y contadores."""
+        batches = self._metrics["batches"]
+        return {
+            "queue_depth": self._queue.qsize() if self._queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "requests": self._metrics["requests"],
+            "rejected": self._metrics["rejected"],
+            "timeouts": self._metrics["timeouts"],
+            "errors": self._metrics["errors"],
+            "batches": batches,
+            "avg_batch_size": round(self._metrics["batched_items"] / batches, 2) if batches else 0,
+            "avg_batch_ms": round(self._metrics["total_batch_ms"] / batches, 2) if batches else 0,
+            "last_batch_ms": self._metrics["last_batch_ms"],
+            "batch_size_histogram": dict(sorted(self._metrics["batch_size_histogram"].items())),
+        }
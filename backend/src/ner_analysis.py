@@ -1,4 +1,5 @@
 import re
+import bisect
 from analysis import analyzer
 from logger import logger
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
@@ -42,28 +43,68 @@ def geocode_location(location_name):
     analyzer.location_cache[location_name] = None # type: ignore
     return None
 
-def extract_quotes(text, entities):
-    """Extrae citas textuales del texto y las asocia con la entidad PER correcta."""
-    if not text or not analyzer:
+# Verbos de atribución: formas conjugadas (para el pre-filtro barato) y lemas (para el parser).
+ATTRIBUTION_VERBS = {"dijo", "afirmó", "aseguró", "sostuvo", "explicó", "señaló", "expresó", "consideró", "agregó"}
+ATTRIBUTION_LEMMAS = {"decir", "afirmar", "asegurar", "sostener", "explicar", "señalar", "expresar", "considerar", "agregar"}
+
+QUOTE_PATTERN = re.compile(r'["«“](.*?)[»”"]')
+# Raíces de los verbos de atribución, para detectarlos sin pasar por spaCy.
+ATTRIBUTION_PATTERN = re.compile(r'\b(dij|dic|afirm|asegur|sostuv|sostien|sosten|explic|señal|expres|consider|agreg)\w*', re.IGNORECASE)
+# Fin de oración: puntuación final seguida de espacio, o salto de línea.
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])\s+|\n+')
+MIN_QUOTE_LENGTH = 20
+
+def _sentence_bounds(text):
+    """Segmenta el texto con una regex y devuelve los offsets (inicio, fin) de cada oración."""
+    bounds = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        if match.start() > start:
+            bounds.append((start, match.start()))
+        start = match.end()
+    if start < len(text):
+        bounds.append((start, len(text)))
+    return bounds
+
+def _quote_windows(text):
+    """
+    Selecciona las ventanas de oraciones que contienen una cita y un verbo de atribución.
+    Devuelve una lista de (inicio, fin, [(inicio_cita, fin_cita), ...]) con offsets sobre el texto.
+    """
+    quotes = [(m.start(1), m.end(1)) for m in QUOTE_PATTERN.finditer(text)
+              if len(m.group(1).strip()) >= MIN_QUOTE_LENGTH]
+    if not quotes:
         return []
 
-    quote_pattern = re.compile(r'["«“](.*?)[»”"]')
-    found_quotes = []
-    doc = analyzer.entity_extractor(text) # type: ignore
-    attribution_verbs = {"dijo", "afirmó", "aseguró", "sostuvo", "explicó", "señaló", "expresó", "consideró", "agregó"}
+    bounds = _sentence_bounds(text)
+    starts = [b[0] for b in bounds]
+    windows = []
+    for q_start, q_end in quotes:
+        # La ventana cubre desde la oración donde abre la cita hasta la oración donde cierra.
+        first = max(bisect.bisect_right(starts, q_start) - 1, 0)
+        last = max(bisect.bisect_right(starts, max(q_end - 1, q_start)) - 1, first)
+        w_start, w_end = bounds[first][0], bounds[last][1]
+        if windows and w_start <= windows[-1][1]:
+            # Fusionar con la ventana anterior si se solapan (varias citas en la misma oración)
+            prev_start, prev_end, prev_quotes = windows[-1]
+            windows[-1] = (prev_start, max(prev_end, w_end), prev_quotes + [(q_start, q_end)])
+        else:
+            windows.append((w_start, w_end, [(q_start, q_end)]))
 
-    for match in quote_pattern.finditer(text):
-        quote_text = match.group(1).strip()
-        if len(quote_text) < 20:
-            continue
+    # Sin verbo de atribución en la ventana, el parser no va a encontrar a quién atribuir la cita.
+    return [w for w in windows if ATTRIBUTION_PATTERN.search(text, w[0], w[1])]
 
-        quote_span = doc.char_span(match.start(1), match.end(1))
+def _attribute_quotes(doc, window_start, text, quote_offsets):
+    """Atribuye las citas de una ventana ya procesada por spaCy usando análisis de dependencias."""
+    found_quotes = []
+    for q_start, q_end in quote_offsets:
+        quote_span = doc.char_span(q_start - window_start, q_end - window_start)
         if quote_span is None:
             continue
 
         closest_person = None
         head = quote_span.root.head
-        if head.lemma_ in attribution_verbs:
+        if head.lemma_ in ATTRIBUTION_LEMMAS or head.lower_ in ATTRIBUTION_VERBS:
             subjects = [child for child in head.children if child.dep_ == "nsubj"]
             if subjects:
                 subject = subjects[0]
@@ -71,8 +112,42 @@ def extract_quotes(text, entities):
                     if ent.label_ == "PER" and subject.i >= ent.start and subject.i < ent.end:
                         closest_person = ent.text
                         break
-        
+
         if closest_person:
-            found_quotes.append({"text": quote_text, "person": closest_person})
-    
-    return found_quotes
\ No newline at end of file
+            found_quotes.append({"text": text[q_start:q_end].strip(), "person": closest_person})
+    return found_quotes
+
+def extract_quotes_batch(texts, batch_size=32):
+    """
+    Extrae citas de varios textos, procesando con spaCy solo las oraciones que contienen
+    citas y verbos de atribución. Devuelve una lista de citas por cada texto de entrada.
+    """
+    results = [[] for _ in texts]
+    if not analyzer or not analyzer.entity_extractor:
+        return results
+
+    # 1. Segmentación barata y selección de ventanas candidatas
+    jobs = []
+    for text_idx, text in enumerate(texts):
+        if not text:
+            continue
+        for w_start, w_end, quote_offsets in _quote_windows(text):
+            jobs.append((text_idx, w_start, quote_offsets, text[w_start:w_end]))
+
+    if not jobs:
+        return results
+
+    # 2. Procesar todas las ventanas en lote con spaCy
+    try:
+        docs = analyzer.entity_extractor.pipe((job[3] for job in jobs), batch_size=batch_size)
+        for (text_idx, w_start, quote_offsets, _), doc in zip(jobs, docs):
+            results[text_idx].extend(_attribute_quotes(doc, w_start, texts[text_idx], quote_offsets))
+    except Exception:
+        logger.error(f"Error en la extracción de citas para un lote de {len(texts)} textos.", exc_info=True)
+    return results
+
+def extract_quotes(text, entities=None):
+    """Extrae citas textuales del texto y las asocia con la entidad PER correcta."""
+    if not text or not analyzer:
+        return []
+    return extract_quotes_batch([text])[0]
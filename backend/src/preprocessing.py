@@ -1,11 +1,11 @@
 import json
 from scraper import get_titulares_requests, get_titulares_selenium, filtrar_titulares, load_sources, get_article_content
 from sentiment_analysis import analyze_sentiment
-from ner_analysis import extract_entities, extract_quotes, geocode_location
+from ner_analysis import extract_entities, extract_quotes_batch, geocode_location
 from topic_modeling import classify_topic
 from bias_analysis import analyze_subjectivity
-from framing_analysis import summarize_text
-from db import guardar_titular_en_db, guardar_citas_en_db, close_db_connection
+from framing_analysis import summarize_text, run_framing_stage, precompute_daily_briefing
+from db import guardar_titular_en_db, insertar_titular, insertar_citas, close_db_connection, obtener_ids_por_url, obtener_analisis_titular, copiar_citas_de_canonicos, copiar_framing_de_canonicos, marcar_datos_modificados
 from logger import logger
 import os
 import concurrent.futures
@@ -13,57 +13,114 @@ from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 from story_clustering import StoryClusterer
+from embedding_store import EmbeddingStore
+from dedup import NearDuplicateDetector
+from event_detection import run_event_detection
+from analysis import analyzer
+from db_writer import DBWriter
+from scrape_jobs import JobProgress, JobCancelled
 
-def analyze_and_save_article(headline_data, source_name, story_id=None):
+def analyze_and_save_article(headline_data, source_name, story_id=None, article_text=None, reuse=None, writer=None):
     """
     Toma los datos de un titular, obtiene el contenido completo, lo analiza y lo guarda en la DB.
-    Devuelve True si el artículo era nuevo, False si era un duplicado.
+    Si el artículo es un casi-duplicado, `reuse` indica de qué artículos originales se reutilizan los análisis:
+    {"headline_from": ID del titular original, "body_from": ID del artículo original, "canonical_id": ID a enlazar}.
+    Si se pasa un `writer` (DBWriter), el titular se guarda a través de él, agrupado con los de otros hilos.
+    Devuelve una tupla (was_new, headline_id, article_text); was_new es False si era un duplicado.
     """
     headline, url = headline_data
+    reuse = reuse or {}
     
-    # 1. Obtener contenido del artículo
-    article_text = get_article_content(url)
+    # 1. Obtener contenido del artículo (si no se descargó antes)
+    if article_text is None:
+        article_text = get_article_content(url)
     
-    # 2. Generar análisis del titular
-    sentiment = analyze_sentiment(headline)
-    entities = extract_entities(headline)
-    topic = classify_topic(headline)
-    subjectivity = analyze_subjectivity(headline)
-    summary = summarize_text(article_text) if article_text else "No se pudo generar un resumen."
-    
-    # 2.5. Geocodificar la primera ubicación encontrada
-    latitude, longitude = None, None
-    if entities:
-        for entity in entities:
-            if entity['label'] == 'LOC':
-                location_data = geocode_location(entity['text'])
-                if location_data:
-                    latitude, longitude = location_data['latitude'], location_data['longitude']
-                    break # Nos quedamos con la primera ubicación encontrada
+    # 2. Generar análisis del titular, o reutilizar los del titular original si es un casi-duplicado
+    original = obtener_analisis_titular(reuse['headline_from']) if reuse.get('headline_from') else None
+    if original:
+        sentiment = {'label': original['sentiment_label'], 'score': original['sentiment_score']} if original['sentiment_label'] else None
+        entities = json.loads(original['entities']) if original['entities'] else []
+        topic = original['topic']
+        subjectivity = {'label': original['subjectivity_label'], 'score': original['subjectivity_score']} if original['subjectivity_label'] else None
+        latitude, longitude = original['latitude'], original['longitude']
+    else:
+        sentiment = analyze_sentiment(headline)
+        entities = extract_entities(headline)
+        topic = classify_topic(headline)
+        subjectivity = analyze_subjectivity(headline)
 
-    # 3. Guardar el artículo principal y obtener su ID y si era nuevo
-    headline_id, was_new = guardar_titular_en_db(
-        source_name, headline, url, sentiment, entities, topic, summary, 
-        article_text, subjectivity, latitude, longitude, story_id=story_id
-    )
+        # 2.5. Geocodificar la primera ubicación encontrada
+        latitude, longitude = None, None
+        if entities:
+            for entity in entities:
+                if entity['label'] == 'LOC':
+                    location_data = geocode_location(entity['text'])
+                    if location_data:
+                        latitude, longitude = location_data['latitude'], location_data['longitude']
+                        break # Nos quedamos con la primera ubicación encontrada
 
-    # 4. Extraer y guardar citas del texto completo solo si el artículo es nuevo
-    if article_text and headline_id and was_new:
-        full_text_entities = extract_entities(article_text)
-        quotes = extract_quotes(article_text, full_text_entities)
-        guardar_citas_en_db(headline_id, quotes)
+    # El resumen depende solo del cuerpo: se reutiliza si el cuerpo es copia de otro artículo
+    original_body = obtener_analisis_titular(reuse['body_from']) if reuse.get('body_from') else None
+    if original_body:
+        summary = original_body['summary']
+    else:
+        summary = summarize_text(article_text) if article_text else "No se pudo generar un resumen."
 
-    # 5. Cerrar la conexión de este hilo específico al terminar.
+    # 3. Guardar el artículo principal y obtener su ID y si era nuevo
+    args = (source_name, headline, url, sentiment, entities, topic, summary,
+            article_text, subjectivity, latitude, longitude, story_id, reuse.get('canonical_id'))
+    if writer is not None:
+        # Se espera al COMMIT del lote: el ID se necesita para las citas y los embeddings
+        headline_id, was_new = writer.write(insertar_titular, *args)
+    else:
+        headline_id, was_new = guardar_titular_en_db(*args)
+
+    # 4. Cerrar la conexión de este hilo específico al terminar (la usan las lecturas de los originales).
+    # Las citas se extraen después, en una etapa independiente (ver run_quote_stage).
     close_db_connection()
     
-    return was_new
+    return was_new, headline_id, article_text
+
+def run_quote_stage(new_articles, batch_size=16):
+    """
+    Etapa independiente de extracción de citas sobre los artículos nuevos.
+    Recibe una lista de tuplas (headline_id, article_text) y procesa los textos en lotes.
+    Las citas se guardan a través de un DBWriter, así que la escritura de un lote se solapa con la
+    extracción del siguiente.
+    """
+    articles = [(headline_id, text) for headline_id, text in new_articles if headline_id and text]
+    if not articles:
+        return 0
+
+    logger.info(f"Extrayendo citas de {len(articles)} artículos nuevos...")
+    futures = []
+    with DBWriter() as writer:
+        for i in range(0, len(articles), batch_size):
+            batch = articles[i:i + batch_size]
+            quotes_per_article = extract_quotes_batch([text for _, text in batch])
+            for (headline_id, _), quotes in zip(batch, quotes_per_article):
+                futures.append(writer.submit(insertar_citas, headline_id, quotes))
+    # Al salir del bloque el escritor ya confirmó todas las citas
+    total_quotes = 0
+    for future in futures:
+        try:
+            total_quotes += future.result()
+        except Exception as e:
+            logger.error(f"Error al guardar citas en SQLite: {e}")
+    logger.info(f"Extracción de citas completada: {total_quotes} citas guardadas.")
+    return total_quotes
 
-def run_full_process(source_names_to_process: list = None):
+def run_full_process(source_names_to_process: list = None, progress: JobProgress = None):
     """
     Orquesta el proceso completo de scraping, análisis y clustering de historias.
     Acepta una lista opcional de nombres de fuentes para procesar. Si la lista está vacía, no hace nada.
+    Con `progress` (un trabajo de scraping, ver scrape_jobs.py) registra la etapa y los contadores.
+    Si se pide cancelar el trabajo, se deja de recolectar, descargar y lanzar análisis nuevos; los
+    artículos ya guardados pasan igual por las etapas posteriores (citas, embeddings, framing...) y
+    recién entonces se lanza JobCancelled.
     Devuelve el número de artículos nuevos que se han añadido.
     """
+    progress = progress or JobProgress()
     all_available_sources = load_sources(active_only=False)
     
     if source_names_to_process:
@@ -92,7 +149,9 @@ def run_full_process(source_names_to_process: list = None):
             selenium_driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
 
         # 1. Recolectar todos los titulares
+        progress.stage("collecting")
         for source_config in sources:
+            progress.check_cancelled()
             print(f"📰 Obteniendo titulares de: {source_config['name']}")
             if source_config['method'] == 'selenium' and selenium_driver:
                 titulares = get_titulares_selenium(source_config['url'], selenium_driver, source_config['selector'])
@@ -106,6 +165,7 @@ def run_full_process(source_names_to_process: list = None):
             
             for data in titulares_filtrados:
                 all_tasks.append({'data': data, 'source_name': source_config['name']})
+            progress.add('collected', len(titulares_filtrados))
 
     finally:
         if selenium_driver:
@@ -116,39 +176,192 @@ def run_full_process(source_names_to_process: list = None):
         logger.warning("No se encontraron titulares en ninguna fuente. El proceso de análisis se detiene.")
         return 0
 
+    # --- Descartar titulares ya guardados ---
+    # Un artículo cuya URL ya está en la DB no se vuelve a analizar ni a agrupar.
+    existing_ids = obtener_ids_por_url([task['data'][1] for task in all_tasks])
+    close_db_connection()
+    if existing_ids:
+        logger.info(f"Omitiendo {len(existing_ids)} titulares que ya están en la base de datos.")
+        all_tasks = [task for task in all_tasks if task['data'][1] not in existing_ids]
+    if not all_tasks:
+        logger.info("No hay titulares nuevos para analizar.")
+        return 0
+
     # --- Clustering de Historias ---
+    progress.stage("clustering")
+    progress.check_cancelled()
     logger.info("Iniciando clustering de historias...")
     headlines = [task['data'][0] for task in all_tasks]
     
     clusterer = StoryClusterer()
     if clusterer.model:
-        stories = clusterer.cluster_stories(headlines)
+        # Los embeddings se calculan una sola vez y se guardan en el EmbeddingStore al final
+        embeddings = clusterer.encode(headlines)
+        # Clustering incremental: los story_id son estables entre corridas (ver "story_clustering" en config.json)
+        clustering_config = analyzer.config.get("story_clustering", {})
+        story_ids = clusterer.assign_stories(
+            headlines,
+            min_community_size=clustering_config.get("min_community_size", 2),
+            threshold=clustering_config.get("threshold", 0.75),
+            window_days=clustering_config.get("window_days", 3),
+            embeddings=embeddings
+        )
+        close_db_connection()
         
-        # Asignar un story_id a cada titular
-        headline_idx_to_story_id = {}
-        for story_idx, story_cluster in enumerate(stories):
-            story_id = story_idx + 1 # Empezar IDs desde 1
-            for headline_idx in story_cluster:
-                headline_idx_to_story_id[headline_idx] = story_id
-        
-        # Añadir el story_id a cada tarea
-        for i, task in enumerate(all_tasks):
-            task['story_id'] = headline_idx_to_story_id.get(i) # Devuelve None si no está en un clúster
+        # Añadir el story_id (None si no pertenece a ninguna historia) y el embedding a cada tarea
+        for task, story_id, embedding in zip(all_tasks, story_ids, embeddings):
+            task['story_id'] = story_id
+            task['embedding'] = embedding
+
+    # 2. Descargar el cuerpo de los artículos en paralelo (solo E/S de red)
+    progress.stage("fetching")
+    progress.check_cancelled()
+    def fetch(url):
+        if progress.cancel_requested():
+            return None
+        body = get_article_content(url)
+        progress.add('fetched')
+        return body
+    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+        bodies = list(executor.map(fetch, [task['data'][1] for task in all_tasks]))
+    # Último punto en el que se puede cancelar sin dejar artículos guardados a medio procesar
+    progress.check_cancelled()
 
+    # 2.1. Detectar casi-duplicados (copias de agencias, reescrituras leves) antes de las etapas costosas
+    dedup_config = analyzer.config.get("deduplication", {})
+    detector = NearDuplicateDetector(
+        body_threshold=dedup_config.get("body_threshold", 0.8),
+        headline_threshold=dedup_config.get("headline_threshold", 0.85)
+    )
+    checks = detector.check([(task['data'][0], body) for task, body in zip(all_tasks, bodies)])
+    close_db_connection()
+
+    # Los casi-duplicados de otro artículo del mismo lote se procesan en una segunda ronda,
+    # cuando el original ya está guardado y sus análisis se pueden reutilizar.
+    saved_ids = {} # índice de tarea -> headline_id
+    def resolve(ref):
+        if ref is None:
+            return None
+        kind, value = ref
+        return value if kind == "db" else saved_ids.get(value)
+
+    in_batch_copies = {i for i, check in enumerate(checks) if any(ref and ref[0] == "batch" for ref in (check['body_match'], check['headline_match']))}
+    first_round = [i for i in range(len(all_tasks)) if i not in in_batch_copies]
+    second_round = sorted(in_batch_copies)
+
+    progress.stage("analyzing")
     logger.info(f"Analizando un total de {len(all_tasks)} artículos en paralelo...")
     
-    new_articles_count = 0
-    # 2. Procesar todos los artículos en un único pool de hilos
-    with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-        # Modificar la llamada para pasar el story_id
-        futures = [executor.submit(analyze_and_save_article, task['data'], task['source_name'], task.get('story_id')) for task in all_tasks]
-        
-        for future in concurrent.futures.as_completed(futures):
-            try:
-                was_new = future.result()
-                if was_new:
-                    new_articles_count += 1
-            except Exception:
-                logger.exception("Una tarea de análisis generó una excepción no controlada.")
-                
-    return new_articles_count
\ No newline at end of file
+    new_articles = []
+    new_embeddings = []
+    quote_copies, framing_copies = [], [] # tuplas (headline_id, id del original)
+    # Un único escritor para la DB: los titulares de todos los hilos se guardan en pocas transacciones
+    writer = DBWriter()
+    try:
+        for round_indices in (first_round, second_round):
+            if not round_indices or progress.cancel_requested(force=True):
+                continue
+            # 2.2. Procesar los artículos de la ronda en un único pool de hilos
+            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+                futures = {}
+                for i in round_indices:
+                    task = all_tasks[i]
+                    reuse = {"headline_from": resolve(checks[i]['headline_match']), "body_from": resolve(checks[i]['body_match'])}
+                    # Se enlaza al original del cuerpo; sin cuerpo, al del titular
+                    reuse['canonical_id'] = reuse['body_from'] or (reuse['headline_from'] if not bodies[i] else None)
+                    future = executor.submit(analyze_and_save_article, task['data'], task['source_name'], task.get('story_id'), bodies[i], reuse, writer)
+                    futures[future] = (i, reuse)
+            
+                for future in concurrent.futures.as_completed(futures):
+                    if progress.cancel_requested():
+                        # Los artículos que ya se están analizando terminan y se guardan; el resto no empieza
+                        for pending in futures:
+                            pending.cancel()
+                    if future.cancelled():
+                        continue
+                    i, reuse = futures[future]
+                    try:
+                        was_new, headline_id, article_text = future.result()
+                        progress.add('analyzed')
+                        if was_new:
+                            progress.add('saved')
+                            saved_ids[i] = headline_id
+                            new_articles.append((headline_id, article_text))
+                            if reuse['body_from']:
+                                quote_copies.append((headline_id, reuse['body_from']))
+                            if reuse['headline_from']:
+                                framing_copies.append((headline_id, reuse['headline_from']))
+                            if all_tasks[i].get('embedding') is not None:
+                                new_embeddings.append((headline_id, all_tasks[i]['embedding']))
+                    except Exception:
+                        logger.exception("Una tarea de análisis generó una excepción no controlada.")
+    finally:
+        # Confirma las escrituras pendientes antes de continuar con las etapas que leen la DB
+        writer.close()
+
+    # 2.3. Registrar en el índice de casi-duplicados los artículos originales guardados
+    try:
+        detector.register([(headline_id, checks[i]) for i, headline_id in saved_ids.items()])
+        close_db_connection()
+    except Exception:
+        logger.exception("No se pudieron registrar las firmas de casi-duplicados.")
+
+    # 2.5. Guardar los embeddings de los titulares nuevos
+    if new_embeddings:
+        try:
+            store = EmbeddingStore()
+            store.append([hid for hid, _ in new_embeddings], [vec for _, vec in new_embeddings])
+            # El índice de búsqueda semántica se guarda acá (con el bloqueo de la DB) y no en la API
+            from ann_index import HeadlineIndex
+            HeadlineIndex(store).sync()
+        except Exception:
+            logger.exception("No se pudieron guardar los embeddings de los titulares nuevos.")
+
+    # 2.4. Actualizar las series de menciones y detectar ráfagas (eventos de último momento)
+    try:
+        run_event_detection([headline_id for headline_id, _ in new_articles])
+        close_db_connection()
+    except Exception:
+        logger.exception("La detección de eventos generó una excepción no controlada.")
+
+    # 3. Extraer citas de los artículos nuevos (las copias reciben las citas de su original)
+    progress.stage("quotes")
+    copied_bodies = {headline_id for headline_id, _ in quote_copies}
+    try:
+        run_quote_stage([article for article in new_articles if article[0] not in copied_bodies])
+        copiar_citas_de_canonicos(quote_copies)
+        close_db_connection()
+    except Exception:
+        logger.exception("La etapa de extracción de citas generó una excepción no controlada.")
+
+    # 4. Clasificar el encuadre de los titulares nuevos (las copias reciben el encuadre de su original)
+    progress.stage("framing")
+    copied_headlines = {headline_id for headline_id, _ in framing_copies}
+    try:
+        run_framing_stage([headline_id for headline_id, _ in new_articles if headline_id not in copied_headlines])
+        copiar_framing_de_canonicos(framing_copies)
+        close_db_connection()
+    except Exception:
+        logger.exception("La etapa de framing generó una excepción no controlada.")
+
+    # 5. Precalcular el briefing del día (opcional, ver "briefing" en config.json)
+    if new_articles and analyzer.config.get("briefing", {}).get("precompute_after_ingest", False):
+        try:
+            precompute_daily_briefing()
+            close_db_connection()
+        except Exception:
+            logger.exception("El precálculo del briefing del día generó una excepción no controlada.")
+
+    # 6. Actualizar el espejo analítico del dashboard (solo las particiones de los días afectados)
+    progress.stage("finishing")
+    try:
+        from analytics_store import get_analytics_store
+        get_analytics_store().sync(refresh_days=analyzer.config.get("analytics", {}).get("refresh_days", 3))
+    except Exception:
+        logger.exception("La sincronización del espejo analítico generó una excepción no controlada.")
+
+    # Las respuestas cacheadas de la API (titulares, historias, eventos...) dejan de ser válidas
+    marcar_datos_modificados()
+    if progress.cancel_requested(force=True):
+        raise JobCancelled(f"Trabajo de scraping {progress.job_id} cancelado tras guardar {len(new_articles)} artículos nuevos.")
+    return len(new_articles)
\ No newline at end of file
@@ -0,0 +1,58 @@
+import hashlib
+from collections import OrderedDict
+
+class ResponseCache:
+    """
+    Caché en memoria (LRU) de los cuerpos de las respuestas GET de la API, por versión de los datos.
+
+    La clave de cada respuesta es su ETag: un hash de la versión de los datos, la ruta y los parámetros
+    de la query. Mientras no se confirme una escritura, la misma petición produce el mismo ETag, así que
+    un cliente que envía `If-None-Match` recibe un 304 sin que se ejecute el endpoint, y uno que no lo
+    envía recibe el cuerpo guardado. Cuando cambia la versión, el contenido anterior ya no se puede
+    pedir y se descarta entero.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # ETag -> (media_type, cuerpo)
+        self._version = None
+        self._metrics = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    @staticmethod
+    def etag(version, path, query_params):
+        """ETag de una petición. Los parámetros se ordenan: '?a=1&b=2' y '?b=2&a=1' comparten entrada."""
+        key = "\n".join([version, path] + [f"{name}={value}" for name, value in sorted(query_params)])
+        return f'"{hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()}"'
+
+    @staticmethod
+    def matches(if_none_match, etag):
+        """True si la cabecera If-None-Match incluye el ETag (o es '*')."""
+        candidates = [candidate.strip().removeprefix("W/") for candidate in (if_none_match or "").split(",")]
+        return "*" in candidates or etag in candidates
+
+    def get(self, version, etag):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+        entry = self._entries.get(etag)
+        if entry is None:
+            self._metrics["misses"] += 1
+            return None
+        self._entries.move_to_end(etag)
+        self._metrics["hits"] += 1
+        return entry
+
+    def put(self, version, etag, media_type, body):
+        if version != self._version:
+            # La versión cambió mientras se calculaba la respuesta: no se guarda un cuerpo que puede ser viejo
+            return
+        self._entries[etag] = (media_type, body)
+        self._entries.move_to_end(etag)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def record_not_modified(self):
+        self._metrics["not_modified"] += 1
+
+    def metrics(self):
+        return {**self._metrics, "entries": len(self._entries), "version": self._version}
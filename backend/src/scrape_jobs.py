@@ -0,0 +1,116 @@
+import os
+import socket
+import threading
+import time
+import db
+from logger import logger
+
+class JobCancelled(Exception):
+    """Se lanza dentro de run_full_process cuando se pidió cancelar el trabajo en curso."""
+
+class JobProgress:
+    """
+    Progreso de un trabajo de scraping: la etapa actual y los contadores collected (titulares
+    recolectados), fetched (cuerpos descargados), analyzed (artículos analizados) y saved (titulares
+    nuevos guardados). Los hilos de análisis lo actualizan a la vez, así que los contadores se acumulan
+    en memoria y se escriben en scrape_jobs como mucho cada `flush_interval` segundos.
+
+    Con job_id=None no escribe nada ni se cancela nunca: es el progreso de una corrida sin trabajo
+    (`python main.py scrape`).
+    """
+
+    COUNTERS = ('collected', 'fetched', 'analyzed', 'saved')
+
+    def __init__(self, job_id=None, flush_interval=1.0):
+        self.job_id = job_id
+        self.flush_interval = flush_interval
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.current_stage = None
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        self._last_cancel_check = 0.0
+        self._cancelled = False
+
+    def stage(self, name):
+        """Pasa a la etapa `name` (se guarda en el acto). No comprueba la cancelación: ver check_cancelled."""
+        with self._lock:
+            self.current_stage = name
+        self.flush(force=True)
+
+    def add(self, counter, n=1):
+        with self._lock:
+            self.counts[counter] += n
+        self.flush()
+
+    def flush(self, force=False):
+        if self.job_id is None:
+            return
+        with self._lock:
+            if not force and time.monotonic() - self._last_flush < self.flush_interval:
+                return
+            self._last_flush = time.monotonic()
+            progress = {'stage': self.current_stage, **self.counts}
+        try:
+            db.actualizar_trabajo_scrape(self.job_id, **progress)
+        except Exception:
+            logger.exception(f"No se pudo guardar el progreso del trabajo de scraping {self.job_id}.")
+
+    def cancel_requested(self, force=False):
+        """True si se pidió cancelar el trabajo (se consulta la DB como mucho cada `flush_interval` segundos)."""
+        if self.job_id is None or self._cancelled:
+            return self._cancelled
+        if force or time.monotonic() - self._last_cancel_check >= self.flush_interval:
+            self._last_cancel_check = time.monotonic()
+            self._cancelled = db.cancelacion_solicitada(self.job_id)
+        return self._cancelled
+
+    def check_cancelled(self, force=True):
+        """
+        Lanza JobCancelled si se pidió cancelar el trabajo. Solo antes de guardar artículos: una vez
+        guardados, tienen que pasar por las etapas posteriores (ver run_full_process).
+        """
+        if self.cancel_requested(force):
+            raise JobCancelled(f"Trabajo de scraping {self.job_id} cancelado.")
+
+def run_job(job):
+    """Ejecuta un trabajo tomado de la cola y registra cómo terminó. Devuelve su estado final."""
+    from preprocessing import run_full_process # Importación diferida: carga los modelos de NLP
+    progress = JobProgress(job['id'])
+    logger.info(f"Iniciando el trabajo de scraping {job['id']}...")
+    try:
+        saved = run_full_process(job['sources'], progress=progress)
+        status, error = 'succeeded', None
+        logger.info(f"Trabajo de scraping {job['id']} completado: {saved} artículos nuevos.")
+    except JobCancelled:
+        status, error = 'cancelled', None
+        logger.info(f"Trabajo de scraping {job['id']} cancelado.")
+    except Exception as e:
+        status, error = 'failed', str(e)
+        logger.exception(f"El trabajo de scraping {job['id']} falló.")
+    finally:
+        progress.flush(force=True)
+        db.close_db_connection()
+    db.finalizar_trabajo_scrape(job['id'], status, error)
+    return status
+
+def run_worker(lock, poll_interval=2.0, once=False):
+    """
+    Bucle del worker: toma los trabajos en cola de a uno y los ejecuta, cada uno con el bloqueo de la DB
+    (el mismo de `python main.py scrape`, así que no se solapan). Con `once`, termina cuando la cola se vacía.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Worker de scraping {worker} esperando trabajos...")
+    while True:
+        with lock:
+            # Con el bloqueo tomado ningún trabajo puede estar ejecutándose: uno que figura 'running'
+            # quedó así porque su worker se detuvo
+            interrupted = db.marcar_trabajos_interrumpidos()
+            if interrupted:
+                logger.warning(f"{interrupted} trabajos de scraping interrumpidos se marcaron como fallidos.")
+            job = db.tomar_trabajo_scrape(worker)
+            if job is not None:
+                run_job(job)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
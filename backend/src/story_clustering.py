@@ -1,6 +1,49 @@
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from blocked_clustering import blocked_community_detection
+from db import cargar_historias_activas, guardar_historias
 from logger import logger
 
+class CentroidIndex:
+    """
+    Índice de vecino más cercano sobre los centroides (normalizados) de las historias activas.
+    Como solo contiene las historias dentro de la ventana de expiración, su tamaño está acotado
+    y una búsqueda exacta por producto interno es suficiente. Los centroides se guardan en un buffer
+    preasignado que duplica su capacidad al llenarse, así agregar una historia no copia la matriz entera.
+    """
+    def __init__(self, dim, capacity=64):
+        self.ids = []
+        self._buffer = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+
+    @property
+    def vectors(self):
+        return self._buffer[:len(self.ids)]
+
+    def add(self, story_id, centroid):
+        position = len(self.ids)
+        if position == len(self._buffer):
+            grown = np.zeros((2 * len(self._buffer), self._buffer.shape[1]), dtype=np.float32)
+            grown[:position] = self._buffer
+            self._buffer = grown
+        self._buffer[position] = _normalize(centroid)
+        self.ids.append(story_id)
+        return position
+
+    def update(self, position, centroid):
+        self._buffer[position] = _normalize(centroid)
+
+    def nearest(self, query):
+        """Devuelve (posición, similitud de coseno) de la historia más cercana, o (None, -1.0) si está vacío."""
+        if not self.ids:
+            return None, -1.0
+        similarities = self.vectors @ _normalize(query)
+        position = int(similarities.argmax())
+        return position, float(similarities[position])
+
+def _normalize(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
 class StoryClusterer:
     """
     Una clase para agrupar artículos de noticias en "historias" basadas en la similitud semántica de sus titulares.
@@ -35,11 +78,12 @@ class StoryClusterer:
 
         try:
             logger.info(f"Generando embeddings para {len(headlines)} titulares...")
-            corpus_embeddings = self.model.encode(headlines, convert_to_tensor=True, show_progress_bar=True)
+            corpus_embeddings = self.encode(headlines)
             logger.info("Embeddings generados. Realizando clustering...")
 
-            # Usar community detection, que es rápido y efectivo para este tipo de tarea.
-            clusters = util.community_detection(corpus_embeddings, min_community_size=min_community_size, threshold=threshold)
+            # Community detection por bloques: mismo resultado que util.community_detection,
+            # pero con memoria acotada, lo que permite reagrupar backfills de 100k+ titulares.
+            clusters = blocked_community_detection(corpus_embeddings, min_community_size=min_community_size, threshold=threshold)
             
             logger.info(f"Clustering completado. Se encontraron {len(clusters)} historias.")
             return clusters
@@ -47,6 +91,90 @@ class StoryClusterer:
             logger.error(f"Error durante el proceso de clustering: {e}", exc_info=True)
             return []
 
+    def encode(self, headlines):
+        """Devuelve los embeddings normalizados (numpy float32) de una lista de titulares."""
+        return self.model.encode(headlines, convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=True)
+
+    def assign_stories(self, headlines, min_community_size=2, threshold=0.75, window_days=3, embeddings=None):
+        """
+        Asigna a cada titular un story_id estable entre corridas (clustering incremental).
+
+        1. Agrupa los titulares nuevos entre sí con community detection.
+        2. Cada grupo (y luego cada titular suelto) se compara con los centroides de las historias
+           activas (vistas en los últimos `window_days` días). Si la similitud supera el umbral, se une
+           a esa historia y se actualiza su centroide; si no, los grupos crean una historia nueva.
+        3. Las historias que no reciben titulares durante la ventana expiran y dejan de cargarse.
+
+        El costo es proporcional a los titulares nuevos: solo se codifican ellos y el índice contiene
+        únicamente las historias activas. Se pueden pasar `embeddings` ya calculados (por ejemplo,
+        leídos del EmbeddingStore) para no volver a ejecutar el encoder.
+
+        Returns:
+            list of (int or None): El story_id de cada titular, o None si no pertenece a ninguna historia.
+        """
+        if not self.model or not headlines:
+            return [None] * len(headlines)
+
+        try:
+            if embeddings is None:
+                logger.info(f"Generando embeddings para {len(headlines)} titulares...")
+                embeddings = self.encode(headlines)
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            communities = blocked_community_detection(embeddings, min_community_size=min_community_size, threshold=threshold)
+
+            grouped = {idx for community in communities for idx in community}
+            groups = [list(community) for community in communities] + [[i] for i in range(len(headlines)) if i not in grouped]
+
+            # Cargar las historias activas en el índice, con lugar para las que se creen en esta corrida
+            active = cargar_historias_activas(window_days)
+            index = CentroidIndex(embeddings.shape[1], capacity=len(active) + len(groups))
+            stories = {} # posición en el índice -> [story_id, centroide (media), tamaño]
+            for row in active:
+                centroid = np.frombuffer(row['centroid'], dtype=np.float32).copy()
+                stories[index.add(row['id'], centroid)] = [row['id'], centroid, row['size']]
+            logger.info(f"Historias activas en los últimos {window_days} días: {len(stories)}.")
+
+            assignments = [None] * len(headlines)
+            changed_positions = set()
+            new_members = {} # posición en el índice de cada historia nueva -> índices de sus titulares
+            for group in groups:
+                group_centroid = embeddings[group].mean(axis=0)
+                position, similarity = index.nearest(group_centroid)
+
+                if position is not None and similarity >= threshold:
+                    # Unir el grupo a la historia existente y actualizar su centroide (media incremental)
+                    story = stories[position]
+                    story[1] = (story[1] * story[2] + embeddings[group].sum(axis=0)) / (story[2] + len(group))
+                    story[2] += len(group)
+                    index.update(position, story[1])
+                    changed_positions.add(position)
+                    if story[0] is None: # Historia creada en esta misma corrida
+                        new_members[position].extend(group)
+                    else:
+                        for i in group:
+                            assignments[i] = story[0]
+                elif len(group) >= min_community_size:
+                    # Historia nueva: se agrega al índice para que los titulares siguientes puedan unirse
+                    position = index.add(None, group_centroid)
+                    stories[position] = [None, group_centroid, len(group)]
+                    new_members[position] = list(group)
+
+            # Persistir centroides y obtener los IDs de las historias nuevas
+            updated = [(stories[p][0], stories[p][1].astype(np.float32).tobytes(), stories[p][2])
+                       for p in changed_positions if p not in new_members]
+            created = [(headlines[members[0]], stories[p][1].astype(np.float32).tobytes(), stories[p][2])
+                       for p, members in new_members.items()]
+            new_ids = guardar_historias(updated, created)
+            for members, story_id in zip(new_members.values(), new_ids):
+                for i in members:
+                    assignments[i] = story_id
+
+            logger.info(f"Clustering incremental completado: {len(updated)} historias actualizadas, {len(new_ids)} historias nuevas.")
+            return assignments
+        except Exception as e:
+            logger.error(f"Error durante el clustering incremental: {e}", exc_info=True)
+            return [None] * len(headlines)
+
 # --- Bloque de prueba ---
 if __name__ == '__main__':
     print("🚀 Probando el StoryClusterer...")
@@ -2,11 +2,24 @@ from analysis import analyzer
 from logger import logger
 
 def classify_topic(text):
-    """Clasifica el tema de un texto dado."""
-    if not analyzer or not text or not analyzer.zero_shot_classifier:
+    """
+    Clasifica el tema de un texto dado.
+    Usa el clasificador destilado si así lo indica "classifiers.topic" en config.json.
+    """
+    if not analyzer or not text:
+        return None
+    if analyzer.config.get("classifiers", {}).get("topic") == "distilled":
+        from distillation import get_distilled_classifier
+        distilled = get_distilled_classifier("topic")
+        if distilled:
+            try:
+                return distilled.predict([text])[0]['label']
+            except Exception:
+                logger.error(f"Error en clasificación destilada de tópicos para el texto: '{text[:50]}...'", exc_info=True)
+    if not analyzer.zero_shot_classifier:
         return None
     try:
         return analyzer.classify_topic(text)
     except Exception:
         logger.error(f"Error en clasificación de tópicos para el texto: '{text[:50]}...'", exc_info=True)
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,94 @@
+import unittest
+import importlib.util
+import tempfile
+import datetime
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+from labels import SUBJECTIVITY_LABELS
+
+OBJECTIVE, OPINION = SUBJECTIVITY_LABELS # Las etiquetas que guarda el analizador
+
+HEADLINES = [
+    # (source, topic, subjectivity, entities, days ago)
+    ("Clarin", "POLÍTICA", OBJECTIVE, [{'text': 'Milei', 'label': 'PER'}], 10),
+    ("Clarin", "POLÍTICA", OPINION, [{'text': 'Milei', 'label': 'PER'}], 10),
+    ("Clarin", "ECONOMÍA", OBJECTIVE, [], 9),
+    ("BBC", "ECONOMÍA", OBJECTIVE, [{'text': 'FMI', 'label': 'ORG'}], 9),
+    ("BBC", "ECONOMÍA", OPINION, [{'text': 'FMI', 'label': 'ORG'}], 9),
+    ("BBC", "POLÍTICA", OBJECTIVE, [{'text': 'Milei', 'label': 'PER'}], 10),
+]
+SOURCE_TYPES = {"Clarin": "local", "BBC": "international"}
+
+@unittest.skipUnless(importlib.util.find_spec('duckdb'), "duckdb not installed")
+class TestAnalyticsStore(unittest.TestCase):
+
+    def setUp(self):
+        from analytics_store import AnalyticsStore
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        for i, (source, topic, subjectivity, entities, days_ago) in enumerate(HEADLINES):
+            self.add_headline(source, f"Titular {i}", topic, subjectivity, entities, days_ago)
+        self.store = AnalyticsStore(os.path.join(self.tmp_dir.name, 'analytics'))
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def add_headline(self, source, headline, topic, subjectivity, entities, days_ago):
+        headline_id, _ = db.guardar_titular_en_db(source, headline, f"http://x/{headline}", {'label': 'NEU', 'score': 0.5},
+                                                  entities, topic, subjectivity={'label': subjectivity, 'score': 0.9})
+        date = (datetime.datetime.now() - datetime.timedelta(days=days_ago)).strftime('%Y-%m-%d %H:%M:%S')
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE headlines SET collection_date = ? WHERE id = ?", (date, headline_id))
+        return headline_id
+
+    def test_aggregates_match_the_database(self):
+        """Counts, objectivity index and blind spots are computed over the Parquet mirror."""
+        self.assertEqual(self.store.sync(full=True), 6)
+        self.assertEqual(self.store.summary(), {'headlines': 6, 'sources': 2, 'topics': 2})
+
+        counts = self.store.counts('source')
+        self.assertEqual(dict(zip(counts['source'], counts['count'])), {"Clarin": 3, "BBC": 3})
+        self.assertEqual(self.store.summary({'sources': ["BBC"], 'topics': ["ECONOMÍA"]})['headlines'], 2)
+        self.assertEqual(self.store.summary({'headline_ids': {1, 4}})['headlines'], 2)
+
+        objectivity = self.store.objectivity_index().set_index('source')['objectivity']
+        self.assertAlmostEqual(objectivity["Clarin"], 200 / 3)
+        self.assertAlmostEqual(objectivity["BBC"], 200 / 3)
+
+        # BBC: ECONOMÍA 2/3, POLÍTICA 1/3; Clarin, sobre esos mismos tópicos: ECONOMÍA 1/3, POLÍTICA 2/3
+        spots = self.store.blind_spots(SOURCE_TYPES).set_index('item')
+        self.assertAlmostEqual(spots.loc["ECONOMÍA", 'international_pct'], 200 / 3)
+        self.assertAlmostEqual(spots.loc["ECONOMÍA", 'local_pct'], 100 / 3)
+        entity_spots = self.store.blind_spots(SOURCE_TYPES, by='entity', labels=["PER", "ORG"]).set_index('item')
+        self.assertEqual(list(entity_spots.index), ["FMI", "Milei"])
+        self.assertEqual(entity_spots.loc["FMI", 'local_pct'], 0)
+        self.assertEqual(entity_spots.loc["Milei", 'local_pct'], 100)
+
+    def test_incremental_sync_only_rewrites_affected_days(self):
+        """A new headline rewrites only its own day; untouched partitions are left as they were."""
+        self.store.sync(full=True)
+        partitions = sorted(os.listdir(self.store.headlines_dir))
+        old_day = os.path.join(self.store.headlines_dir, partitions[0], 'data.parquet')
+        old_mtime = os.stat(old_day).st_mtime_ns
+
+        self.add_headline("BBC", "Titular nuevo", "SALUD", OBJECTIVE, [], 0)
+        self.assertEqual(self.store.sync(refresh_days=3), 1)
+        self.assertEqual(os.stat(old_day).st_mtime_ns, old_mtime)
+        self.assertEqual(self.store.summary()['headlines'], 7)
+        daily = self.store.daily_counts()
+        self.assertEqual(len(daily), 3)
+        self.assertEqual(daily['count'].sum(), 7)
+
+if __name__ == '__main__':
+    unittest.main()
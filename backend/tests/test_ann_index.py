@@ -0,0 +1,86 @@
+import unittest
+import importlib.util
+import tempfile
+import json
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from embedding_store import EmbeddingStore
+
+DIM = 16
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def nearby(vector, seed=1):
+    """A query close to `vector`, like a paraphrased headline."""
+    query = vector + 0.05 * np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return query / np.linalg.norm(query)
+
+@unittest.skipUnless(importlib.util.find_spec('hnswlib'), "hnswlib not installed")
+class TestHeadlineIndex(unittest.TestCase):
+
+    def setUp(self):
+        from ann_index import HeadlineIndex
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = EmbeddingStore(self.tmp_dir.name, dim=DIM)
+        self.path = os.path.join(self.tmp_dir.name, 'hnsw.bin')
+        self.meta_path = os.path.join(self.tmp_dir.name, 'hnsw.json')
+        self.new_index = lambda: HeadlineIndex(self.store, self.path, self.meta_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def indexed_rows_on_disk(self):
+        with open(self.meta_path) as f:
+            return json.load(f)['indexed_rows']
+
+    def test_search_without_an_index_is_exact_and_writes_nothing(self):
+        vectors = unit_vectors(50)
+        self.store.append(np.arange(100, 150), vectors)
+        results = self.new_index().search(nearby(vectors[7]), k=3)
+        self.assertEqual(results[0][0], 107)
+        self.assertEqual(len(results), 3)
+        self.assertFalse(os.path.exists(self.path) or os.path.exists(self.meta_path))
+
+    def test_sync_indexes_only_new_rows(self):
+        vectors = unit_vectors(30)
+        self.store.append(np.arange(20), vectors[:20])
+        index = self.new_index()
+        self.assertEqual(index.sync(), 20)
+        self.assertEqual(index.sync(), 0)
+
+        self.store.append(np.arange(20, 30), vectors[20:])
+        self.assertEqual(self.new_index().sync(), 10) # Parte del índice guardado, no lo reconstruye
+        self.assertEqual(self.indexed_rows_on_disk(), 30)
+        self.assertEqual([f for f in os.listdir(self.tmp_dir.name) if f.endswith('.tmp')], [])
+
+    def test_search_returns_the_nearest_headline(self):
+        """Search uses the saved index and adds newer store rows in memory only."""
+        vectors = unit_vectors(200)
+        self.store.append(np.arange(1000, 1150), vectors[:150])
+        self.new_index().sync()
+
+        index = self.new_index()
+        self.assertEqual(index.search(nearby(vectors[42]), k=5)[0][0], 1042)
+
+        self.store.append(np.arange(1150, 1200), vectors[150:])
+        headline_id, similarity = index.search(nearby(vectors[180]), k=1)[0]
+        self.assertEqual(headline_id, 1180)
+        self.assertGreater(similarity, 0.9)
+        self.assertEqual(self.indexed_rows_on_disk(), 150)
+
+        # Tras una compactación el índice guardado deja de servir: se responde con búsqueda exacta
+        moved = unit_vectors(1, seed=5)[0]
+        self.store.append([1042], [moved])
+        self.store.compact()
+        self.assertEqual(self.new_index().search(nearby(moved), k=1)[0][0], 1042)
+        self.assertEqual(self.indexed_rows_on_disk(), 150)
+
+if __name__ == '__main__':
+    unittest.main()
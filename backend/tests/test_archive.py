@@ -0,0 +1,70 @@
+import unittest
+import importlib.util
+import tempfile
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+
+@unittest.skipUnless(importlib.util.find_spec('duckdb'), "duckdb not installed")
+class TestArchive(unittest.TestCase):
+
+    def setUp(self):
+        import archive
+        import analytics_store
+        self.archive = archive
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file, self.original_archive_dir = db.DB_FILE, archive.ARCHIVE_DIR
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        archive.ARCHIVE_DIR = os.path.join(self.tmp_dir.name, 'archive')
+        analytics_store._store = analytics_store.AnalyticsStore(os.path.join(self.tmp_dir.name, 'analytics'))
+        db.create_table()
+
+        self.old_id, _ = db.guardar_titular_en_db("Clarin", "Suba del dólar", "http://x/1", {'label': 'NEG', 'score': 0.8},
+                                                  [{'text': 'Caputo', 'label': 'PER'}], "ECONOMÍA", full_text="El dólar subió otra vez.")
+        db.guardar_citas_en_db(self.old_id, [{'text': 'Vamos a bajar la inflación', 'person': 'Caputo'}])
+        self.new_id, _ = db.guardar_titular_en_db("Clarin", "Nuevo titular", "http://x/2", topic="POLÍTICA")
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE headlines SET collection_date = '2024-01-15 10:00:00' WHERE id = ?", (self.old_id,))
+
+    def tearDown(self):
+        import analytics_store
+        analytics_store._store = None
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE, self.archive.ARCHIVE_DIR = self.original_db_file, self.original_archive_dir
+        self.tmp_dir.cleanup()
+
+    def count(self, query, params=()):
+        return db.get_db_connection().execute(query, params).fetchone()[0]
+
+    def test_archive_and_restore_round_trip(self):
+        """An archived month leaves the hot tables, stays queryable and counted, and comes back intact."""
+        self.assertEqual(self.archive.archive_old_months(hot_months=6), {"2024-01": 1})
+        self.assertEqual(self.count("SELECT COUNT(*) FROM headlines"), 1)
+        for table in ("quotes", "headline_entities", "article_bodies", "entities"):
+            self.assertEqual(self.count(f"SELECT COUNT(*) FROM {table}"), 0, table)
+        self.assertEqual(db.ids_titulares_por_texto("dolar"), set())
+        self.assertEqual(db.resumen_rollup()['headlines'], 2)
+        db.reconstruir_rollups()
+        self.assertEqual(db.resumen_rollup()['headlines'], 2)
+
+        archived = self.archive.query_archive("SELECT id, full_text, month FROM archived_headlines")
+        self.assertEqual(archived.to_dict(orient='records'), [{'id': self.old_id, 'full_text': "El dólar subió otra vez.", 'month': "2024-01"}])
+        self.assertEqual(self.archive.list_archived_months()[0]['quotes'], 1)
+
+        self.assertEqual(self.archive.restore_month("2024-01"), 1)
+        conn = db.get_db_connection()
+        self.assertEqual(db.obtener_cuerpo_articulo(conn, self.old_id), "El dólar subió otra vez.")
+        self.assertEqual(db.ids_titulares_por_texto("inflacion"), {self.old_id})
+        self.assertEqual(db.contar_entidades([self.old_id])[0]['text'], "Caputo")
+        self.assertEqual(self.count("SELECT collection_date FROM headlines WHERE id = ?", (self.old_id,)), '2024-01-15 10:00:00')
+        self.assertEqual(db.resumen_rollup()['headlines'], 2)
+        self.assertEqual(self.archive.list_archived_months(), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+import importlib.util
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from blocked_clustering import blocked_community_detection
+
+def clustered_embeddings(n=600, dim=32, n_stories=40, noise=0.15, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_stories, dim)).astype(np.float32)
+    embeddings = centers[rng.integers(0, n_stories, n)] + noise * rng.standard_normal((n, dim)).astype(np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+def dense_community_detection(embeddings, threshold, min_community_size):
+    """Reference implementation over the full N×N similarity matrix."""
+    similarities = embeddings @ embeddings.T
+    candidates = []
+    for row in similarities:
+        neighbors = np.flatnonzero(row >= threshold)
+        if len(neighbors) >= min_community_size:
+            candidates.append(neighbors[np.lexsort((neighbors, -row[neighbors]))].tolist())
+    candidates.sort(key=len, reverse=True)
+    communities, taken = [], set()
+    for community in candidates:
+        remaining = [i for i in community if i not in taken]
+        if len(remaining) >= min_community_size:
+            communities.append(remaining)
+            taken.update(remaining)
+    return sorted(communities, key=len, reverse=True)
+
+class TestBlockedCommunityDetection(unittest.TestCase):
+
+    def test_matches_dense_computation_for_any_block_size(self):
+        """Tiling rows and columns does not change the communities."""
+        embeddings = clustered_embeddings()
+        expected = dense_community_detection(embeddings, 0.75, 2)
+        self.assertGreater(len(expected), 0)
+        for row_block_size, col_block_size, workers in ((600, 600, 1), (64, 100, 1), (17, 50, 4)):
+            result = blocked_community_detection(embeddings, threshold=0.75, min_community_size=2,
+                                                 row_block_size=row_block_size, col_block_size=col_block_size,
+                                                 max_workers=workers)
+            self.assertEqual(result, expected)
+
+    def test_singletons_are_not_communities(self):
+        """Orthogonal headlines produce no community."""
+        self.assertEqual(blocked_community_detection(np.eye(5, dtype=np.float32), threshold=0.75, min_community_size=2), [])
+
+    @unittest.skipUnless(importlib.util.find_spec('sentence_transformers'), "sentence-transformers not installed")
+    def test_matches_sentence_transformers(self):
+        """Same communities (as sets) as util.community_detection."""
+        import torch
+        from sentence_transformers import util
+        embeddings = clustered_embeddings()
+        expected = util.community_detection(torch.from_numpy(embeddings), threshold=0.75, min_community_size=2)
+        result = blocked_community_detection(embeddings, threshold=0.75, min_community_size=2, row_block_size=64, col_block_size=100)
+        self.assertEqual(sorted(map(sorted, result)), sorted(map(sorted, expected)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,318 @@
+import unittest
+import sqlite3
+import tempfile
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+from labels import SUBJECTIVITY_LABELS
+
+class TestDatabaseSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def query_plan(self, query, params=()):
+        rows = db.get_db_connection().execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        return " | ".join(row['detail'] for row in rows)
+
+    def test_migrations_deduplicate_urls_of_a_legacy_database(self):
+        """A pre-migration DB with repeated URLs keeps the oldest row and its quotes, then gets the UNIQUE index."""
+        conn = sqlite3.connect(db.DB_FILE)
+        conn.executescript("""
+            CREATE TABLE headlines (id INTEGER PRIMARY KEY AUTOINCREMENT, headline TEXT NOT NULL, url TEXT NOT NULL,
+                                    source TEXT NOT NULL, collection_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                    sentiment_label TEXT, sentiment_score REAL, entities TEXT, topic TEXT, summary TEXT,
+                                    full_text TEXT, subjectivity_label TEXT, subjectivity_score REAL, story_id INTEGER);
+            CREATE TABLE quotes (id INTEGER PRIMARY KEY AUTOINCREMENT, headline_id INTEGER, quote_text TEXT NOT NULL, quoted_person TEXT);
+            INSERT INTO headlines (headline, url, source) VALUES ('a', 'http://x/1', 'Clarin'), ('a', 'http://x/1', 'Clarin'), ('b', 'http://x/2', 'Clarin');
+            INSERT INTO quotes (headline_id, quote_text, quoted_person) VALUES (1, 'hola', 'Milei'), (2, 'hola', 'Milei'), (2, 'chau', 'Kicillof');
+        """)
+        conn.commit()
+        conn.close()
+
+        db.create_table()
+        db.create_table() # Idempotente
+        conn = db.get_db_connection()
+        self.assertEqual(conn.execute("PRAGMA user_version").fetchone()[0], db.MIGRATIONS[-1][0])
+        self.assertEqual([row['id'] for row in conn.execute("SELECT id FROM headlines ORDER BY id")], [1, 3])
+        quotes = conn.execute("SELECT headline_id, quote_text FROM quotes ORDER BY quote_text").fetchall()
+        self.assertEqual([tuple(row) for row in quotes], [(1, 'chau'), (1, 'hola')])
+        with self.assertRaises(sqlite3.IntegrityError):
+            conn.execute("INSERT INTO headlines (headline, url, source) VALUES ('c', 'http://x/2', 'Clarin')")
+
+    def test_entity_tables_are_backfilled_and_written_at_ingest(self):
+        """Legacy JSON entities are normalized by the migration; new headlines write their own rows."""
+        conn = sqlite3.connect(db.DB_FILE)
+        conn.executescript("""
+            CREATE TABLE headlines (id INTEGER PRIMARY KEY AUTOINCREMENT, headline TEXT NOT NULL, url TEXT NOT NULL,
+                                    source TEXT NOT NULL, collection_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                    sentiment_label TEXT, sentiment_score REAL, entities TEXT, topic TEXT, summary TEXT,
+                                    full_text TEXT, subjectivity_label TEXT, subjectivity_score REAL, story_id INTEGER);
+            INSERT INTO headlines (headline, url, source, entities) VALUES
+                ('a', 'http://x/1', 'Clarin', '[{"text": "Milei", "label": "PER"}, {"text": "Congreso", "label": "ORG"}]'),
+                ('b', 'http://x/2', 'La Nacion', '[{"text": "Milei ", "label": "PER"}]'),
+                ('c', 'http://x/3', 'Clarin', 'no es JSON');
+        """)
+        conn.commit()
+        conn.close()
+
+        db.create_table()
+        headline_id, _ = db.guardar_titular_en_db("La Nacion", "d", "http://x/4",
+                                                  entities=[{"text": "Congreso", "label": "ORG"}, {"text": "Milei", "label": "PER"}])
+        conn = db.get_db_connection()
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0], 2)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM headline_entities").fetchone()[0], 5)
+
+        all_ids = [1, 2, 3, headline_id]
+        counts = {row['text']: row['mentions'] for row in db.contar_entidades(all_ids)}
+        self.assertEqual(counts, {"Milei": 3, "Congreso": 2})
+        self.assertEqual([row['text'] for row in db.contar_entidades(all_ids, labels=["ORG"])], ["Congreso"])
+        self.assertEqual(sorted(db.ids_titulares_con_entidad("Milei", [1, 2])), [1, 2])
+
+        pairs = db.coocurrencias_entidades(all_ids)
+        self.assertEqual([(p['text_a'], p['text_b'], p['weight']) for p in pairs], [("Congreso", "Milei", 2)])
+        by_source = {(row['source'], row['text']): row['mentions'] for row in db.entidades_por_medio(all_ids, labels=["PER"])}
+        self.assertEqual(by_source, {("Clarin", "Milei"): 1, ("La Nacion", "Milei"): 2})
+        shared = db.medios_con_entidades_en_comun(all_ids)
+        self.assertEqual([(row['source_a'], row['source_b'], row['shared_entities']) for row in shared], [("Clarin", "La Nacion", 2)])
+
+    def test_full_text_search_stays_in_sync(self):
+        """The FTS index follows inserts, quotes, updates and deletes; search ignores accents and ranks headlines first."""
+        db.create_table()
+        in_body, _ = db.guardar_titular_en_db("Clarin", "Anuncio oficial", "http://x/1", full_text="Subió la inflación y el dólar.")
+        in_headline, _ = db.guardar_titular_en_db("Clarin", "La inflación de mayo", "http://x/2", summary="Datos del INDEC")
+        db.guardar_citas_en_db(in_body, [{'text': 'Vamos a bajar los impuestos', 'person': 'Caputo'}])
+
+        results = db.buscar_titulares("INFLACION")
+        self.assertEqual([row['id'] for row in results], [in_headline, in_body])
+        self.assertIn("<mark>", results[0]['snippet'])
+        self.assertEqual(db.ids_titulares_por_texto("impuesto"), {in_body})
+        self.assertEqual(db.ids_titulares_por_texto("dolar indec"), set())
+        self.assertEqual(db.ids_titulares_por_texto('" OR *'), set())
+
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE headlines SET summary = 'Datos del INDEC y del dólar' WHERE id = ?", (in_headline,))
+            conn.execute("DELETE FROM quotes WHERE headline_id = ?", (in_body,))
+        self.assertEqual(db.ids_titulares_por_texto("dolar indec"), {in_headline})
+        self.assertEqual(db.ids_titulares_por_texto("impuesto"), set())
+        with conn:
+            conn.execute("DELETE FROM headlines WHERE id = ?", (in_headline,))
+        self.assertEqual(db.ids_titulares_por_texto("inflacion"), {in_body})
+
+    def test_bodies_are_moved_to_compressed_side_table(self):
+        """The migration compresses legacy bodies into article_bodies and drops headlines.full_text; search still finds them."""
+        body = "El Banco Central informó que las reservas aumentaron. " * 50
+        conn = sqlite3.connect(db.DB_FILE)
+        conn.executescript("""
+            CREATE TABLE headlines (id INTEGER PRIMARY KEY AUTOINCREMENT, headline TEXT NOT NULL, url TEXT NOT NULL,
+                                    source TEXT NOT NULL, collection_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                                    sentiment_label TEXT, sentiment_score REAL, entities TEXT, topic TEXT, summary TEXT,
+                                    full_text TEXT, subjectivity_label TEXT, subjectivity_score REAL, story_id INTEGER);
+        """)
+        conn.execute("INSERT INTO headlines (headline, url, source, full_text) VALUES ('a', 'http://x/1', 'Clarin', ?)", (body,))
+        conn.execute("INSERT INTO headlines (headline, url, source) VALUES ('b', 'http://x/2', 'Clarin')")
+        conn.commit()
+        conn.close()
+
+        db.create_table()
+        new_id, _ = db.guardar_titular_en_db("Clarin", "c", "http://x/3", full_text="Nuevo cuerpo sobre las reservas.")
+        conn = db.get_db_connection()
+        columns = [row['name'] for row in conn.execute("PRAGMA table_info(headlines)")]
+        self.assertNotIn("full_text", columns)
+        stored = conn.execute("SELECT body FROM article_bodies WHERE headline_id = 1").fetchone()[0]
+        self.assertLess(len(stored), len(body) / 5)
+        self.assertEqual(db.obtener_cuerpo_articulo(conn, 1), body)
+        self.assertIsNone(db.obtener_cuerpo_articulo(conn, 2))
+        self.assertEqual(db.ids_titulares_por_texto("reservas"), {1, new_id})
+
+        with conn:
+            conn.execute("DELETE FROM headlines WHERE id = 1")
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM article_bodies").fetchone()[0], 1)
+
+    def test_upsert_reports_new_and_existing_rows(self):
+        """The upsert returns the same ID for a repeated URL and only fills a missing story_id."""
+        db.create_table()
+        headline_id, was_new = db.guardar_titular_en_db("Clarin", "Titular de prueba", "http://x/1")
+        self.assertTrue(was_new)
+        same_id, was_new = db.guardar_titular_en_db("Clarin", "Titular de prueba", "http://x/1", story_id=7)
+        self.assertEqual((same_id, was_new), (headline_id, False))
+        db.guardar_titular_en_db("Clarin", "Titular de prueba", "http://x/1", story_id=9)
+        story_id = db.get_db_connection().execute("SELECT story_id FROM headlines WHERE id = ?", (headline_id,)).fetchone()[0]
+        self.assertEqual(story_id, 7)
+
+    def test_rollups_follow_inserts_updates_and_deletes(self):
+        """The triggers keep headline_rollup equal to a full recount, and the stats read from it."""
+        db.create_table()
+        objective, opinion = SUBJECTIVITY_LABELS # Las etiquetas que guarda el analizador
+        for i, (source, topic, subjectivity) in enumerate([("Clarin", "POLÍTICA", objective), ("Clarin", "POLÍTICA", opinion),
+                                                           ("BBC", "ECONOMÍA", objective), ("BBC", None, None)]):
+            db.guardar_titular_en_db(source, f"Titular {i}", f"http://x/{i}", {'label': 'NEU', 'score': 0.5}, topic=topic,
+                                     subjectivity={'label': subjectivity, 'score': 0.9} if subjectivity else None)
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE headlines SET collection_date = '2024-05-01 10:30:00', topic = 'ECONOMÍA' WHERE id = 1")
+            conn.execute("DELETE FROM headlines WHERE id = 2")
+
+        def rollup_rows():
+            return [tuple(row) for row in conn.execute("SELECT * FROM headline_rollup ORDER BY 1, 2, 3, 4, 5")]
+        maintained = rollup_rows()
+        db.reconstruir_rollups()
+        self.assertEqual(maintained, rollup_rows())
+        # Los buckets de un mes archivado (sin filas en headlines) sobreviven a la reconstrucción
+        with conn:
+            conn.execute("INSERT INTO archived_months (month, headlines, quotes) VALUES ('2023-01', 5, 0)")
+            conn.execute("INSERT INTO headline_rollup VALUES ('2023-01-10 08:00:00', 'Clarin', '', '', '', 5)")
+        db.reconstruir_rollups()
+        self.assertEqual(len(rollup_rows()), len(maintained) + 1)
+        with conn:
+            conn.execute("DELETE FROM archived_months")
+        db.reconstruir_rollups()
+        self.assertEqual(maintained, rollup_rows())
+
+        self.assertEqual(db.resumen_rollup(), {'headlines': 3, 'sources': 2, 'topics': 1})
+        self.assertEqual(db.contar_rollup('topic'), [{'topic': 'ECONOMÍA', 'count': 2}])
+        by_day = db.contar_rollup('source', granularity='day', date_to='2024-05-01')
+        self.assertEqual(by_day, [{'bucket': '2024-05-01', 'source': 'Clarin', 'count': 1}])
+        objectivity = {row['source']: row['objectivity'] for row in db.indice_objetividad(sources=["BBC"])}
+        self.assertEqual(objectivity, {"BBC": 100.0})
+        with conn:
+            conn.execute("INSERT INTO headlines (headline, url, source, subjectivity_label) VALUES ('Opinión', 'http://x/9', 'BBC', ?)", (opinion,))
+        objectivity = {row['source']: (row['objectivity'], row['analyzed']) for row in db.indice_objetividad()}
+        self.assertEqual(objectivity, {"Clarin": (100.0, 1), "BBC": (50.0, 2)})
+
+    def test_keyset_pagination_and_cached_count(self):
+        """listar_titulares walks every headline exactly once, newest first, and row_counts follows inserts and deletes."""
+        db.create_table()
+        for i in range(5):
+            db.guardar_titular_en_db("Clarin", f"Titular {i}", f"http://x/{i}")
+        conn = db.get_db_connection()
+        with conn:
+            # Dos titulares con la misma fecha: el id desempata
+            conn.execute("UPDATE headlines SET collection_date = '2024-05-01 10:00:00' WHERE id IN (2, 3)")
+            conn.execute("DELETE FROM headlines WHERE id = 5")
+        self.assertEqual(db.contar_titulares(conn), 4)
+
+        seen, before = [], None
+        while True:
+            page = db.listar_titulares(conn, 2, before)
+            seen.extend(row['id'] for row in page)
+            if len(page) < 2:
+                break
+            before = (page[-1]['collection_date'], page[-1]['id'])
+        self.assertEqual(seen, [4, 1, 3, 2])
+
+    def test_api_read_helpers_return_plain_rows(self):
+        """The helpers behind the API endpoints return dicts ready to serialize, without DataFrames."""
+        db.create_table()
+        first, _ = db.guardar_titular_en_db("Clarin", "Titular 1", "http://x/1")
+        second, _ = db.guardar_titular_en_db("BBC", "Titular 2", "http://x/2")
+        db.guardar_citas_en_db(first, [{'text': 'Una cita', 'person': 'Alguien'}])
+        conn = db.get_db_connection()
+
+        self.assertEqual([row['id'] for row in db.titulares_de_fuente(conn, "Clarin")], [first])
+        self.assertEqual({row['id'] for row in db.titulares_por_ids(conn, [first, second, 99])}, {first, second})
+        self.assertEqual(db.obtener_titular(conn, second)['headline'], "Titular 2")
+        self.assertIsNone(db.obtener_titular(conn, 99))
+        self.assertEqual(db.listar_citas(conn), [{'quote_text': 'Una cita', 'quoted_person': 'Alguien', 'headline': 'Titular 1', 'url': 'http://x/1'}])
+        self.assertEqual(db.listar_eventos(conn, '2000-01-01 00:00:00'), [])
+
+    def test_export_query_streams_projected_and_filtered_rows(self):
+        """consulta_exportacion projects and filters; iterar_filas yields the rows in batches, in index order."""
+        db.create_table()
+        for i, source in enumerate(["Clarin", "BBC", "Clarin"]):
+            db.guardar_titular_en_db(source, f"Titular {i}", f"http://x/{i}", full_text="La inflación de mayo")
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE headlines SET collection_date = '2024-05-01 10:00:00' WHERE id = 1")
+
+        columns, query, params = db.consulta_exportacion('headlines', ['id', 'source'], sources=["Clarin"], date_to="2024-05-01")
+        self.assertEqual(columns, ['id', 'source'])
+        self.assertEqual(list(db.iterar_filas(query, params)), [[(1, "Clarin")]])
+        _, query, params = db.consulta_exportacion('headlines', ['id'], date_from="2024-05-02", keyword="inflacion")
+        self.assertEqual(list(db.iterar_filas(query, params, batch_size=1)), [[(2,)], [(3,)]])
+        # Sin búsqueda de texto, el orden sale del índice: no hay que ordenar (ni guardar) el resultado
+        _, query, params = db.consulta_exportacion('headlines', date_from="2024-05-02")
+        self.assertNotIn("TEMP B-TREE", self.query_plan(query, params))
+        with self.assertRaises(ValueError):
+            db.consulta_exportacion('quotes', ['quote_text', 'nope'])
+
+    def test_query_plans_use_indexes(self):
+        """The API, dashboard and pipeline access paths are served by indexes, without full scans or sorts."""
+        db.create_table()
+        plan = self.query_plan("SELECT id FROM headlines WHERE url = ?", ("http://x/1",))
+        self.assertIn("USING COVERING INDEX idx_headlines_url", plan)
+
+        plan = self.query_plan("SELECT * FROM headlines WHERE (collection_date, id) < (?, ?) ORDER BY collection_date DESC, id DESC LIMIT 20",
+                               ("2024-05-01 10:00:00", 40))
+        self.assertIn("SEARCH headlines USING INDEX idx_headlines_collection_date", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+        plan = self.query_plan("SELECT * FROM headlines WHERE source = ? ORDER BY collection_date DESC", ("Clarin",))
+        self.assertIn("idx_headlines_source_date", plan)
+        self.assertNotIn("TEMP B-TREE", plan)
+
+        plan = self.query_plan("SELECT id FROM headlines WHERE topic = ? AND collection_date >= ?", ("ECONOMÍA", "2024-05-01"))
+        self.assertIn("USING COVERING INDEX idx_headlines_topic_date", plan)
+
+        plan = self.query_plan("SELECT id FROM headlines WHERE story_id = ?", (3,))
+        self.assertIn("idx_headlines_story_id", plan)
+
+        plan = self.query_plan("SELECT quote_text FROM quotes WHERE headline_id = ?", (1,))
+        self.assertIn("idx_quotes_headline_id", plan)
+
+        plan = self.query_plan("SELECT headline_id FROM headline_entities WHERE entity_id = ?", (1,))
+        self.assertIn("USING COVERING INDEX idx_headline_entities_entity", plan)
+
+    def test_reads_do_not_wait_for_an_open_write_transaction(self):
+        """With WAL, pooled read-only connections see the last committed data while a write is in progress."""
+        db.create_table()
+        db.guardar_titular_en_db("Clarin", "Titular", "http://x/1")
+        writer = db.get_db_connection()
+        self.assertEqual(writer.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(writer.execute("PRAGMA synchronous").fetchone()[0], 1) # NORMAL
+
+        writer.execute("BEGIN IMMEDIATE")
+        writer.execute("INSERT INTO headlines (headline, url, source) VALUES ('b', 'http://x/2', 'Clarin')")
+        with db.read_connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM headlines").fetchone()[0], 1)
+            with self.assertRaises(sqlite3.OperationalError):
+                conn.execute("DELETE FROM headlines")
+        writer.commit()
+        with db.read_connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM headlines").fetchone()[0], 2)
+
+    def test_framing_and_rollup_rebuild_bump_the_data_version(self):
+        """Framing updates and rollup rebuilds invalidate the API cache like any other committed write."""
+        db.create_table()
+        headline_id, _ = db.guardar_titular_en_db("Clarin", "Titular", "http://x/1", topic="Economía")
+        before = db.version_de_datos()
+        db.guardar_framing_en_db([(headline_id, {'label': 'conflicto', 'score': 0.9})])
+        after_framing = db.version_de_datos()
+        self.assertNotEqual(after_framing, before)
+        db.reconstruir_rollups()
+        self.assertNotEqual(db.version_de_datos(), after_framing)
+
+    def test_read_pool_reuses_connections(self):
+        db.create_table()
+        with db.read_connection() as first:
+            pass
+        with db.read_connection() as second:
+            self.assertIs(first, second)
+            with db.read_connection() as third:
+                self.assertIsNot(second, third)
+
+if __name__ == '__main__':
+    unittest.main()
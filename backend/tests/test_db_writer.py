@@ -0,0 +1,94 @@
+import unittest
+import tempfile
+import threading
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+from db_writer import DBWriter
+
+QUOTES = [{'text': 'Una cita', 'person': 'Milei'}, {'text': 'Otra cita', 'person': 'Kicillof'}]
+
+def failing_write(conn):
+    conn.execute("INSERT INTO quotes (headline_id, quote_text, quoted_person) VALUES (1, 'parcial', NULL)")
+    raise ValueError("falla a mitad de la escritura")
+
+class TestDBWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def count(self, table):
+        return db.get_db_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def test_concurrent_writes_are_batched_and_return_ids(self):
+        """Many threads get their own headline ID back, and the quotes land on the right headline."""
+        ids = {}
+        with DBWriter(max_wait_ms=20) as writer:
+            def save(i):
+                headline_id, was_new = writer.write(db.insertar_titular, "Clarin", f"Titular {i}", f"http://x/{i}")
+                writer.submit(db.insertar_citas, headline_id, QUOTES)
+                ids[i] = (headline_id, was_new)
+            threads = [threading.Thread(target=save, args=(i,)) for i in range(50)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        metrics = writer.get_metrics()
+
+        self.assertEqual(len({headline_id for headline_id, _ in ids.values()}), 50)
+        self.assertTrue(all(was_new for _, was_new in ids.values()))
+        self.assertEqual(metrics['writes'], 100)
+        self.assertLess(metrics['batches'], 100)
+        headline_id = ids[7][0]
+        url = db.get_db_connection().execute("SELECT url FROM headlines WHERE id = ?", (headline_id,)).fetchone()[0]
+        self.assertEqual(url, "http://x/7")
+        self.assertEqual(self.count("quotes"), 100)
+
+    def test_failed_write_is_rolled_back_alone(self):
+        """A failing write gets the exception; the rest of its batch is committed."""
+        writer = DBWriter()
+        first = writer.submit(db.insertar_titular, "Clarin", "Titular", "http://x/1")
+        failed = writer.submit(failing_write)
+        last = writer.submit(db.insertar_citas, 1, QUOTES)
+        writer.close()
+
+        self.assertEqual(first.result(), (1, True))
+        with self.assertRaises(ValueError):
+            failed.result()
+        self.assertEqual(last.result(), 2)
+        self.assertEqual(self.count("quotes"), 2)
+
+    def test_commit_bumps_the_data_version(self):
+        """Each committed batch changes the data version read by the API cache."""
+        self.assertEqual(db.version_de_datos(), '0')
+        with DBWriter() as writer:
+            writer.write(db.insertar_titular, "Clarin", "Titular", "http://x/1")
+            first = db.version_de_datos()
+            writer.write(db.insertar_titular, "Clarin", "Otro titular", "http://x/2")
+        self.assertNotEqual(first, '0')
+        self.assertNotEqual(db.version_de_datos(), first)
+
+    def test_close_flushes_pending_writes(self):
+        """Writes queued before close() are durable; writes after close() are rejected."""
+        writer = DBWriter(max_batch=3)
+        futures = [writer.submit(db.insertar_titular, "Clarin", f"Titular {i}", f"http://x/{i}") for i in range(10)]
+        writer.close()
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.count("headlines"), 10)
+        with self.assertRaises(RuntimeError):
+            writer.submit(db.insertar_citas, 1, QUOTES)
+
+if __name__ == '__main__':
+    unittest.main()
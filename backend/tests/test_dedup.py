@@ -0,0 +1,67 @@
+import unittest
+import tempfile
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+from dedup import NearDuplicateDetector, body_shingles, headline_shingles, minhash_signature, estimated_similarity
+
+BODY = (
+    "El Gobierno nacional anunció este martes un nuevo paquete de medidas económicas destinado a contener "
+    "la inflación, que incluye acuerdos de precios con supermercados, una suba de las tasas de interés y "
+    "un refuerzo de las reservas del Banco Central, según informó el ministro de Economía en conferencia de prensa. "
+    "Las medidas entrarán en vigencia la semana próxima y serán revisadas cada mes por el equipo económico."
+)
+REWRITE = BODY.replace("este martes", "hoy").replace("según informó", "informó")
+OTHER = (
+    "La selección argentina venció a Brasil por dos goles a cero en el estadio Maracaná, con goles de Messi "
+    "y Lautaro Martínez, y se aseguró el primer puesto de las eliminatorias sudamericanas rumbo al Mundial."
+)
+
+class TestNearDuplicateDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def test_shingles_ignore_case_and_accents(self):
+        """Shingling folds case, accents and punctuation."""
+        self.assertEqual(body_shingles("Economía: ¡Crecé!"), body_shingles("economia crece"))
+        self.assertEqual(headline_shingles("Inflación"), headline_shingles("INFLACION"))
+
+    def test_signature_similarity_tracks_jaccard(self):
+        """A light rewrite scores high; unrelated text scores low."""
+        original = minhash_signature(body_shingles(BODY))
+        self.assertGreater(estimated_similarity(original, minhash_signature(body_shingles(REWRITE))), 0.8)
+        self.assertLess(estimated_similarity(original, minhash_signature(body_shingles(OTHER))), 0.2)
+
+    def test_duplicates_within_batch_and_across_runs(self):
+        """Copies match an earlier item of the same batch, and a registered original in a later run."""
+        detector = NearDuplicateDetector()
+        results = detector.check([
+            ("Anuncian medidas económicas para frenar la inflación", BODY),
+            ("Anuncian medidas economicas para frenar la inflacion", REWRITE),
+            ("Argentina le ganó a Brasil en el Maracaná", OTHER),
+        ])
+        self.assertIsNone(results[0]['body_match'])
+        self.assertEqual(results[1]['body_match'], ("batch", 0))
+        self.assertEqual(results[1]['headline_match'], ("batch", 0))
+        self.assertIsNone(results[2]['body_match'])
+        detector.register([(10, results[0]), (11, results[1]), (12, results[2])])
+
+        results = NearDuplicateDetector().check([("Un titular distinto sobre la economía", REWRITE)])
+        self.assertEqual(results[0]['body_match'], ("db", 10))
+        self.assertIsNone(results[0]['headline_match'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+from unittest.mock import patch
+import importlib.util
+import tempfile
+import zlib
+import types
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+
+HAS_SKLEARN = bool(importlib.util.find_spec('sklearn') and importlib.util.find_spec('joblib'))
+if HAS_SKLEARN:
+    # Se importan antes de parchear sys.modules: sus extensiones en C no se pueden volver a cargar
+    import joblib
+    import sklearn.linear_model, sklearn.model_selection, sklearn.metrics
+
+KEYWORDS = ["dólar", "senado", "hospital"]
+
+class StubEncoder:
+    """Encodes a headline as the axis of its keyword plus a small deterministic jitter, so the classes are separable."""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def get_sentence_embedding_dimension(self):
+        return 8
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False, **kwargs):
+        vectors = []
+        for text in texts:
+            rng = np.random.default_rng(zlib.crc32(text.encode('utf-8')))
+            vector = 0.1 * rng.standard_normal(8).astype(np.float32)
+            vector[next(i for i, keyword in enumerate(KEYWORDS) if keyword in text.lower())] += 1.0
+            vectors.append(vector / np.linalg.norm(vector))
+        return np.array(vectors, dtype=np.float32)
+
+def fake_sentence_transformers():
+    module = types.ModuleType('sentence_transformers')
+    module.SentenceTransformer = StubEncoder
+    return patch.dict(sys.modules, {'sentence_transformers': module})
+
+@unittest.skipUnless(HAS_SKLEARN, "scikit-learn not installed")
+class TestDistillation(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        self.modules = fake_sentence_transformers()
+        self.modules.start()
+        sys.modules.pop('distillation', None)
+        import distillation
+        self.distillation = distillation
+        self.models_dir = patch.object(distillation, 'DISTILLED_MODELS_DIR', os.path.join(self.tmp_dir.name, 'models'))
+        self.models_dir.start()
+
+    def tearDown(self):
+        self.models_dir.stop()
+        self.modules.stop()
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def add_headlines(self, counts):
+        for topic, keyword, n in counts:
+            for i in range(n):
+                db.guardar_titular_en_db("Clarin", f"Noticia {i} sobre el {keyword}", f"http://x/{topic}/{i}", topic=topic)
+
+    def train(self, **kwargs):
+        # Un modelo de embeddings distinto del del EmbeddingStore: todo pasa por el encoder de prueba
+        return self.distillation.train_distilled_classifier("topic", embedding_model="stub", **kwargs)
+
+    def test_labels_with_a_single_sample_are_dropped(self):
+        """A label seen once would make the stratified split raise ValueError; it is dropped and logged."""
+        self.add_headlines([("ECONOMÍA", "dólar", 6), ("POLÍTICA", "senado", 6), ("SALUD", "hospital", 1)])
+        with self.assertLogs('news_analyzer', level='WARNING') as logs:
+            _, _, labels = self.distillation.load_training_data("topic", min_samples_per_label=1)
+        self.assertEqual(sorted(set(labels)), ["ECONOMÍA", "POLÍTICA"])
+        self.assertIn("SALUD", "\n".join(logs.output))
+
+        report = self.train()
+        self.assertEqual((report['n_samples'], report['n_labels']), (12, 2))
+
+    def test_small_test_set_falls_back_to_an_unstratified_split(self):
+        """With fewer test rows than labels the split cannot be stratified, and training still succeeds."""
+        self.add_headlines([("ECONOMÍA", "dólar", 5), ("POLÍTICA", "senado", 5), ("SALUD", "hospital", 5)])
+        report = self.train(test_size=0.1)
+        self.assertEqual(report['n_samples'], 15)
+
+    def test_saved_classifier_round_trip(self):
+        """The trained head is saved with joblib and DistilledClassifier predicts the teacher's labels after loading it."""
+        self.add_headlines([("ECONOMÍA", "dólar", 10), ("POLÍTICA", "senado", 10), ("SALUD", "hospital", 10)])
+        report = self.train()
+        self.assertEqual(report['agreement'], 1.0)
+        self.assertTrue(os.path.exists(self.distillation.model_path("topic")))
+
+        classifier = self.distillation.DistilledClassifier("topic")
+        self.assertEqual(classifier.encoder.model_name, "stub")
+        predictions = classifier.predict(["Sube el dólar", "Sesión en el Senado", "Nuevo hospital"])
+        self.assertEqual([p['label'] for p in predictions], ["ECONOMÍA", "POLÍTICA", "SALUD"])
+        self.assertTrue(all(0.0 < p['score'] <= 1.0 for p in predictions))
+        self.assertEqual(classifier.predict([]), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from embedding_store import EmbeddingStore
+
+DIM = 16
+
+def unit_vectors(n, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def as_stored(vectors):
+    """What the store keeps: the normalized vector rounded to float16."""
+    return np.asarray(vectors, dtype=np.float16).astype(np.float32)
+
+class TestEmbeddingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = EmbeddingStore(self.tmp_dir.name, dim=DIM)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def reopen(self):
+        return EmbeddingStore(self.tmp_dir.name, dim=DIM)
+
+    def test_append_and_get_round_trip(self):
+        """Vectors come back exactly as their float16 rounding, also from a freshly opened store."""
+        vectors = unit_vectors(5)
+        self.store.append([10, 11, 12, 13, 14], 3 * vectors) # Se normalizan al guardarse
+        for store in (self.store, self.reopen()):
+            found = store.get([12, 10, 99])
+            self.assertEqual(sorted(found), [10, 12])
+            np.testing.assert_array_equal(found[12], as_stored(vectors[2]))
+            np.testing.assert_array_equal(found[10], as_stored(vectors[0]))
+            self.assertEqual(store.missing([10, 99, 14, 100]), [99, 100])
+            self.assertEqual(len(store), 5)
+
+    def test_reappended_id_returns_the_latest_vector(self):
+        old, new = unit_vectors(2)
+        self.store.append([1, 2], [old, old])
+        self.store.append([1], [new])
+        self.assertEqual(len(self.store), 3)
+        np.testing.assert_array_equal(self.store.get([1])[1], as_stored(new))
+        np.testing.assert_array_equal(self.store.get([2])[2], as_stored(old))
+
+    def test_compact_keeps_latest_versions_of_kept_ids_across_reopen(self):
+        """compact(keep_ids) drops stale and deleted rows, switches file generation and keeps accepting appends."""
+        vectors = unit_vectors(6)
+        self.store.append([1, 2, 3], vectors[:3])
+        self.store.append([2, 4], vectors[3:5])
+        old_files = (self.store.vectors_path, self.store.ids_path)
+
+        self.assertEqual(self.store.compact(keep_ids=[1, 2, 4]), 2) # versión vieja de 2 y el 3 borrado
+        self.assertFalse(any(os.path.exists(path) for path in old_files))
+
+        store = self.reopen()
+        ids, _ = store.vectors()
+        self.assertEqual(ids.tolist(), [1, 2, 4]) # Orden de inserción original
+        np.testing.assert_array_equal(store.get([2])[2], as_stored(vectors[3]))
+        self.assertEqual(store.missing([3]), [3])
+
+        store.append([5], vectors[5:])
+        self.assertEqual(self.reopen().vectors()[0].tolist(), [1, 2, 4, 5])
+
+    def test_crash_before_switching_generation_keeps_the_old_files(self):
+        """If compaction dies before meta.json is rewritten, the store still reads the previous generation."""
+        vectors = unit_vectors(3)
+        self.store.append([1, 2, 1], vectors)
+        with patch.object(EmbeddingStore, '_write_meta', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                self.store.compact()
+
+        store = self.reopen()
+        self.assertEqual(store.vectors()[0].tolist(), [1, 2, 1])
+        np.testing.assert_array_equal(store.get([1])[1], as_stored(vectors[2]))
+        self.assertEqual(store.compact(), 1)
+        self.assertEqual(self.reopen().vectors()[0].tolist(), [2, 1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import tempfile
+import datetime
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+from event_detection import EventDetector, hour_bucket, headline_observations
+
+START = datetime.datetime(2024, 5, 1, 0, 0)
+
+class TestEventDetector(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        self.detector = EventDetector(alpha=0.1, z_threshold=3.0, min_count=5)
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def feed_hours(self, counts, key="Milei", start=START):
+        """Feeds `counts[i]` mentions of `key` during hour i, one call per hour."""
+        events = []
+        for hour, count in enumerate(counts):
+            timestamp = start + datetime.timedelta(hours=hour, minutes=30)
+            events.extend(self.detector.observe([("entity", key, timestamp)] * count, history_start=START))
+        return events
+
+    def test_steady_series_has_no_events(self):
+        """A stable mention rate never triggers an event, including the series' first hours (warm-up)."""
+        self.assertEqual(self.feed_hours([6] * 48), [])
+
+    def test_burst_is_detected_once_per_hour(self):
+        """A spike above the EWMA baseline is stored as a single event holding the hourly peak."""
+        events = self.feed_hours([2] * 24 + [15])
+        self.assertTrue(events)
+        self.assertTrue(all(event['bucket'] == '2024-05-02 00:00:00' for event in events))
+
+        rows = db.get_db_connection().execute("SELECT * FROM events").fetchall()
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['count'], 15)
+        self.assertEqual(rows[0]['key'], "Milei")
+
+    def test_state_survives_across_calls_and_gaps(self):
+        """The series state is persisted, and empty hours decay the baseline."""
+        self.feed_hours([10] * 24)
+        state = db.cargar_estados_series({("entity", "Milei")})[("entity", "Milei")]
+        self.assertEqual(state['n'], 23)
+        self.assertGreater(state['mean'], 8)
+
+        # After ten quiet hours the baseline has decayed towards zero
+        self.detector.observe([("entity", "Milei", START + datetime.timedelta(hours=34))], history_start=START)
+        state = db.cargar_estados_series({("entity", "Milei")})[("entity", "Milei")]
+        self.assertEqual(state['n'], 34)
+        self.assertLess(state['mean'], 5)
+
+    def test_new_entity_bursts_after_warm_up(self):
+        """An entity never seen before bursts once the history is long enough; not during warm-up."""
+        self.assertEqual(self.feed_hours([8], key="Nuevo"), [])
+        events = self.feed_hours([8], key="Otro", start=START + datetime.timedelta(hours=30))
+        self.assertEqual({event['key'] for event in events}, {"Otro"})
+
+    def test_helpers(self):
+        self.assertEqual(hour_bucket("2024-05-01 13:45:12"), datetime.datetime(2024, 5, 1, 13))
+        row = {"entities": '[{"text": "Milei", "label": "PER"}, {"text": "Milei", "label": "PER"}]', "topic": "POLÍTICA", "story_id": 7}
+        self.assertEqual(sorted(headline_observations(row)), [("entity", "Milei"), ("story", "7"), ("topic", "POLÍTICA")])
+
+if __name__ == '__main__':
+    unittest.main()
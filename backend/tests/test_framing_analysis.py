@@ -0,0 +1,152 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import types
+import re
+import sys
+import os
+import pandas as pd
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+
+MARKER = re.compile(r"T(?:itular )?(\d{3})")
+
+class FakeAnalyzer:
+    """A stand-in for analysis.analyzer. Framing is keyword based; each summary keeps only the 'Titular NNN' markers of its input, as 'TNNN'."""
+
+    def __init__(self):
+        self.config = {"framing_labels": {"ECONOMÍA": ["crisis", "oportunidad"]}}
+        self.zero_shot_classifier = object()
+        self.final_inputs = []
+        self.framing_calls = []
+        self.fail_reduce = False
+
+    def classify_framing_batch(self, texts, topic, batch_size=16):
+        self.framing_calls.append((topic, list(texts)))
+        return [{'label': "crisis" if "cae" in text else "oportunidad", 'score': 0.8} for text in texts]
+
+    def summarizer(self, texts, **kwargs):
+        if self.fail_reduce and any(text.startswith("Eres un analista") for text in texts):
+            raise RuntimeError("reduce failed")
+        return [{'summary_text': " ".join(f"T{n}" for n in MARKER.findall(text))} for text in texts]
+
+    def summarize_text(self, text, **kwargs):
+        self.final_inputs.append(text)
+        return f"Briefing de {len(MARKER.findall(text))} historias"
+
+def fake_analysis(analyzer):
+    """Replaces the analysis module (which loads the NLP models) and forgets framing_analysis on exit."""
+    module = types.ModuleType('analysis')
+    module.analyzer = analyzer
+    return patch.dict(sys.modules, {'analysis': module})
+
+class TestFramingStage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        self.analyzer = FakeAnalyzer()
+        self.modules = fake_analysis(self.analyzer)
+        self.modules.start()
+        sys.modules.pop('framing_analysis', None)
+        import framing_analysis
+        self.framing = framing_analysis
+
+    def tearDown(self):
+        self.modules.stop()
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def framing_of(self, headline_id):
+        row = db.get_db_connection().execute("SELECT framing_label, framing_score FROM headlines WHERE id = ?", (headline_id,)).fetchone()
+        return tuple(row)
+
+    def test_backfill_classifies_only_pending_headlines_of_configured_topics(self):
+        """Only configured topics without framing are classified; the result is stored and a second run is a no-op."""
+        falls, _ = db.guardar_titular_en_db("Clarin", "El dólar cae otra vez", "http://x/1", topic="ECONOMÍA")
+        grows, _ = db.guardar_titular_en_db("BBC", "La industria crece", "http://x/2", topic="ECONOMÍA")
+        politics, _ = db.guardar_titular_en_db("Clarin", "Debate en el Senado", "http://x/3", topic="POLÍTICA")
+        framed, _ = db.guardar_titular_en_db("BBC", "El empleo cae", "http://x/4", topic="ECONOMÍA")
+        db.guardar_framing_en_db([(framed, {'label': "oportunidad", 'score': 0.6})])
+
+        self.assertEqual(self.framing.run_framing_stage(), 2)
+        self.assertEqual(self.analyzer.framing_calls, [("ECONOMÍA", ["El dólar cae otra vez", "La industria crece"])])
+        self.assertEqual(self.framing_of(falls), ("crisis", 0.8))
+        self.assertEqual(self.framing_of(grows), ("oportunidad", 0.8))
+        self.assertEqual(self.framing_of(politics), (None, None))
+        self.assertEqual(self.framing_of(framed), ("oportunidad", 0.6))
+
+        self.assertEqual(self.framing.run_framing_stage(), 0)
+        self.assertEqual(len(self.analyzer.framing_calls), 1)
+
+    def test_stage_can_be_limited_to_new_headlines(self):
+        first, _ = db.guardar_titular_en_db("Clarin", "El dólar cae otra vez", "http://x/1", topic="ECONOMÍA")
+        second, _ = db.guardar_titular_en_db("BBC", "La industria crece", "http://x/2", topic="ECONOMÍA")
+        self.assertEqual(self.framing.run_framing_stage(headline_ids=[second]), 1)
+        self.assertEqual(self.framing_of(first), (None, None))
+        self.assertEqual(self.framing.run_framing_stage(headline_ids=[]), 0)
+
+class TestBriefing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        self.analyzer = FakeAnalyzer()
+        self.modules = fake_analysis(self.analyzer)
+        self.modules.start()
+        sys.modules.pop('framing_analysis', None)
+        import framing_analysis
+        self.framing = framing_analysis
+
+    def tearDown(self):
+        self.modules.stop()
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def articles(self, n=200):
+        # Historias de un solo artículo: pasan directo al reduce, ~23.000 caracteres en total
+        return pd.DataFrame({
+            'id': range(1, n + 1),
+            'headline': [f"Titular {i:03d} " + "x" * 100 for i in range(n)],
+            'summary': [None] * n,
+            'story_id': [None] * n,
+            'collection_date': ['2024-05-01 10:00:00'] * n,
+        })
+
+    def test_reduce_keeps_every_story(self):
+        """Digests that do not fit one prompt are reduced in rounds, and every story reaches the final prompt."""
+        articles = self.articles()
+        briefing = self.framing.generate_briefing(articles)
+        self.assertEqual(briefing, "Briefing de 200 historias")
+        (final_input,) = self.analyzer.final_inputs
+        self.assertLessEqual(len(final_input), self.framing.MAX_INPUT_CHARS)
+        self.assertEqual(sorted(MARKER.findall(final_input)), [f"{i:03d}" for i in range(200)])
+        self.assertEqual(db.obtener_briefing_cacheado(self.framing.briefing_cache_key(articles['id'])), briefing)
+
+    def test_failed_reduce_round_is_not_cached(self):
+        """A failed reduce round yields an explicit error instead of a briefing built from part of the stories."""
+        self.analyzer.fail_reduce = True
+        articles = self.articles()
+        self.assertEqual(self.framing.generate_briefing(articles), self.framing.BRIEFING_ERROR_TEXT)
+        self.assertEqual(self.analyzer.final_inputs, [])
+        self.assertIsNone(db.obtener_briefing_cacheado(self.framing.briefing_cache_key(articles['id'])))
+
+    def test_reduce_gives_up_after_max_rounds(self):
+        """When the digests still do not fit after MAX_REDUCE_ROUNDS, no briefing is generated or cached."""
+        with patch.object(self.framing, 'MAX_REDUCE_ROUNDS', 0):
+            self.assertEqual(self.framing.generate_briefing(self.articles()), self.framing.BRIEFING_ERROR_TEXT)
+        self.assertEqual(self.analyzer.final_inputs, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import asyncio
+import time
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from micro_batching import MicroBatcher, QueueFullError
+
+class TestMicroBatcher(unittest.TestCase):
+
+    def test_concurrent_requests_are_batched(self):
+        """Concurrent submissions are merged into batches and results keep their order."""
+        batch_sizes = []
+
+        def process(items):
+            batch_sizes.append(len(items))
+            return [item * 2 for item in items]
+
+        async def run():
+            batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=20)
+            results = await asyncio.gather(*[batcher.submit(i) for i in range(8)])
+            metrics = batcher.metrics()
+            await batcher.stop()
+            return results, metrics
+
+        results, metrics = asyncio.run(run())
+
+        self.assertEqual(results, [i * 2 for i in range(8)])
+        self.assertEqual(batch_sizes, [4, 4])
+        self.assertEqual(metrics['batches'], 2)
+        self.assertEqual(metrics['avg_batch_size'], 4)
+
+    def test_backpressure_and_timeout(self):
+        """A full queue rejects new requests and slow batches time out."""
+        def slow_process(items):
+            time.sleep(0.2)
+            return items
+
+        async def run():
+            batcher = MicroBatcher(slow_process, max_batch_size=1, max_wait_ms=1, max_queue_size=1, request_timeout=0.05)
+            results = await asyncio.gather(*[batcher.submit(i) for i in range(3)], return_exceptions=True)
+            metrics = batcher.metrics()
+            await batcher.stop()
+            return results, metrics
+
+        results, metrics = asyncio.run(run())
+
+        self.assertTrue(any(isinstance(r, QueueFullError) for r in results))
+        self.assertTrue(any(isinstance(r, asyncio.TimeoutError) for r in results))
+        self.assertGreaterEqual(metrics['rejected'], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+from unittest.mock import patch
+import importlib.util
+import types
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+QUOTE = "la economía va a crecer el año que viene"
+
+class FakeToken:
+    def __init__(self, i, lemma='', dep='', children=()):
+        self.i, self.lemma_, self.lower_, self.dep_, self.children = i, lemma, lemma, dep, list(children)
+        self.head = self
+
+class FakeDoc:
+    """A parsed window whose first word is a PER entity and the subject of 'decir', which governs every quote."""
+
+    def __init__(self, text):
+        self.text = text
+        subject = FakeToken(0, dep='nsubj')
+        verb = FakeToken(1, lemma='decir', children=[subject])
+        self.root = FakeToken(2)
+        self.root.head = verb
+        self.ents = [types.SimpleNamespace(label_='PER', start=0, end=1, text=text.split()[0])]
+
+    def char_span(self, start, end):
+        if not (0 <= start < end <= len(self.text)):
+            return None
+        return types.SimpleNamespace(root=self.root)
+
+class FakeExtractor:
+    def __init__(self):
+        self.windows = []
+
+    def pipe(self, texts, batch_size=32):
+        for text in texts:
+            self.windows.append(text)
+            yield FakeDoc(text)
+
+def fake_analysis(analyzer):
+    """Replaces the analysis module (which loads the NLP models) and forgets ner_analysis on exit."""
+    module = types.ModuleType('analysis')
+    module.analyzer = analyzer
+    return patch.dict(sys.modules, {'analysis': module})
+
+@unittest.skipUnless(importlib.util.find_spec('geopy'), "geopy not installed")
+class TestQuoteWindows(unittest.TestCase):
+
+    def setUp(self):
+        self.extractor = FakeExtractor()
+        self.modules = fake_analysis(types.SimpleNamespace(entity_extractor=self.extractor, config={}))
+        self.modules.start()
+        sys.modules.pop('ner_analysis', None)
+        import ner_analysis
+        self.ner = ner_analysis
+
+    def tearDown(self):
+        self.modules.stop()
+
+    def test_windows_cover_the_sentences_with_quote_and_attribution_verb(self):
+        text = (f"El día empezó tranquilo. Milei dijo: «{QUOTE}». "
+                f"Hubo aplausos. Un cartel decía “{QUOTE} y más”.\nKicillof aseguró que \"{QUOTE}\" era falso. Fin.")
+        windows = [(text[start:end], [text[q_start:q_end] for q_start, q_end in quotes])
+                   for start, end, quotes in self.ner._quote_windows(text)]
+        self.assertEqual(windows, [
+            (f"Milei dijo: «{QUOTE}».", [QUOTE]),
+            # "decía" no es un verbo de atribución: esa oración no se procesa
+            (f"Kicillof aseguró que \"{QUOTE}\" era falso.", [QUOTE]),
+        ])
+
+    def test_quote_spanning_sentences_and_quotes_without_verb(self):
+        text = f"Bullrich explicó: «Primero. {QUOTE}». Luego se fue. El cartel: «{QUOTE}»."
+        ((start, end, quotes),) = self.ner._quote_windows(text)
+        self.assertEqual(text[start:end], f"Bullrich explicó: «Primero. {QUOTE}».")
+        self.assertEqual(len(quotes), 1)
+
+    def test_text_without_quote_bearing_sentences_skips_the_parser(self):
+        texts = ["Sin citas en este texto. Solo oraciones.", f"Hay una cita «{QUOTE}» pero ningún verbo.", "Dijo «corta».", ""]
+        self.assertEqual(self.ner.extract_quotes_batch(texts), [[], [], [], []])
+        self.assertEqual(self.extractor.windows, [])
+
+    def test_batch_matches_per_text_extraction(self):
+        texts = [
+            f"Milei dijo: «{QUOTE}». Otra oración.",
+            "Nada para ver acá.",
+            f"Kicillof aseguró «{QUOTE}». Massa señaló que «{QUOTE}, sin dudas».",
+        ]
+        batch = self.ner.extract_quotes_batch(texts)
+        self.assertEqual(batch, [self.ner.extract_quotes(text) for text in texts])
+        self.assertEqual(batch[0], [{"text": QUOTE, "person": "Milei"}])
+        self.assertEqual([quote["person"] for quote in batch[2]], ["Kicillof", "Massa"])
+
+if __name__ == '__main__':
+    unittest.main()
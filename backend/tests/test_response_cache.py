@@ -0,0 +1,35 @@
+import unittest
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+from response_cache import ResponseCache
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_etag_depends_on_version_route_and_params(self):
+        """The same request under the same data version gets the same ETag, whatever the parameter order."""
+        etag = ResponseCache.etag("1", "/api/headlines", [("page_size", "20"), ("cursor", "abc")])
+        self.assertEqual(etag, ResponseCache.etag("1", "/api/headlines", [("cursor", "abc"), ("page_size", "20")]))
+        self.assertNotEqual(etag, ResponseCache.etag("2", "/api/headlines", [("page_size", "20"), ("cursor", "abc")]))
+        self.assertNotEqual(etag, ResponseCache.etag("1", "/api/quotes", [("page_size", "20"), ("cursor", "abc")]))
+        self.assertTrue(ResponseCache.matches(f'"x", W/{etag}', etag))
+        self.assertFalse(ResponseCache.matches(None, etag))
+
+    def test_new_version_drops_old_entries(self):
+        """Entries are served until the data version changes, and the LRU bound is respected."""
+        cache = ResponseCache(max_entries=2)
+        self.assertIsNone(cache.get("1", "a"))
+        for etag in ("a", "b", "c"):
+            cache.put("1", etag, "application/json", etag.encode())
+        self.assertIsNone(cache.get("1", "a"))
+        self.assertEqual(cache.get("1", "c"), ("application/json", b"c"))
+
+        self.assertIsNone(cache.get("2", "c"))
+        cache.put("1", "d", "application/json", b"stale")
+        self.assertEqual(cache.metrics()['entries'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+from unittest.mock import patch
+import threading
+import tempfile
+import types
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+import scrape_jobs
+
+def fake_preprocessing(run_full_process):
+    """A stand-in for preprocessing (which loads the NLP models) exposing only run_full_process."""
+    module = types.ModuleType('preprocessing')
+    module.run_full_process = run_full_process
+    return patch.dict(sys.modules, {'preprocessing': module})
+
+class TestScrapeJobs(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+
+    def tearDown(self):
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def job(self, job_id):
+        return db.obtener_trabajo_scrape(db.get_db_connection(), job_id)
+
+    def test_worker_runs_queued_job_and_records_progress(self):
+        """A queued job is run once by the worker, with its sources, stage and counters persisted."""
+        def run_full_process(sources, progress=None):
+            progress.stage("collecting")
+            progress.add('collected', 5)
+            progress.stage("analyzing")
+            progress.add('analyzed', 2)
+            progress.add('saved', 2)
+            return 2
+
+        job_id, created = db.crear_trabajo_scrape(["Clarin"])
+        self.assertTrue(created)
+        self.assertEqual(db.crear_trabajo_scrape(), (job_id, False))
+        with fake_preprocessing(run_full_process):
+            scrape_jobs.run_worker(threading.Lock(), once=True)
+
+        job = self.job(job_id)
+        self.assertEqual((job['status'], job['stage'], job['sources']), ('succeeded', 'analyzing', ["Clarin"]))
+        self.assertEqual((job['collected'], job['fetched'], job['analyzed'], job['saved']), (5, 0, 2, 2))
+        self.assertIsNotNone(job['finished_at'])
+
+    def test_concurrent_enqueues_create_a_single_job(self):
+        """Several connections enqueueing at once end up with exactly one active job."""
+        barrier = threading.Barrier(4)
+        results = []
+
+        def enqueue():
+            barrier.wait()
+            results.append(db.crear_trabajo_scrape())
+            db.close_db_connection()
+
+        threads = [threading.Thread(target=enqueue) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        created = [job_id for job_id, was_created in results if was_created]
+        self.assertEqual(len(created), 1)
+        self.assertEqual({job_id for job_id, _ in results}, set(created))
+        self.assertEqual(db.get_db_connection().execute("SELECT COUNT(*) FROM scrape_jobs").fetchone()[0], 1)
+
+    def test_cancellation_and_interrupted_jobs(self):
+        """Queued jobs cancel at once, running ones stop at the next check, and orphaned ones are failed."""
+        job_id, _ = db.crear_trabajo_scrape()
+        self.assertEqual(db.cancelar_trabajo_scrape(job_id)['status'], 'cancelled')
+        self.assertIsNone(db.cancelar_trabajo_scrape(99))
+
+        def run_full_process(sources, progress=None):
+            progress.stage("collecting")
+            db.cancelar_trabajo_scrape(progress.job_id)
+            progress.stage("fetching")
+            progress.check_cancelled()
+            return 0
+
+        job_id, _ = db.crear_trabajo_scrape()
+        with fake_preprocessing(run_full_process):
+            scrape_jobs.run_worker(threading.Lock(), once=True)
+        self.assertEqual(self.job(job_id)['status'], 'cancelled')
+        self.assertEqual(self.job(job_id)['stage'], 'fetching')
+
+        # Después de guardar artículos, las etapas siguen aunque se haya pedido cancelar
+        stages = []
+        def run_full_process_after_save(sources, progress=None):
+            progress.stage("analyzing")
+            db.cancelar_trabajo_scrape(progress.job_id)
+            for stage in ("quotes", "framing"):
+                progress.stage(stage)
+                stages.append(stage)
+            if progress.cancel_requested(force=True):
+                raise scrape_jobs.JobCancelled()
+            return 1
+
+        job_id, _ = db.crear_trabajo_scrape()
+        with fake_preprocessing(run_full_process_after_save):
+            scrape_jobs.run_worker(threading.Lock(), once=True)
+        self.assertEqual(stages, ["quotes", "framing"])
+        self.assertEqual((self.job(job_id)['status'], self.job(job_id)['stage']), ('cancelled', 'framing'))
+
+        # Un trabajo que quedó 'running' (su worker murió) se marca como fallido al tomar el siguiente
+        job_id, _ = db.crear_trabajo_scrape()
+        db.tomar_trabajo_scrape("dead-worker")
+        scrape_jobs.run_worker(threading.Lock(), once=True)
+        self.assertEqual(self.job(job_id)['status'], 'failed')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from unittest.mock import patch
+import tempfile
+import types
+import sys
+import os
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src')))
+
+import db
+
+DIM = 8
+
+def near(axis, offset=0.0):
+    """A unit vector close to the `axis` basis vector (tilted by `offset` towards the last axis)."""
+    vector = np.zeros(DIM, dtype=np.float32)
+    vector[axis], vector[-1] = 1.0, offset
+    return vector / np.linalg.norm(vector)
+
+def fake_sentence_transformers():
+    """A stand-in for sentence_transformers (not needed when the embeddings are passed in)."""
+    module = types.ModuleType('sentence_transformers')
+    module.SentenceTransformer = lambda model_name: object()
+    return patch.dict(sys.modules, {'sentence_transformers': module})
+
+class TestIncrementalStories(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = db.DB_FILE
+        db.DB_FILE = os.path.join(self.tmp_dir.name, 'test.db')
+        db.create_table()
+        self.modules = fake_sentence_transformers()
+        self.modules.start()
+        sys.modules.pop('story_clustering', None)
+        from story_clustering import StoryClusterer, CentroidIndex
+        self.clusterer = StoryClusterer()
+        self.CentroidIndex = CentroidIndex
+
+    def tearDown(self):
+        self.modules.stop()
+        db.close_db_connection()
+        db.close_read_pools()
+        db.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def assign(self, vectors, window_days=3):
+        headlines = [f"Titular {i}" for i in range(len(vectors))]
+        return self.clusterer.assign_stories(headlines, window_days=window_days, embeddings=np.stack(vectors))
+
+    def test_story_ids_are_stable_across_runs_and_expire(self):
+        """Similar groups join the existing story in later runs; stories idle for window_days are not reused."""
+        first = self.assign([near(0), near(0, 0.1), near(1), near(1, 0.1), near(2)])
+        economy, dollar = first[0], first[2]
+        self.assertEqual(first[1], economy)
+        self.assertEqual(first[3], dollar)
+        self.assertNotEqual(economy, dollar)
+        self.assertIsNone(first[4]) # Un titular suelto no crea una historia
+
+        second = self.assign([near(0, 0.2), near(0, 0.05), near(1, 0.15), near(3), near(3, 0.1)])
+        self.assertEqual(second[:3], [economy, economy, dollar])
+        self.assertNotIn(second[3], (None, economy, dollar))
+        self.assertEqual(second[4], second[3])
+        size = db.get_db_connection().execute("SELECT size FROM stories WHERE id = ?", (economy,)).fetchone()[0]
+        self.assertEqual(size, 4)
+
+        conn = db.get_db_connection()
+        with conn:
+            conn.execute("UPDATE stories SET last_seen = datetime('now', '-10 days')")
+        third = self.assign([near(0), near(0, 0.1)])
+        self.assertEqual(third[0], third[1])
+        self.assertNotIn(third[0], (economy, dollar))
+
+    def test_centroid_index_grows_without_losing_vectors(self):
+        index = self.CentroidIndex(DIM, capacity=2)
+        for axis in range(DIM - 1):
+            self.assertEqual(index.add(100 + axis, 3 * near(axis)), axis)
+        self.assertEqual(index.vectors.shape, (DIM - 1, DIM))
+        position, similarity = index.nearest(near(5))
+        self.assertEqual((index.ids[position], round(similarity, 5)), (105, 1.0))
+
+if __name__ == '__main__':
+    unittest.main()